@@ -1,62 +1,36 @@
 from tkinter import messagebox
-import random
+
+from ledger import LedgerError
 
 class AccountManagement:
     def __init__(self, bank_system):
         self.bank_system = bank_system
+        self.login_pending = False
     
     def create_account(self):
         """Create a new user account"""
-        # Get values from entry fields
-        name = self.bank_system.name_entry.get().strip()
-        age = self.bank_system.age_entry.get().strip()
-        salary = self.bank_system.salary_entry.get().strip()
-        pin = self.bank_system.pin_entry.get().strip()
-        account_type = self.bank_system.account_type_var.get()
-        security_question = self.bank_system.security_question_var.get()
-        security_answer = self.bank_system.security_answer_entry.get().strip()
-        
-        # Validate inputs
-        if not all([name, age, salary, pin, security_answer]):
-            messagebox.showerror("Error", "All fields are required!")
-            return
-            
-        try:
-            age = int(age)
-            salary = float(salary)
-            if not pin.isdigit() or len(pin) != 4:
-                raise ValueError("PIN must be a 4-digit number")
-        except ValueError as e:
-            messagebox.showerror("Error", str(e))
-            return
-            
-        # Check if user already exists
-        if name in self.bank_system.users:
-            messagebox.showerror("Error", "User already exists!")
-            return
-            
-        # Generate account number
-        account_number = ''.join(random.choices('0123456789', k=10))
-        
-        # Create user data
-        user_data = {
-            'name': name,
-            'age': age,
-            'salary': salary,
-            'pin': pin,
-            'account_number': account_number,
-            'balance': 0,
-            'account_type': account_type,
-            'security_question': security_question,
-            'security_answer': security_answer,
-            'transaction_log': []
-        }
-        
-        # Add user to users dictionary
-        self.bank_system.users[name] = user_data
-        
+        # Validate the entered details and open the account on a worker
+        # thread, as hashing the PIN and answer is slow
+        self.bank_system.credential_pool.submit(self.bank_system.ledger.create_account, (
+            self.bank_system.name_entry.get().strip(),
+            self.bank_system.age_entry.get().strip(),
+            self.bank_system.salary_entry.get().strip(),
+            self.bank_system.pin_entry.get().strip(),
+            self.bank_system.account_type_var.get(),
+            self.bank_system.security_question_var.get(),
+            self.bank_system.security_answer_entry.get().strip()
+        ), self._finish_create_account, self._show_error)
+    
+    def _show_error(self, error):
+        """Show a rejected operation"""
+        if not isinstance(error, LedgerError):
+            raise error
+        messagebox.showerror("Error", str(error))
+    
+    def _finish_create_account(self, user_data):
+        """Confirm a new account and return to the login screen"""
         # Show success message
-        messagebox.showinfo("Success", f"Account created successfully!\nYour account number is: {account_number}")
+        messagebox.showinfo("Success", f"Account created successfully!\nYour account number is: {user_data['account_number']}")
         
         # Clear entry fields
         self.bank_system.name_entry.delete(0, 'end')
@@ -74,48 +48,49 @@ class AccountManagement:
         name = self.bank_system.login_name_entry.get().strip()
         pin = self.bank_system.login_pin_entry.get().strip()
         
-        # Check if user exists
-        if name not in self.bank_system.users:
-            messagebox.showerror("Error", "User not found!")
+        # Ignore repeated presses while a check is running
+        if self.login_pending:
             return
+        self.login_pending = True
+        self.login_started = self.bank_system.metrics.start()
+        self.bank_system.root.config(cursor='watch')
         
-        # Check if PIN is correct
-        if self.bank_system.users[name]['pin'] != pin:
-            # Increment login attempts
-            if name not in self.bank_system.login_attempts:
-                self.bank_system.login_attempts[name] = 0
-            self.bank_system.login_attempts[name] += 1
-            
-            # Check if max attempts reached
-            if self.bank_system.login_attempts[name] >= self.bank_system.max_login_attempts:
-                messagebox.showerror("Error", "Account locked due to too many failed attempts. Please use 'Forgot PIN' to reset.")
-                return
-            else:
-                messagebox.showerror("Error", f"Invalid PIN. {self.bank_system.max_login_attempts - self.bank_system.login_attempts[name]} attempts remaining.")
-                return
-        
-        # Reset login attempts on successful login
-        self.bank_system.login_attempts[name] = 0
+        # Check the PIN on a worker thread, counting failed attempts
+        self.bank_system.credential_pool.submit(
+            self.bank_system.ledger.authenticate, (name, pin, self.bank_system.login_throttle),
+            lambda user_data: self._finish_login(name, user_data), self._login_failed)
+    
+    def _login_failed(self, error):
+        """Show why a login was refused"""
+        self.login_pending = False
+        self.bank_system.metrics.record('login', self.login_started, error=True)
+        self.bank_system.root.config(cursor='')
+        self._show_error(error)
+    
+    def _finish_login(self, name, user_data):
+        """Show the account of a user whose PIN was accepted"""
+        self.login_pending = False
+        self.bank_system.metrics.record('login', self.login_started)
+        self.bank_system.root.config(cursor='')
         
         # Set current user
         self.bank_system.current_user = name
         
+        # Hide login frame and show user frame, built on the first login
+        self.bank_system.show_user_dashboard()
+        
         # Update user details display
-        user_data = self.bank_system.users[name]
         self.bank_system.name_display.config(text=f"Name: {user_data['name']}")
         self.bank_system.age_display.config(text=f"Age: {user_data['age']}")
         self.bank_system.salary_display.config(text=f"Salary: {user_data['salary']}")
         self.bank_system.balance_display.config(text=f"Balance: {user_data['balance']}")
         self.bank_system.account_type_display.config(text=f"Account Type: {user_data['account_type']}")
-        
-        # Hide login frame and show user frame
-        self.bank_system.login_frame.pack_forget()
-        self.bank_system.user_frame.pack(pady=20)
     
     def logout(self):
         """Handle user logout"""
-        # Clear current user
+        # Clear current user and close the user's open dialogs
         self.bank_system.current_user = None
+        self.bank_system.dialogs.hide_all()
         
         # Clear login fields
         self.bank_system.login_name_entry.delete(0, 'end')
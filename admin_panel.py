@@ -1,9 +1,29 @@
-from tkinter import messagebox, Toplevel, Label, Entry, Button, Frame, ttk
+from tkinter import messagebox, filedialog, Toplevel, Label, Entry, Button, Frame, ttk
 from tkinter import StringVar
+import threading
+import time
+
+from interest_accrual import accrue_interest
+from ledger import LedgerError
+from metrics import PERCENTILES
+from transaction_log import format_timestamp
+from ui_components import Autocomplete, VirtualTreeview
+
+# Queries offered by the Search tab
+SEARCH_MODES = ("Name like", "Account number prefix", "Balance between", "Transactions over")
+SEARCH_LIMIT = 500
+
+# Milliseconds between refreshes of the Metrics tab
+METRICS_REFRESH_MS = 2000
+
+# Milliseconds between checks on work running off the Tk thread
+POLL_MS = 100
 
 class AdminPanel:
     def __init__(self, bank_system):
         self.bank_system = bank_system
+        self._interest_worker = None
+        self._index_worker = None
     
     def show_admin_panel(self):
         """Show admin panel window"""
@@ -21,33 +41,48 @@ class AdminPanel:
         notebook.add(user_frame, text="User Management")
         self._create_user_management_tab(user_frame)
         
+        # Search tab
+        search_frame = Frame(notebook)
+        notebook.add(search_frame, text="Search")
+        self._create_search_tab(search_frame)
+        
         # System Settings tab
         settings_frame = Frame(notebook)
         notebook.add(settings_frame, text="System Settings")
         self._create_system_settings_tab(settings_frame)
+        
+        # Metrics tab
+        metrics_frame = Frame(notebook)
+        notebook.add(metrics_frame, text="Metrics")
+        self._create_metrics_tab(metrics_frame)
     
     def _create_user_management_tab(self, parent):
         """Create user management tab"""
-        # Create treeview for users
-        columns = ('Username', 'Name', 'Account Number', 'Balance', 'Account Type')
-        tree = ttk.Treeview(parent, columns=columns, show='headings')
+        # Create search bar
+        search_frame = Frame(parent)
+        search_frame.pack(side='top', fill='x', padx=5, pady=5)
+        Label(search_frame, text="Name, Username or Account No.:").pack(side='left', padx=5)
+        search_entry = Entry(search_frame)
+        search_entry.pack(side='left', padx=5)
         
-        # Set column headings
-        for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=100)
-        
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(parent, orient='vertical', command=tree.yview)
-        tree.configure(yscrollcommand=scrollbar.set)
-        
-        # Pack widgets
-        tree.pack(side='left', fill='both', expand=True)
-        scrollbar.pack(side='right', fill='y')
+        # Create virtual treeview that only loads the users in view
+        columns = ('Username', 'Name', 'Account Number', 'Balance', 'Account Type')
+        tree = VirtualTreeview(parent, columns,
+            count_rows=lambda: len(self.bank_system.users),
+            fetch_rows=self._fetch_user_rows)
+        tree.pack(side='top', fill='both', expand=True)
         
         # Populate treeview
         self._populate_user_tree(tree)
         
+        # Search button
+        Button(search_frame, text="Find", command=lambda: self._find_user(tree, search_entry.get())).pack(side='left', padx=5)
+        search_entry.bind('<Return>', lambda e: self._find_user(tree, search_entry.get()))
+        
+        # Suggest users by partial username or name
+        Autocomplete(search_entry, self.bank_system.name_index.search,
+                     on_select=lambda username: self._find_user(tree, username))
+        
         # Create buttons frame
         button_frame = Frame(parent)
         button_frame.pack(fill='x', padx=5, pady=5)
@@ -57,6 +92,126 @@ class AdminPanel:
         Button(button_frame, text="Delete User", command=lambda: self._delete_user(tree)).pack(side='left', padx=5)
         Button(button_frame, text="Edit User", command=lambda: self._edit_user(tree)).pack(side='left', padx=5)
     
+    def _create_search_tab(self, parent):
+        """Create search tab for accounts and transactions"""
+        # Query form
+        form = Frame(parent)
+        form.pack(side='top', fill='x', padx=5, pady=5)
+        
+        Label(form, text="Find:").grid(row=0, column=0, padx=5, pady=2, sticky='w')
+        mode_var = StringVar(value=SEARCH_MODES[0])
+        ttk.Combobox(form, textvariable=mode_var, values=SEARCH_MODES, state='readonly', width=22).grid(row=0, column=1, padx=5, pady=2, sticky='w')
+        
+        Label(form, text="Text, From or Over $:").grid(row=1, column=0, padx=5, pady=2, sticky='w')
+        value_entry = Entry(form)
+        value_entry.grid(row=1, column=1, padx=5, pady=2, sticky='w')
+        Label(form, text="To $:").grid(row=1, column=2, padx=5, pady=2, sticky='w')
+        to_entry = Entry(form, width=12)
+        to_entry.grid(row=1, column=3, padx=5, pady=2, sticky='w')
+        
+        Label(form, text="Transaction Type:").grid(row=2, column=0, padx=5, pady=2, sticky='w')
+        kind_var = StringVar(value="Transfer to")
+        kind_box = ttk.Combobox(form, textvariable=kind_var, width=22,
+                                postcommand=lambda: self._list_transaction_kinds(kind_box))
+        kind_box.grid(row=2, column=1, padx=5, pady=2, sticky='w')
+        Label(form, text="Other Account:").grid(row=2, column=2, padx=5, pady=2, sticky='w')
+        counterparty_entry = Entry(form, width=12)
+        counterparty_entry.grid(row=2, column=3, padx=5, pady=2, sticky='w')
+        
+        # Results
+        status_label = Label(parent, text="")
+        results = ttk.Treeview(parent, show='headings')
+        scrollbar = ttk.Scrollbar(parent, orient='vertical', command=results.yview)
+        results.configure(yscrollcommand=scrollbar.set)
+        
+        def run_search(event=None):
+            self._run_search(results, status_label, mode_var.get(), value_entry.get(), to_entry.get(),
+                             kind_var.get(), counterparty_entry.get())
+        
+        Button(form, text="Search", command=run_search).grid(row=0, column=2, padx=5, pady=2, sticky='w')
+        for entry in (value_entry, to_entry, counterparty_entry):
+            entry.bind('<Return>', run_search)
+        
+        status_label.pack(side='top', anchor='w', padx=5)
+        results.pack(side='left', fill='both', expand=True, padx=(5, 0), pady=5)
+        scrollbar.pack(side='right', fill='y', pady=5)
+    
+    def _list_transaction_kinds(self, kind_box):
+        """Offer the indexed transaction kinds, unless the index is catching up"""
+        index = self.bank_system.search_index
+        if index.needs_rescan():
+            self._sync_search_index(None)
+            return
+        kind_box.config(values=index.transaction_kinds())
+    
+    def _sync_search_index(self, on_done):
+        """Bring the search index up to date on a worker thread, then call on_done"""
+        if self._index_worker is None or not self._index_worker.is_alive():
+            self._index_worker = threading.Thread(target=self.bank_system.search_index.sync,
+                                                  name='search-index', daemon=True)
+            self._index_worker.start()
+        worker = self._index_worker
+        
+        def poll():
+            if worker.is_alive():
+                self.bank_system.root.after(POLL_MS, poll)
+            elif on_done is not None:
+                on_done()
+        self.bank_system.root.after(POLL_MS, poll)
+    
+    def _run_search(self, results, status_label, mode, value, to_value, kind, counterparty):
+        """Run an admin search and show its results"""
+        index = self.bank_system.search_index
+        users = self.bank_system.users
+        
+        # Reading every account takes a while at scale, so it is done off
+        # the Tk thread and the search runs once it is finished
+        if index.needs_rescan():
+            status_label.config(text="Indexing accounts...")
+            
+            def search_when_indexed():
+                if status_label.winfo_exists():
+                    self._run_search(results, status_label, mode, value, to_value, kind, counterparty)
+            self._sync_search_index(search_when_indexed)
+            return
+        
+        start = time.perf_counter()
+        try:
+            if mode == "Name like":
+                columns = ('Username', 'Name', 'Account Number', 'Balance')
+                rows = []
+                for username in index.names_like(value, limit=SEARCH_LIMIT):
+                    user_data = users[username]
+                    rows.append((username, user_data['name'], user_data['account_number'], user_data['balance']))
+            elif mode == "Account number prefix":
+                columns = ('Account Number', 'Username')
+                rows = index.account_numbers_with_prefix(value, limit=SEARCH_LIMIT)
+            elif mode == "Balance between":
+                columns = ('Username', 'Balance')
+                rows = [(username, balance) for balance, username in
+                        index.balance_between(float(value), float(to_value), limit=SEARCH_LIMIT)]
+            else:
+                columns = ('Username', 'Date', 'Type', 'Amount')
+                rows = [(username, format_timestamp(timestamp), transaction_type, f"{amount:.2f}")
+                        for amount, username, timestamp, transaction_type in
+                        index.transactions_over(kind.strip(), float(value or 0), counterparty.strip(), limit=SEARCH_LIMIT)]
+        except ValueError:
+            messagebox.showerror("Error", "Please enter valid amounts!")
+            return
+        elapsed = time.perf_counter() - start
+        
+        # Replace the result rows
+        results.delete(*results.get_children())
+        results.config(columns=columns)
+        for col in columns:
+            results.heading(col, text=col)
+            results.column(col, width=150)
+        for row in rows:
+            results.insert('', 'end', values=row)
+        
+        more = " (limit reached)" if len(rows) == SEARCH_LIMIT else ""
+        status_label.config(text=f"{len(rows)} results{more} in {elapsed * 1000:.1f}ms")
+    
     def _create_system_settings_tab(self, parent):
         """Create system settings tab"""
         # Create frame for settings
@@ -78,40 +233,134 @@ class AdminPanel:
         
         # Save button
         Button(frame, text="Save Settings", command=lambda: self._save_system_settings(min_balance_vars)).grid(row=row, column=0, columnspan=2, pady=10)
+        row += 1
+        
+        # Month-end interest posting
+        Label(frame, text="Month-End Interest", font=('Arial', 12, 'bold')).grid(row=row, column=0, columnspan=2, pady=10)
+        row += 1
+        for acc_type, settings in self.bank_system.account_types.items():
+            Label(frame, text=f"{acc_type}: {settings['interest_rate'] * 100:.2f}% per year").grid(row=row, column=0, columnspan=2)
+            row += 1
+        interest_button = Button(frame, text="Post Monthly Interest")
+        interest_button.grid(row=row, column=0, columnspan=2, pady=10)
+        interest_status = Label(frame, text="")
+        interest_status.grid(row=row + 1, column=0, columnspan=2)
+        interest_button.config(command=lambda: self._post_monthly_interest(interest_button, interest_status))
     
     def _populate_user_tree(self, tree):
-        """Populate user treeview"""
-        # Clear existing items
-        for item in tree.get_children():
-            tree.delete(item)
+        """Refresh the user treeview rows that changed since the last refresh"""
+        with self.bank_system.metrics.timer('user_list_refresh'):
+            users = self.bank_system.users
+            changes = None if tree.data_version is None else users.changes_since(tree.data_version)
+            
+            # Reload the visible window unless nothing in view has changed
+            if changes is None or changes[1] or changes[0] & tree.visible_keys():
+                tree.refresh()
+            tree.data_version = users.version
+    
+    def _create_metrics_tab(self, parent):
+        """Create metrics tab with operation latencies and counts"""
+        # Operations table
+        columns = ('Operation', 'Count', 'Errors', 'Per Second', 'Mean (ms)') + \
+            tuple(f"p{percent:g} (ms)" for percent in PERCENTILES) + ('Max (ms)',)
+        tree = ttk.Treeview(parent, columns=columns, show='headings')
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=140 if col == 'Operation' else 70, anchor='w' if col == 'Operation' else 'e')
+        tree.pack(side='top', fill='both', expand=True, padx=5, pady=5)
         
-        # Add users
-        for username, user_data in self.bank_system.users.items():
+        # Create buttons frame
+        button_frame = Frame(parent)
+        button_frame.pack(fill='x', padx=5, pady=5)
+        status_label = Label(button_frame, text="")
+        
+        # Add buttons
+        Button(button_frame, text="Refresh", command=lambda: self._show_metrics(tree, status_label)).pack(side='left', padx=5)
+        Button(button_frame, text="Reset", command=lambda: self._reset_metrics(tree, status_label)).pack(side='left', padx=5)
+        Button(button_frame, text="Export...", command=self._export_metrics).pack(side='left', padx=5)
+        status_label.pack(side='left', padx=10)
+        
+        # Keep the table current while the window is open
+        def refresh():
+            if tree.winfo_exists():
+                self._show_metrics(tree, status_label)
+                tree.after(METRICS_REFRESH_MS, refresh)
+        refresh()
+    
+    def _show_metrics(self, tree, status_label):
+        """Fill the metrics table from the current histograms"""
+        snapshot = self.bank_system.metrics.snapshot()
+        tree.delete(*tree.get_children())
+        for name, summary in snapshot.items():
             tree.insert('', 'end', values=(
-                username,
-                user_data['name'],
-                user_data['account_number'],
-                user_data['balance'],
-                user_data.get('account_type', 'Savings')
+                name,
+                summary['count'],
+                summary['errors'],
+                f"{summary['rate_per_s']:.2f}",
+                f"{summary['mean_ms']:.3f}",
+                *(f"{summary[f'p{percent:g}_ms']:.3f}" for percent in PERCENTILES),
+                f"{summary['max_ms']:.3f}"
             ))
+        status_label.config(text=f"Updated {time.strftime('%H:%M:%S')}" if snapshot else "No operations recorded yet.")
+    
+    def _reset_metrics(self, tree, status_label):
+        """Clear the histograms after confirmation"""
+        if messagebox.askyesno("Confirm", "Reset all metrics?"):
+            self.bank_system.metrics.reset()
+            self._show_metrics(tree, status_label)
+    
+    def _export_metrics(self):
+        """Save the metrics with their raw histograms as JSON"""
+        target = filedialog.asksaveasfilename(title="Export Metrics", defaultextension=".json",
+                                              filetypes=[("JSON files", "*.json")])
+        if not target:
+            return
+        try:
+            self.bank_system.metrics.dump(target)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not export the metrics: {e}")
+            return
+        messagebox.showinfo("Success", f"Metrics saved to {target}")
+    
+    def _fetch_user_rows(self, offset, limit):
+        """Return a page of user rows for the user treeview"""
+        return [(username, (
+            username,
+            user_data['name'],
+            user_data['account_number'],
+            user_data['balance'],
+            user_data.get('account_type', 'Savings')
+        )) for username, user_data in self.bank_system.users.list_accounts(offset=offset, limit=limit)]
+    
+    def _find_user(self, tree, query):
+        """Select the user matching a username, account number or name prefix"""
+        try:
+            username = self.bank_system.ledger.resolve_account(query)
+        except LedgerError as e:
+            # Fall back to the first user whose username or name starts with it
+            matches = self.bank_system.name_index.search(query, limit=1)
+            if not matches:
+                messagebox.showerror("Error", str(e))
+                return
+            username = matches[0]
+        
+        # Select and scroll to the user's row
+        tree.show_key(self.bank_system.users.account_index(username), username)
     
     def _delete_user(self, tree):
         """Delete selected user"""
-        # Get selected item
-        selection = tree.selection()
-        if not selection:
+        # Get selected username
+        username = tree.selected_key()
+        if username is None or username not in self.bank_system.users:
             messagebox.showerror("Error", "Please select a user to delete!")
             return
         
-        # Get username
-        username = tree.item(selection[0])['values'][0]
-        
         # Confirm deletion
         if messagebox.askyesno("Confirm", f"Are you sure you want to delete user {username}?"):
-            # Delete user
-            del self.bank_system.users[username]
-            if username in self.bank_system.login_attempts:
-                del self.bank_system.login_attempts[username]
+            # Delete user, waiting for any transaction on the account to finish
+            with self.bank_system.ledger.locked(username):
+                self.bank_system.users.delete_account(username)
+            self.bank_system.login_throttle.reset(username)
             
             # Refresh treeview
             self._populate_user_tree(tree)
@@ -119,14 +368,13 @@ class AdminPanel:
     
     def _edit_user(self, tree):
         """Edit selected user"""
-        # Get selected item
-        selection = tree.selection()
-        if not selection:
+        # Get selected username
+        username = tree.selected_key()
+        if username is None or username not in self.bank_system.users:
             messagebox.showerror("Error", "Please select a user to edit!")
             return
         
         # Get user data
-        username = tree.item(selection[0])['values'][0]
         user_data = self.bank_system.users[username]
         
         # Create edit window
@@ -181,17 +429,61 @@ class AdminPanel:
             messagebox.showerror("Error", "Balance must be a positive number!")
             return
         
-        # Update user data
-        user_data = self.bank_system.users[username]
-        user_data['name'] = name
-        user_data['balance'] = balance
-        user_data['account_type'] = acc_type
+        # Update user data while no transaction is posting to the account
+        with self.bank_system.ledger.locked(username):
+            self.bank_system.users.update_account(username, {
+                'name': name,
+                'balance': balance,
+                'account_type': acc_type
+            })
         
         # Refresh treeview and close window
         self._populate_user_tree(tree)
         window.destroy()
         messagebox.showinfo("Success", "User updated successfully!")
     
+    def _post_monthly_interest(self, button, status_label):
+        """Credit this month's interest to every account on a worker thread"""
+        if self._interest_worker is not None and self._interest_worker.is_alive():
+            messagebox.showerror("Error", "Interest is already being posted!")
+            return
+        if not messagebox.askyesno("Confirm", "Post this month's interest to all accounts?"):
+            return
+        
+        # The worker only fills in the run; widgets are touched on the Tk thread
+        run = {'accounts': 0, 'result': None, 'error': None}
+        
+        def post():
+            try:
+                run['result'] = accrue_interest(self.bank_system.ledger,
+                                                progress=lambda result: run.update(accounts=result.accounts))
+            except Exception as e:
+                run['error'] = e
+        
+        button.config(state='disabled')
+        self._interest_worker = threading.Thread(target=post, name='interest', daemon=True)
+        self._interest_worker.start()
+        
+        # Poll for completion, as CredentialPool does for credential checks,
+        # from the root so closing the admin window does not stop it
+        def poll():
+            if self._interest_worker.is_alive():
+                if status_label.winfo_exists():
+                    status_label.config(text=f"Posting interest: {run['accounts']} accounts done...")
+                self.bank_system.root.after(POLL_MS, poll)
+                return
+            if button.winfo_exists():
+                button.config(state='normal')
+                status_label.config(text="")
+            if isinstance(run['error'], LedgerError):
+                messagebox.showerror("Error", str(run['error']))
+                return
+            if run['error'] is not None:
+                raise run['error']
+            self.bank_system.update_balance_display()
+            messagebox.showinfo("Success", str(run['result']))
+        self.bank_system.root.after(POLL_MS, poll)
+    
     def _save_system_settings(self, min_balance_vars):
         """Save system settings"""
         # Update minimum balances
@@ -0,0 +1,251 @@
+"""Serve the ledger to branch terminals over TCP
+
+Each connection is one teller session. Requests and responses are JSON
+objects, one per line, and responses come back in request order, so a
+terminal may send several requests without waiting for the replies.
+
+    {"id": 1, "op": "login", "name": "alice", "pin": "1234"}
+    {"id": 2, "op": "deposit", "amount": 500}
+    {"id": 3, "op": "history", "offset": 0, "limit": 20}
+
+Operations: create_account, login, logout, balance, deposit, withdraw,
+transfer and history. All but create_account and login need a logged-in
+session. Every response carries the request ``id`` and ``ok``; rejected
+requests carry the ledger's message in ``error``.
+
+    python bank_server.py --port 8765
+
+With ``--sharded-dir`` the tellers are served from a ShardedLedger kept in
+that directory (see sharded_ledger.py) instead of the application's store:
+
+    python bank_server.py --sharded-dir sharded_data --shards 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+from ledger import LedgerError, DEFAULT_ACCOUNT_TYPES
+from login_throttle import LoginThrottle
+from sharded_ledger import ShardedLedger
+from storage import open_store
+from tracing import open_ledger, tracer_from_environment
+from transaction_log import format_timestamp
+
+
+class SessionError(LedgerError):
+    """Raised when a request is not valid for the session"""
+
+
+class TellerSession:
+    """State of one terminal connection"""
+
+    def __init__(self):
+        self.user = None
+
+    def require_user(self):
+        """Return the logged-in username"""
+        if self.user is None:
+            raise SessionError("Please login first!")
+        return self.user
+
+
+class BankServer:
+    """Asyncio front-end that runs teller requests against a ledger
+
+    Ledger calls block on the account locks and on log writes, so they run
+    on a thread pool while the event loop keeps serving other sessions.
+    """
+
+    def __init__(self, ledger, max_login_attempts=3, workers=8):
+        self.ledger = ledger
+        self.login_throttle = LoginThrottle(max_attempts=max_login_attempts)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.server = None
+        self.operations = {
+            'create_account': self.create_account,
+            'login': self.login,
+            'logout': self.logout,
+            'balance': self.balance,
+            'deposit': self.deposit,
+            'withdraw': self.withdraw,
+            'transfer': self.transfer,
+            'history': self.history
+        }
+
+    async def start(self, host='127.0.0.1', port=8765):
+        """Start listening and return the bound (host, port)"""
+        self.server = await asyncio.start_server(self.serve_client, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        """Stop accepting connections and wait for the workers"""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown()
+
+    async def serve_client(self, reader, writer):
+        """Answer the requests of one connection in order"""
+        session = TellerSession()
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # A line over the stream limit (64 KiB) cannot be framed
+                    # again, so the session ends after saying why
+                    writer.write(self.error_response(None, "Request line too long"))
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                response = await loop.run_in_executor(self.executor, self.handle, session, line)
+                writer.write(response)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def handle(self, session, line):
+        """Run one encoded request and return the encoded response"""
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise SessionError("Request must be a JSON object")
+            request_id = request.get('id')
+            op = request.get('op')
+            operation = self.operations.get(op) if isinstance(op, str) else None
+            if operation is None:
+                raise SessionError(f"Unknown operation: {request.get('op')}")
+            response = operation(session, request)
+            response['ok'] = True
+        except (LedgerError, ValueError) as e:
+            return self.error_response(request_id, str(e))
+        except (TypeError, KeyError, ArithmeticError) as e:
+            # Fields of the wrong type are rejected rather than ending the session
+            return self.error_response(request_id, f"Invalid request: {e}")
+        response['id'] = request_id
+        return (json.dumps(response) + '\n').encode()
+
+    def error_response(self, request_id, message):
+        """Return the encoded response rejecting a request"""
+        return (json.dumps({'ok': False, 'error': message, 'id': request_id}) + '\n').encode()
+
+    def create_account(self, session, request):
+        user_data = self.ledger.create_account(
+            str(request.get('name', '')).strip(),
+            str(request.get('age', '')).strip(),
+            str(request.get('salary', '')).strip(),
+            str(request.get('pin', '')).strip(),
+            str(request.get('account_type', 'Savings')),
+            str(request.get('security_question', '')),
+            str(request.get('security_answer', '')).strip()
+        )
+        return {'account_number': user_data['account_number']}
+
+    def login(self, session, request):
+        name = str(request.get('name', '')).strip()
+        user_data = self.ledger.authenticate(name, str(request.get('pin', '')).strip(), self.login_throttle)
+        session.user = name
+        return {'name': user_data['name'], 'account_type': user_data['account_type'],
+                'balance': user_data['balance']}
+
+    def logout(self, session, request):
+        session.user = None
+        return {}
+
+    def balance(self, session, request):
+        return {'balance': self.ledger.get_account(session.require_user())['balance']}
+
+    def deposit(self, session, request):
+        transaction = self.ledger.deposit(session.require_user(), request.get('amount'))
+        return {'balance': transaction['balance']}
+
+    def withdraw(self, session, request):
+        transaction = self.ledger.withdraw(session.require_user(), request.get('amount'))
+        return {'balance': transaction['balance']}
+
+    def transfer(self, session, request):
+        transaction = self.ledger.transfer(
+            session.require_user(), str(request.get('recipient', '')), request.get('amount'))
+        return {'balance': transaction['balance']}
+
+    def history(self, session, request):
+        name = session.require_user()
+        offset = max(0, self._int_field(request, 'offset', 0))
+        limit = min(max(0, self._int_field(request, 'limit', 100)), 1000)
+        rows = [[format_timestamp(timestamp), transaction_type, amount, balance]
+                for timestamp, transaction_type, amount, balance
+                in self.ledger.list_transactions(name, offset, limit)]
+        return {'total': self.ledger.count_transactions(name), 'transactions': rows}
+
+    def _int_field(self, request, key, default):
+        """Return an integer field of a request, or default when absent or null"""
+        value = request.get(key)
+        if value is None:
+            return default
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise SessionError(f"{key} must be a number")
+        try:
+            return int(value)
+        except (ValueError, OverflowError):
+            raise SessionError(f"{key} must be a number")
+
+
+async def serve(ledger, host, port, workers):
+    """Run a server until it is terminated"""
+    server = BankServer(ledger, workers=workers)
+    host, port = await server.start(host, port)
+    print(f"Listening on {host}:{port}", flush=True)
+
+    # Shut down cleanly on SIGTERM where the platform supports it
+    stopped = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+    except (NotImplementedError, AttributeError):
+        pass
+    try:
+        await stopped.wait()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the ledger to teller terminals")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--sharded-dir', help="serve a sharded ledger kept in this directory")
+    parser.add_argument('--shards', type=int,
+                        help="shards of a new sharded ledger (default: one per core; an existing one keeps its own)")
+    args = parser.parse_args()
+
+    if args.sharded_dir:
+        ledger = ShardedLedger(args.shards, args.sharded_dir)
+        tracer = None
+        close = ledger.close
+    else:
+        store = open_store(os.environ.get('BANK_DATA_DIR', 'bank_data'), os.environ.get('BANK_STORAGE', 'memory'))
+        tracer = tracer_from_environment()
+        ledger = open_ledger(store, DEFAULT_ACCOUNT_TYPES, tracer)
+        close = store.close
+    try:
+        asyncio.run(serve(ledger, args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if tracer:
+            tracer.close()
+        close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,68 +1,132 @@
 from tkinter import *
 from tkinter import messagebox
 from tkinter import ttk
+import importlib
+import os
 import random
 from datetime import datetime
 
-# Import functionality modules
+# Import the modules the login screen and the ledger need at start-up. The
+# transaction, security, admin, financial tools and search index modules,
+# which bring in NumPy, are imported on first use through LazyComponent
 from account_management import AccountManagement
-from transaction_management import TransactionManagement
-from security_management import SecurityManagement
-from admin_panel import AdminPanel
-from financial_tools import FinancialTools
+from storage import open_store
+from ledger import DEFAULT_ACCOUNT_TYPES, DEFAULT_SECURITY_QUESTIONS
+from login_throttle import LoginThrottle
+from credentials import CredentialPool
+from prefix_index import PrefixIndex
+from ui_components import DialogPool
+from metrics import Metrics
+from tracing import open_ledger, tracer_from_environment
+
+
+class LazyComponent:
+    """Attribute that imports and builds a component on first access
+
+    The component class is called with the owning object, or with one of
+    its attributes when ``source`` names it. The result replaces the
+    descriptor in the instance dictionary, so later accesses are plain
+    attribute lookups.
+    """
+
+    def __init__(self, module, class_name, source=None):
+        self.module = module
+        self.class_name = class_name
+        self.source = source
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        component_class = getattr(importlib.import_module(self.module), self.class_name)
+        component = component_class(instance if self.source is None else getattr(instance, self.source))
+        instance.__dict__[self.name] = component
+        return component
+
 
 class BankSystem:
+    # Modules and windows that are not needed for the login screen
+    transaction_management = LazyComponent('transaction_management', 'TransactionManagement')
+    security_management = LazyComponent('security_management', 'SecurityManagement')
+    admin_panel = LazyComponent('admin_panel', 'AdminPanel')
+    financial_tools = LazyComponent('financial_tools', 'FinancialTools')
+    
+    # Inverted and range indexes for the admin search, built on first use
+    search_index = LazyComponent('search_index', 'AccountSearchIndex', source='users')
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Bank Management System")
         self.root.geometry("500x500")
         self.root.resizable(False, False)
         
-        # Initialize user data
-        self.users = {}
+        # Open the account store ('memory' or 'sqlite' backend)
+        self.data_dir = os.environ.get('BANK_DATA_DIR', 'bank_data')
+        self.storage_backend = os.environ.get('BANK_STORAGE', 'memory')
+        self.users = open_store(self.data_dir, self.storage_backend)
         self.current_user = None
-        self.login_attempts = {}
-        self.max_login_attempts = 3
+        self.login_throttle = LoginThrottle(max_attempts=3)
+        
+        # Worker threads for the slow PIN and security answer checks
+        self.credential_pool = CredentialPool(self.root)
+        
+        # Transaction and settings dialogs, built once and reused
+        self.dialogs = DialogPool(self.root)
+        
+        # Latency histograms of user and admin operations
+        self.metrics = Metrics()
+        
+        # Sampled step-by-step traces of ledger operations, when BANK_TRACE_FILE is set
+        self.tracer = tracer_from_environment()
         
         # Admin credentials
         self.admin_username = "admin"
         self.admin_password = "admin123"
         
-        # Create frames
-        self.create_account_frame = ttk.Frame(root)
-        self.login_frame = ttk.Frame(root)
-        self.user_frame = ttk.Frame(root)
+        # Only the login frame is built at startup; the others on first use
+        self.create_account_frame = None
+        self.user_frame = None
         
         # Create account type options
-        self.account_types = {
-            "Savings": {"min_balance": 1000, "interest_rate": 0.04},
-            "Current": {"min_balance": 5000, "interest_rate": 0.02},
-            "Fixed Deposit": {"min_balance": 10000, "interest_rate": 0.08}
-        }
+        self.account_types = {name: dict(settings) for name, settings in DEFAULT_ACCOUNT_TYPES.items()}
+        
+        # Headless ledger engine used by the UI modules
+        self.ledger = open_ledger(self.users, self.account_types, self.tracer, metrics=self.metrics)
+        
+        # Prefix index of usernames and names for autocomplete, built on first use
+        self.name_index = PrefixIndex(self.users)
         
         # Security questions
-        self.security_questions = [
-            "What is your mother's maiden name?",
-            "What is the name of your first pet?",
-            "What is your favorite book?",
-            "What is the name of the school you first attended?",
-            "What is your favorite color?"
-        ]
-        
-        # Initialize functionality modules
+        self.security_questions = list(DEFAULT_SECURITY_QUESTIONS)
+        
+        # Initialize the module needed by the login screen
         self.account_management = AccountManagement(self)
-        self.transaction_management = TransactionManagement(self)
-        self.security_management = SecurityManagement(self)
-        self.admin_panel = AdminPanel(self)
-        self.financial_tools = FinancialTools(self)
         
         # Create the UI
-        self.create_account_ui()
         self.login_ui()
-        self.user_ui()
         
         # Show login frame by default
         self.login_frame.pack(pady=20)
+        
+        # Flush the account store when the window is closed
+        self.root.protocol("WM_DELETE_WINDOW", self.shutdown)
+    
+    def shutdown(self):
+        """Flush the ledger to disk and close the application"""
+        # Keep the session's metrics when a file is configured
+        metrics_file = os.environ.get('BANK_METRICS_FILE')
+        if metrics_file:
+            self.metrics.dump(metrics_file)
+        if self.tracer:
+            self.tracer.close()
+        
+        # Drop queued credential checks so no worker outlives the window
+        self.credential_pool.shutdown()
+        self.users.close()
+        self.root.destroy()
     
     def update_balance_display(self):
         """Update the balance display in the user interface"""
@@ -74,7 +138,6 @@ class BankSystem:
         """Create the UI for account creation"""
         # Create Account Frame
         self.create_account_frame = Frame(self.root, bg='#F0F0F0')
-        self.create_account_frame.pack(pady=20)
 
         # Labels
         self.name_label = Label(self.create_account_frame, text="Name:", font=('Arial', 12), bg='#F0F0F0')
@@ -153,7 +216,7 @@ class BankSystem:
         ttk.Button(button_frame, text="Create Account", command=self.show_create_account).pack(side='left', padx=5)
         
         # Forgot PIN button
-        ttk.Button(button_frame, text="Forgot PIN?", command=self.security_management.forgot_pin).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Forgot PIN?", command=lambda: self.security_management.forgot_pin()).pack(side='left', padx=5)
         
         # Bind Enter key to login
         self.root.bind('<Return>', lambda e: self.account_management.login())
@@ -202,12 +265,22 @@ class BankSystem:
         
         # Create and pack management buttons
         ttk.Button(management_frame, text="Security Settings", command=self.security_management.show_security_settings).pack(side="left", padx=5, pady=5)
-        ttk.Button(management_frame, text="Financial Tools", command=self.financial_tools.show_financial_tools).pack(side="left", padx=5, pady=5)
+        ttk.Button(management_frame, text="Financial Tools", command=lambda: self.financial_tools.show_financial_tools()).pack(side="left", padx=5, pady=5)
         ttk.Button(management_frame, text="Change PIN", command=self.security_management.change_pin).pack(side="left", padx=5, pady=5)
         ttk.Button(management_frame, text="Logout", command=self.account_management.logout).pack(side="left", padx=5, pady=5)
     
     def show_create_account(self):
         """Show the create account frame and hide other frames"""
+        if self.create_account_frame is None:
+            self.create_account_ui()
+        self.login_frame.pack_forget()
+        if self.user_frame is not None:
+            self.user_frame.pack_forget()
+        self.create_account_frame.pack(pady=20)
+    
+    def show_user_dashboard(self):
+        """Show the user dashboard, building it on first use, and hide the login frame"""
+        if self.user_frame is None:
+            self.user_ui()
         self.login_frame.pack_forget()
-        self.user_frame.pack_forget()
-        self.create_account_frame.pack(pady=20) 
\ No newline at end of file
+        self.user_frame.pack(pady=20) 
\ No newline at end of file
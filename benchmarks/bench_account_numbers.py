@@ -0,0 +1,37 @@
+"""Show that account number allocation cost is flat as accounts grow
+
+Run from the project root:
+    python -m benchmarks.bench_account_numbers --accounts 1000000
+"""
+import argparse
+import time
+
+from account_numbers import AccountNumberAllocator, is_valid_account_number
+from storage import MemoryAccountStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=1000000)
+    parser.add_argument('--window', type=int, default=100000)
+    args = parser.parse_args()
+
+    store = MemoryAccountStore(None)
+    allocator = AccountNumberAllocator(store)
+
+    print(f"{'accounts':>10} {'us/allocation':>14}")
+    start = time.perf_counter()
+    for i in range(1, args.accounts + 1):
+        number = allocator.allocate()
+        store.add_account(f"user{i}", {'account_number': number})
+        if i % args.window == 0:
+            elapsed = time.perf_counter() - start
+            print(f"{i:>10} {elapsed / args.window * 1e6:>14.2f}")
+            start = time.perf_counter()
+
+    assert all(is_valid_account_number(number) for number in list(store._by_number)[:1000])
+    assert len(store._by_number) == args.accounts
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Time the admin user grid refresh at growing user counts
+
+Run from the project root:
+    python -m benchmarks.bench_admin_refresh --sizes 10000 100000 1000000
+
+The grid model is timed without a display. The old full repopulate is timed
+as building one row per user, which is a lower bound for what it did.
+"""
+import argparse
+import time
+
+from admin_panel import AdminPanel
+from storage import MemoryAccountStore
+from ui_components import VirtualRows
+
+
+class _BankSystem:
+    """Just enough of BankSystem for AdminPanel's data access"""
+
+    def __init__(self, users):
+        self.users = users
+
+
+def build_store(size):
+    """Return an in-memory store with size users"""
+    store = MemoryAccountStore(None)
+    for i in range(size):
+        name = f"user{i:07d}"
+        store.add_account(name, {
+            'name': name,
+            'account_number': f"{i:010d}",
+            'balance': 1000.0,
+            'account_type': 'Savings'
+        })
+    return store
+
+
+def timed(func, repeat=20):
+    """Return the mean seconds per call"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'users':>10} {'full rebuild (ms)':>18} {'window reload (ms)':>19} {'unchanged (ms)':>15}")
+    for size in args.sizes:
+        store = build_store(size)
+        admin_panel = AdminPanel(_BankSystem(store))
+        rows = VirtualRows(lambda: len(store), admin_panel._fetch_user_rows, height=20)
+        rows.scroll_to(size // 2)
+        version = store.version
+
+        full = timed(lambda: [admin_panel._fetch_user_rows(0, size)], repeat=1)
+
+        # Change one visible account so the reload has something to apply
+        def reload_after_change():
+            store.update_account(rows.rows[0][0], {'balance': time.perf_counter()})
+            assert len(rows.reload()) == 1
+        window = timed(reload_after_change)
+
+        unchanged = timed(lambda: store.changes_since(store.version))
+        assert store.changes_since(version)[0]
+        print(f"{size:>10} {full * 1000:>18.1f} {window * 1000:>19.3f} {unchanged * 1000:>15.4f}")
+
+
+if __name__ == '__main__':
+    main()
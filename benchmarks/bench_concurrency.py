@@ -0,0 +1,70 @@
+"""Stress concurrent transfers and check that money is conserved
+
+Run from the project root:
+    python -m benchmarks.bench_concurrency --threads 8 --accounts 50 --transfers 20000
+"""
+import argparse
+import random
+import threading
+import time
+
+from ledger import LedgerError
+from benchmarks.bench_ledger import build_ledger
+
+
+def worker(ledger, names, transfers, seed, counts):
+    """Post random transfers between a small set of hot accounts"""
+    rng = random.Random(seed)
+    completed = rejected = 0
+    for _ in range(transfers):
+        sender, recipient = rng.sample(names, 2)
+        try:
+            ledger.transfer(sender, recipient, rng.randint(1, 2000))
+            completed += 1
+        except LedgerError:
+            rejected += 1
+    counts.append((completed, rejected))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--accounts', type=int, default=50)
+    parser.add_argument('--transfers', type=int, default=20000, help="transfers per thread")
+    args = parser.parse_args()
+
+    # Make thread switches frequent so unsynchronized code would break
+    import sys
+    sys.setswitchinterval(1e-6)
+
+    ledger = build_ledger(args.accounts)
+    names = [f"user{i}" for i in range(args.accounts)]
+    total_before = sum(ledger.store[name]['balance'] for name in names)
+
+    counts = []
+    threads = [threading.Thread(target=worker, args=(ledger, names, args.transfers, seed, counts))
+               for seed in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    completed = sum(c for c, _ in counts)
+    rejected = sum(r for _, r in counts)
+    total_after = sum(ledger.store[name]['balance'] for name in names)
+    print(f"{completed} transfers ({rejected} rejected) on {args.threads} threads in {elapsed:.2f}s, "
+          f"{completed / elapsed:,.0f} transfers/s")
+
+    # Money supply is conserved and no account broke its minimum balance
+    assert abs(total_after - total_before) < 1e-6, (total_before, total_after)
+    for name in names:
+        user_data = ledger.store[name]
+        assert user_data['balance'] >= ledger.min_balance(user_data), name
+        assert len(ledger.get_transactions(name)) >= 1
+    print(f"money supply conserved: {total_after:,.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Measure dialog open latency and Tk object count over a long session
+
+Opens and closes the Deposit, Withdraw, Transfer, Change PIN and Security
+Settings dialogs many times, as a teller would, and reports how long each
+open takes and how many Tk widgets exist at the end. With --no-reuse every
+open builds a new window, as before the dialog pool, for comparison.
+Needs a display. Run from the project root:
+    python -m benchmarks.bench_dialogs --cycles 500
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tkinter
+
+from ui_components import DialogPool
+
+
+def count_widgets(root):
+    """Return the number of Tk widgets in the application"""
+    return len(root.tk.splitlist(root.tk.call('info', 'commands', '.*')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cycles', type=int, default=500, help="times each dialog is opened")
+    parser.add_argument('--no-reuse', action='store_true', help="build a new window on every open")
+    args = parser.parse_args()
+
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError as e:
+        print(f"no display, skipped: {e}")
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ['BANK_DATA_DIR'] = data_dir
+        os.environ['BANK_STORAGE'] = 'memory'
+        from bank_system import BankSystem
+
+        bank_system = BankSystem(root)
+        bank_system.ledger.create_account('teller', '30', '50000', '1234', 'Savings',
+                                          bank_system.security_questions[0], 'blue')
+        bank_system.current_user = 'teller'
+        transactions = bank_system.transaction_management
+        security = bank_system.security_management
+        dialogs = [
+            ('deposit', transactions.deposit),
+            ('withdraw', transactions.withdraw),
+            ('transfer', transactions.transfer),
+            ('change_pin', security.change_pin),
+            ('security_settings', security.show_security_settings),
+        ]
+        root.update()
+        widgets_before = count_widgets(root)
+
+        first_open = {}
+        reopen = {key: [] for key, _ in dialogs}
+        start = time.perf_counter()
+        for cycle in range(args.cycles):
+            for key, open_dialog in dialogs:
+                if args.no_reuse:
+                    bank_system.dialogs = DialogPool(root)
+                opened = time.perf_counter()
+                open_dialog()
+                root.update_idletasks()
+                elapsed = time.perf_counter() - opened
+                if cycle == 0:
+                    first_open[key] = elapsed
+                else:
+                    reopen[key].append(elapsed)
+                bank_system.dialogs.hide(key)
+                root.update()
+        session = time.perf_counter() - start
+        widgets_after = count_widgets(root)
+        bank_system.shutdown()
+
+    print(f"{args.cycles} cycles of {len(dialogs)} dialogs in {session:.2f}s "
+          f"({'rebuilt' if args.no_reuse else 'reused'} on every open)")
+    for key, _ in dialogs:
+        times = sorted(reopen[key]) or [first_open[key]]
+        print(f"  {key:18s} first open {first_open[key] * 1000:7.2f}ms, "
+              f"later median {statistics.median(times) * 1000:6.2f}ms, "
+              f"p99 {times[min(len(times) - 1, int(len(times) * 0.99))] * 1000:6.2f}ms")
+    print(f"Tk widgets: {widgets_before} before, {widgets_after} after "
+          f"({(widgets_after - widgets_before) / max(1, args.cycles * len(dialogs)):.1f} per open)")
+
+
+if __name__ == '__main__':
+    main()
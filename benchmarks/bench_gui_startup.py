@@ -0,0 +1,84 @@
+"""Measure the time from process start to the first interactive frame
+
+Run from the project root:
+    python -m benchmarks.bench_gui_startup --runs 10
+
+Starts main.py repeatedly with BANK_STARTUP_REPORT=exit against an empty
+data directory and reports the median and best times, so the numbers can
+be compared across releases. Without a display only the import of the
+application, which is most of the start-up, is measured.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the login frame does not need; importing them at start-up is a regression
+DEFERRED_MODULES = ('numpy', 'admin_panel', 'financial_tools', 'search_index', 'transaction_management')
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import bank_system
+print(json.dumps({'import_s': time.perf_counter() - start, 'modules': len(sys.modules),
+                  'loaded': [name for name in %r if name in sys.modules]}))
+"""
+
+
+def run_python(args, env):
+    """Run a Python child in the project root and return its last JSON line"""
+    output = subprocess.run([sys.executable, *args], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True, timeout=60).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help="print the results as one JSON object")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ, BANK_DATA_DIR=data_dir, BANK_STARTUP_REPORT='exit')
+
+        imports = [run_python(['-c', IMPORT_PROBE % (DEFERRED_MODULES,)], env) for _ in range(args.runs)]
+        results['import_s'] = statistics.median(probe['import_s'] for probe in imports)
+        results['modules'] = imports[-1]['modules']
+        results['deferred_loaded'] = imports[-1]['loaded']
+
+        if os.environ.get('DISPLAY') or sys.platform in ('win32', 'darwin'):
+            reports = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                report = run_python(['main.py'], env)
+                report['wall_s'] = time.perf_counter() - start
+                reports.append(report)
+            for key in ('process_to_interactive_s', 'main_to_interactive_s', 'wall_s'):
+                values = [report[key] for report in reports if report[key] is not None]
+                if values:
+                    results[key] = {'median': statistics.median(values), 'min': min(values)}
+
+    if args.json:
+        print(json.dumps(results))
+        return
+
+    print(f"import bank_system: {results['import_s'] * 1000:.1f}ms, {results['modules']} modules loaded")
+    if results['deferred_loaded']:
+        print(f"  imported at start-up but only needed later: {', '.join(results['deferred_loaded'])}")
+    if 'main_to_interactive_s' not in results:
+        print("no display: skipped the first-frame measurement")
+    for key in ('process_to_interactive_s', 'main_to_interactive_s', 'wall_s'):
+        if key in results:
+            print(f"{key}: median {results[key]['median'] * 1000:.1f}ms, "
+                  f"best {results[key]['min'] * 1000:.1f}ms over {args.runs} runs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""Measure the month-end interest run over a large number of accounts
+
+Run from the project root:
+    python -m benchmarks.bench_interest --accounts 200000
+"""
+import argparse
+import time
+
+from credentials import CredentialHasher
+from interest_accrual import accrue_interest
+from ledger import Ledger, DEFAULT_ACCOUNT_TYPES
+from storage import MemoryAccountStore
+
+
+def build_ledger(num_accounts):
+    """Return a ledger over an in-memory store with funded accounts"""
+    # Cheap PIN hashing, as account setup is not what is measured
+    ledger = Ledger(MemoryAccountStore(None), DEFAULT_ACCOUNT_TYPES, CredentialHasher(n=2, r=1))
+    account_types = list(DEFAULT_ACCOUNT_TYPES)
+    for i in range(num_accounts):
+        name = f"user{i:07d}"
+        ledger.create_account(name, '30', '50000', '1234', account_types[i % 3],
+                              "What is your favorite color?", 'blue')
+        ledger.store.update_account(name, {'balance': 10000 + i % 50000})
+    return ledger
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=200000)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    ledger = build_ledger(args.accounts)
+    start = time.perf_counter()
+    result = accrue_interest(ledger, '2000-01', args.chunk_size)
+    elapsed = time.perf_counter() - start
+    print(result)
+    print(f"{result.accounts / elapsed:,.0f} accounts/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Measure headless ledger throughput for a batch of mixed operations
+
+Run from the project root:
+    python -m benchmarks.bench_ledger --accounts 1000 --operations 100000
+"""
+import argparse
+import random
+import time
+
+from credentials import CredentialHasher
+from ledger import Ledger, LedgerError, DEFAULT_ACCOUNT_TYPES
+from storage import MemoryAccountStore
+
+
+def build_ledger(num_accounts):
+    """Return a ledger over an in-memory store with funded accounts"""
+    # Cheap PIN hashing, as account setup is not what is measured
+    ledger = Ledger(MemoryAccountStore(None), DEFAULT_ACCOUNT_TYPES, CredentialHasher(n=2, r=1))
+    account_types = list(DEFAULT_ACCOUNT_TYPES)
+    for i in range(num_accounts):
+        name = f"user{i}"
+        ledger.create_account(name, '30', '50000', '1234', account_types[i % 3],
+                              "What is your favorite color?", 'blue')
+        ledger.deposit(name, 20000)
+    return ledger
+
+
+def run(ledger, num_accounts, num_operations, seed=0):
+    """Run a seeded mix of operations and return (seconds, rejected)"""
+    rng = random.Random(seed)
+    names = [f"user{i}" for i in range(num_accounts)]
+    rejected = 0
+
+    start = time.perf_counter()
+    for _ in range(num_operations):
+        op = rng.random()
+        name = rng.choice(names)
+        amount = rng.randint(1, 500)
+        try:
+            if op < 0.4:
+                ledger.deposit(name, amount)
+            elif op < 0.7:
+                ledger.withdraw(name, amount)
+            else:
+                ledger.transfer(name, rng.choice(names), amount)
+        except LedgerError:
+            rejected += 1
+    return time.perf_counter() - start, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--operations', type=int, default=100000)
+    args = parser.parse_args()
+
+    ledger = build_ledger(args.accounts)
+    elapsed, rejected = run(ledger, args.accounts, args.operations)
+    print(f"{args.operations} operations in {elapsed:.3f}s "
+          f"({args.operations / elapsed:,.0f} ops/s, {rejected} rejected)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Measure vectorized pricing and amortization of a loan book
+
+Run from the project root:
+    python -m benchmarks.bench_loans --loans 1000000 --schedule-loans 5000
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from loan_calculator import LOAN_FIELDS, amortization_schedule, format_csv, loan_payments, price_file, schedule_file
+
+
+def make_loans(num_loans, seed=0):
+    """Return seeded (principal, rate, months) arrays, some at a zero rate"""
+    rng = np.random.default_rng(seed)
+    principal = rng.uniform(1000, 1000000, num_loans).round(2)
+    rate = rng.uniform(0, 15, num_loans).round(2)
+    rate[rng.random(num_loans) < 0.01] = 0
+    months = rng.integers(6, 361, num_loans).astype(float)
+    return principal, rate, months
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--loans', type=int, default=1000000)
+    parser.add_argument('--schedule-loans', type=int, default=5000, help="loans in the schedule export")
+    args = parser.parse_args()
+
+    principal, rate, months = make_loans(args.loans)
+
+    start = time.perf_counter()
+    emi, total_payment, total_interest = loan_payments(principal, rate, months)
+    elapsed = time.perf_counter() - start
+    assert np.isfinite(emi).all()
+    print(f"computed {args.loans} loans in {elapsed * 1000:.1f}ms ({args.loans / elapsed:,.0f} loans/s)")
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'loans.csv')
+        target = os.path.join(directory, 'priced.csv')
+        with open(source, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(LOAN_FIELDS)
+            f.write(format_csv((principal, rate, months), (2, 2, 0)))
+
+        start = time.perf_counter()
+        count = price_file(source, target)
+        elapsed = time.perf_counter() - start
+        print(f"priced {count} loans file to file in {elapsed:.2f}s ({count / elapsed:,.0f} loans/s)")
+
+        # One 30-year schedule with a prepayment and a rate change
+        start = time.perf_counter()
+        for _ in range(100):
+            schedule = amortization_schedule(300000, 6.5, 360, {60: 20000}, {120: 8.0})
+        elapsed = (time.perf_counter() - start) / 100
+        print(f"30-year schedule ({len(schedule)} periods) in {elapsed * 1000:.2f}ms")
+
+        # Schedules of a loan file, file to file
+        with open(source, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(LOAN_FIELDS)
+            f.write(format_csv(make_loans(args.schedule_loans, seed=1), (2, 2, 0)))
+        start = time.perf_counter()
+        loans, rows = schedule_file(source, target)
+        elapsed = time.perf_counter() - start
+        print(f"schedules of {loans} loans ({rows} rows) file to file in {elapsed:.2f}s "
+              f"({rows / elapsed:,.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Show that the login throttle stays bounded and flat under a flood
+
+Run from the project root:
+    python -m benchmarks.bench_login_throttle --names 1000000
+"""
+import argparse
+import time
+
+from login_throttle import LoginThrottle
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--names', type=int, default=1000000, help="distinct names in the flood")
+    parser.add_argument('--max-entries', type=int, default=100000)
+    parser.add_argument('--window', type=int, default=100000)
+    args = parser.parse_args()
+
+    throttle = LoginThrottle(max_attempts=3, window=900, max_entries=args.max_entries)
+
+    # Every failure is for a new name, as in a credential-stuffing run
+    print(f"{'failures':>10} {'entries':>8} {'us/failure':>11} {'us/check':>9}")
+    start = time.perf_counter()
+    for i in range(1, args.names + 1):
+        throttle.record_failure(f"user{i}")
+        if i % args.window == 0:
+            elapsed = time.perf_counter() - start
+            check_start = time.perf_counter()
+            for j in range(i - 1000, i):
+                throttle.is_locked(f"user{j}")
+            check = (time.perf_counter() - check_start) / 1000
+            print(f"{i:>10} {len(throttle):>8} {elapsed / args.window * 1e6:>11.2f} {check * 1e6:>9.2f}")
+            start = time.perf_counter()
+
+    assert len(throttle) <= args.max_entries
+
+
+if __name__ == '__main__':
+    main()
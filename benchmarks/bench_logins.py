@@ -0,0 +1,87 @@
+"""Measure scrypt logins per second with concurrent attempts
+
+Logins run on a worker pool, as the Tk UI runs them, while the main thread
+ticks like an event loop; the longest gap between its ticks shows how long
+the UI would stall. Run from the project root:
+    python -m benchmarks.bench_logins --logins 200 --workers 1 2 4
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from ledger import Ledger, LedgerError, DEFAULT_ACCOUNT_TYPES
+from login_throttle import LoginThrottle
+from storage import MemoryAccountStore
+
+TICK = 0.005
+
+
+def build_ledger(num_accounts):
+    """Return a ledger over an in-memory store with hashed PINs"""
+    ledger = Ledger(MemoryAccountStore(None), DEFAULT_ACCOUNT_TYPES)
+    for i in range(num_accounts):
+        ledger.create_account(f"user{i}", '30', '50000', f"{i % 10000:04d}", 'Savings',
+                              "What is your favorite color?", 'blue')
+    return ledger
+
+
+def attempt(ledger, throttle, name, pin):
+    """Return True if a login succeeds"""
+    try:
+        ledger.authenticate(name, pin, throttle)
+        return True
+    except LedgerError:
+        return False
+
+
+def run(ledger, num_accounts, num_logins, workers, seed=0):
+    """Run a seeded mix of logins and return (seconds, accepted, longest tick gap)"""
+    rng = random.Random(seed)
+    # One in ten attempts uses a wrong PIN; lockouts are kept out of the way
+    throttle = LoginThrottle(max_attempts=num_logins + 1)
+    attempts = []
+    for _ in range(num_logins):
+        i = rng.randrange(num_accounts)
+        pin = f"{i % 10000:04d}" if rng.random() >= 0.1 else f"{(i + 1) % 10000:04d}"
+        attempts.append((f"user{i}", pin))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        start = time.perf_counter()
+        futures = [pool.submit(attempt, ledger, throttle, name, pin) for name, pin in attempts]
+
+        # Tick like an event loop until every attempt is done
+        longest_gap = 0.0
+        last = time.perf_counter()
+        while not all(future.done() for future in futures):
+            time.sleep(TICK)
+            now = time.perf_counter()
+            longest_gap = max(longest_gap, now - last)
+            last = now
+        wait(futures)
+        elapsed = time.perf_counter() - start
+    return elapsed, sum(future.result() for future in futures), longest_gap
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=20)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    ledger = build_ledger(args.accounts)
+
+    # What the UI would freeze for if it checked a PIN itself
+    start = time.perf_counter()
+    attempt(ledger, LoginThrottle(), 'user0', '9999')
+    print(f"one check on the calling thread: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    print(f"{'workers':>8} {'logins/s':>9} {'accepted':>9} {'max tick gap':>13}")
+    for workers in args.workers:
+        elapsed, accepted, gap = run(ledger, args.accounts, args.logins, workers)
+        print(f"{workers:>8} {args.logins / elapsed:>9.1f} {accepted:>9} {gap * 1000:>11.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Measure the overhead of the latency instrumentation
+
+Run from the project root:
+    python -m benchmarks.bench_metrics --operations 100000
+
+Times deposits through a Ledger recording its logged transactions and
+through one without metrics, in many short alternating rounds so machine
+noise hits both alike, and reports the added cost per operation from the
+median rounds. The cost of timing
+an empty step into a Recorder, and of an empty timed block, are
+measured on their own too, as they vary less than a difference of two
+noisy totals. Also checks the histogram percentiles against exact ones.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from credentials import CredentialHasher
+from ledger import Ledger, DEFAULT_ACCOUNT_TYPES
+from metrics import PERCENTILES, LatencyHistogram, Metrics, perf_counter_ns
+from storage import MemoryAccountStore
+
+
+def run_round(ledger, names, operations):
+    """Return the seconds taken by a round of deposits"""
+    deposit = ledger.deposit
+    start = time.perf_counter()
+    for i in range(operations):
+        deposit(names[i % len(names)], 10.0)
+    return time.perf_counter() - start
+
+
+def record_cost(recorder, operations):
+    """Return the seconds taken by a round of empty steps, timed as the ledger does if recorder is given"""
+    def empty():
+        pass
+    start = time.perf_counter()
+    if recorder is None:
+        for _ in range(operations):
+            empty()
+    else:
+        record = recorder.record
+        for _ in range(operations):
+            step = perf_counter_ns()
+            empty()
+            record(perf_counter_ns() - step)
+    return time.perf_counter() - start
+
+
+def timer_cost(metrics, operations):
+    """Return the seconds taken by a round of empty timed blocks"""
+    timer = metrics.timer
+    start = time.perf_counter()
+    for _ in range(operations):
+        with timer('empty'):
+            pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--operations', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--deposit-rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    store = MemoryAccountStore(None)
+    hasher = CredentialHasher(n=2, r=1)
+    disabled = Ledger(store, DEFAULT_ACCOUNT_TYPES, hasher)
+    enabled = Ledger(store, DEFAULT_ACCOUNT_TYPES, hasher, Metrics())
+    names = [f"user{i}" for i in range(args.accounts)]
+    for name in names:
+        disabled.create_account(name, '30', '50000', '1234', 'Savings', "What is your favorite color?", 'blue')
+
+    # Swap which ledger goes first each round, as the account histories
+    # both append to grow as the rounds go on
+    deposits = max(1, args.operations // args.deposit_rounds)
+    times = {disabled: [], enabled: []}
+    for round_number in range(args.deposit_rounds):
+        order = (disabled, enabled) if round_number % 2 else (enabled, disabled)
+        for ledger in order:
+            times[ledger].append(run_round(ledger, names, deposits))
+
+    median_disabled = statistics.median(times[disabled])
+    median_enabled = statistics.median(times[enabled])
+    per_op_disabled = median_disabled / deposits * 1e6
+    per_op_enabled = median_enabled / deposits * 1e6
+    print(f"deposit: {per_op_disabled:.2f}us without metrics, {per_op_enabled:.2f}us with metrics "
+          f"(+{per_op_enabled - per_op_disabled:.2f}us, {median_enabled / median_disabled - 1:+.1%})")
+
+    recorder = Metrics().recorder('empty')
+    timed = min(record_cost(recorder, args.operations) for _ in range(args.rounds))
+    untimed = min(record_cost(None, args.operations) for _ in range(args.rounds))
+    cost_ns = (timed - untimed) / args.operations * 1e9
+    print(f"recorder: {cost_ns:.0f}ns per timed step, {cost_ns / 1e3 / per_op_disabled:.1%} of a deposit")
+
+    timed = min(timer_cost(Metrics(), args.operations) for _ in range(args.rounds))
+    untimed = min(timer_cost(Metrics(enabled=False), args.operations) for _ in range(args.rounds))
+    cost_ns = (timed - untimed) / args.operations * 1e9
+    print(f"timer: {cost_ns:.0f}ns per timed block, {cost_ns / 1e3 / per_op_disabled:.1%} of a deposit")
+
+    # Histogram percentiles against the exact values of the same samples
+    rng = random.Random(0)
+    samples = [int(rng.lognormvariate(11, 1.5)) for _ in range(args.operations)]
+    histogram = LatencyHistogram()
+    start = time.perf_counter()
+    for sample in samples:
+        histogram.record(sample)
+    record_ns = (time.perf_counter() - start) / len(samples) * 1e9
+    samples.sort()
+    print(f"histogram: {record_ns:.0f}ns per record, {len(histogram.counts)} buckets")
+    for percent in PERCENTILES:
+        exact = samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+        estimate = histogram.percentile(percent)
+        print(f"  p{percent:g}: {estimate / 1e3:.1f}us, exact {exact / 1e3:.1f}us ({estimate / exact - 1:+.2%})")
+
+
+if __name__ == '__main__':
+    main()
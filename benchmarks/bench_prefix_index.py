@@ -0,0 +1,73 @@
+"""Measure prefix searches and updates of the username index
+
+Run from the project root:
+    python -m benchmarks.bench_prefix_index --accounts 1000000
+"""
+import argparse
+import random
+import time
+
+from prefix_index import PrefixIndex
+from storage import MemoryAccountStore
+
+FIRST_NAMES = ['Alice', 'Bob', 'Carol', 'David', 'Erin', 'Frank', 'Grace', 'Heidi', 'Ivan', 'Judy']
+
+
+def build_store(num_accounts, seed=0):
+    """Return an in-memory store of accounts with seeded holder names"""
+    rng = random.Random(seed)
+    store = MemoryAccountStore(None)
+    for i in range(num_accounts):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.randrange(1000000):06d}"
+        store.add_account(f"user{i}", {'name': name, 'account_number': str(i), 'balance': 0})
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=10000)
+    args = parser.parse_args()
+
+    store = build_store(args.accounts)
+    index = PrefixIndex(store)
+    start = time.perf_counter()
+    index.sync()
+    print(f"built index of {len(index)} accounts in {time.perf_counter() - start:.2f}s")
+
+    # Prefixes as typed: growing username and name prefixes
+    rng = random.Random(1)
+    prefixes = []
+    for _ in range(args.queries):
+        term = f"user{rng.randrange(args.accounts)}" if rng.random() < 0.5 else store[f"user{rng.randrange(args.accounts)}"]['name']
+        prefixes.append(term[:rng.randint(1, len(term))])
+
+    start = time.perf_counter()
+    found = sum(len(index.search(prefix)) for prefix in prefixes)
+    elapsed = time.perf_counter() - start
+    print(f"{args.queries} searches in {elapsed:.3f}s ({elapsed / args.queries * 1e6:.1f}us each, {found} matches)")
+
+    # Create, rename and delete accounts, then search again
+    changes = 1000
+    start = time.perf_counter()
+    for i in range(changes):
+        store.add_account(f"new{i}", {'name': f"Zed {i}", 'account_number': f"n{i}", 'balance': 0})
+        store.update_account(f"user{i}", {'name': f"Renamed {i}"})
+        store.delete_account(f"user{args.accounts - 1 - i}")
+        index.search('zed')
+    elapsed = time.perf_counter() - start
+    print(f"{changes} create/rename/delete rounds with a search after each in {elapsed:.2f}s "
+          f"({elapsed / changes * 1000:.2f}ms per round)")
+    assert index.search('renamed 0') == ['user0']
+    assert index.search(f"user{args.accounts - 1}", limit=1) != [f"user{args.accounts - 1}"]
+
+    # Balance updates overflowing the change feed must not force a rebuild
+    for i in range(store.CHANGE_FEED_SIZE * 2):
+        store.update_account(f"user{i % 1000}", {'balance': i})
+    start = time.perf_counter()
+    index.search('zed')
+    print(f"search after {store.CHANGE_FEED_SIZE * 2} balance updates in {(time.perf_counter() - start) * 1000:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Measure admin searches over accounts and transactions
+
+Run from the project root:
+    python -m benchmarks.bench_search_index --accounts 200000 --transactions 1000000
+"""
+import argparse
+import random
+import time
+
+from search_index import AccountSearchIndex
+from storage import MemoryAccountStore
+
+FIRST_NAMES = ['Alice', 'Bob', 'Carol', 'David', 'Erin', 'Frank', 'Grace', 'Heidi', 'Ivan', 'Judy']
+LAST_NAMES = ['Smith', 'Jones', 'Brown', 'Taylor', 'Wilson', 'Evans', 'Thomas', 'Roberts', 'Walker', 'Wright']
+
+
+def build_store(num_accounts, num_transactions, seed=0):
+    """Return an in-memory store with seeded accounts and transactions"""
+    rng = random.Random(seed)
+    store = MemoryAccountStore(None)
+    names = [f"user{i:07d}" for i in range(num_accounts)]
+    for i, username in enumerate(names):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}{rng.randrange(1000)}"
+        store.add_account(username, {'name': name, 'account_number': f"{i:010d}", 'balance': 0})
+    timestamp = 1700000000
+    for _ in range(num_transactions):
+        log_transaction(store, rng, names, timestamp)
+        timestamp += 1
+    return store, names
+
+
+def log_transaction(store, rng, names, timestamp):
+    """Append one seeded deposit, withdrawal or transfer"""
+    name = rng.choice(names)
+    amount = round(rng.uniform(1, 5000), 2)
+    kind = rng.random()
+    if kind < 0.4:
+        transaction_type = "Deposit"
+    elif kind < 0.7:
+        transaction_type, amount = "Withdrawal", -amount
+    else:
+        transaction_type, amount = "Transfer to " + rng.choice(names), -amount
+    balance = store.get(name)['balance'] + amount
+    store.append_transaction(name, {'timestamp': timestamp, 'type': transaction_type,
+                                    'amount': amount, 'balance': balance})
+
+
+def timed(fn, repeat=100):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=200000)
+    parser.add_argument('--transactions', type=int, default=1000000)
+    args = parser.parse_args()
+
+    store, names = build_store(args.accounts, args.transactions)
+    index = AccountSearchIndex(store)
+    start = time.perf_counter()
+    index.sync()
+    print(f"indexed {args.accounts} accounts and {args.transactions} transactions "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    queries = [
+        ("name like 'smith12'", lambda: index.names_like('smith12')),
+        ("name like 'wrihgt' (fuzzy)", lambda: index.names_like('wrihgt', limit=20)),
+        ("account number prefix '0000012'", lambda: index.account_numbers_with_prefix('0000012')),
+        ("balance between 1000 and 1010", lambda: index.balance_between(1000, 1010)),
+        ("transfers over $4990", lambda: index.transactions_over('Transfer to', 4990)),
+    ]
+    for label, query in queries:
+        elapsed, result = timed(query)
+        print(f"{label:<32} {elapsed * 1000:8.3f}ms {len(result):>6} results")
+
+    # Keep logging and query after every batch of changes
+    rng = random.Random(1)
+    for batch in (1, 100, 1000):
+        timestamp = 1800000000
+        elapsed = 0.0
+        for _ in range(20):
+            for _ in range(batch):
+                log_transaction(store, rng, names, timestamp)
+                timestamp += 1
+            start = time.perf_counter()
+            index.transactions_over('Deposit', 4990)
+            elapsed += time.perf_counter() - start
+        print(f"query after {batch:>5} new transactions {elapsed / 20 * 1000:8.3f}ms")
+
+    fresh = AccountSearchIndex(store)
+    assert sorted(fresh.balance_between(-1e12, 1e12, len(names))) == sorted(index.balance_between(-1e12, 1e12, len(names)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""Measure request latency of the teller service under concurrent sessions
+
+Starts bank_server.py on a free localhost port with a scratch data directory
+(or targets a running server with --port) and drives it from many pipelined
+sessions. Run from the project root:
+    python -m benchmarks.bench_server --sessions 50 --requests 500 --pipeline 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+
+class Client:
+    """Pipelining client for one teller session"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+
+    @classmethod
+    async def connect(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    def send(self, op, **fields):
+        """Queue a request and return its id"""
+        self.next_id += 1
+        fields.update(id=self.next_id, op=op)
+        self.writer.write((json.dumps(fields) + '\n').encode())
+        return self.next_id
+
+    async def receive(self):
+        """Return the next response"""
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Server closed the connection")
+        return json.loads(line)
+
+    async def call(self, op, **fields):
+        """Send one request and wait for its response"""
+        self.send(op, **fields)
+        await self.writer.drain()
+        return await self.receive()
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def random_request(rng, names, name):
+    """Return (op, fields) for a teller request in a typical mix"""
+    op = rng.random()
+    if op < 0.3:
+        return 'deposit', {'amount': rng.randint(1, 500)}
+    if op < 0.55:
+        return 'withdraw', {'amount': rng.randint(1, 500)}
+    if op < 0.8:
+        return 'transfer', {'recipient': rng.choice(names), 'amount': rng.randint(1, 500)}
+    if op < 0.9:
+        return 'balance', {}
+    return 'history', {'limit': 20}
+
+
+async def run_session(host, port, name, names, requests, pipeline, seed, latencies):
+    """Log in and keep up to ``pipeline`` requests in flight"""
+    client = await Client.connect(host, port)
+    response = await client.call('login', name=name, pin='1234')
+    assert response['ok'], response
+
+    rng = random.Random(seed)
+    sent_at = {}
+    window = asyncio.Semaphore(pipeline)
+
+    async def reader():
+        for _ in range(requests):
+            response = await client.receive()
+            latencies.append(time.perf_counter() - sent_at.pop(response['id']))
+            window.release()
+
+    reading = asyncio.create_task(reader())
+    for _ in range(requests):
+        await window.acquire()
+        op, fields = random_request(rng, names, name)
+        request_id = client.send(op, **fields)
+        sent_at[request_id] = time.perf_counter()
+        await client.writer.drain()
+    await reading
+    await client.close()
+
+
+async def setup_accounts(host, port, names):
+    """Create and fund the accounts used by the sessions"""
+    client = await Client.connect(host, port)
+    for name in names:
+        await client.call('create_account', name=name, age=30, salary=50000, pin='1234',
+                          account_type='Savings', security_question="What is your favorite color?",
+                          security_answer='blue')
+        await client.call('login', name=name, pin='1234')
+        await client.call('deposit', amount=100000)
+    await client.close()
+
+
+def percentile(sorted_values, fraction):
+    """Return a percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+async def run(host, port, sessions, requests, pipeline):
+    """Drive the server and return (seconds, latencies)"""
+    names = [f"teller{i}" for i in range(sessions)]
+    await setup_accounts(host, port, names)
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(host, port, name, names, requests, pipeline, seed, latencies)
+                           for seed, name in enumerate(names)))
+    return time.perf_counter() - start, latencies
+
+
+def start_server(data_dir, workers):
+    """Start bank_server.py on a free port and return (process, port)"""
+    env = dict(os.environ, BANK_DATA_DIR=data_dir)
+    process = subprocess.Popen([sys.executable, 'bank_server.py', '--port', '0', '--workers', str(workers)],
+                               env=env, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("Listening on"):
+        process.kill()
+        raise RuntimeError("Server failed to start")
+    return process, int(line.rsplit(':', 1)[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, help="use a running server instead of starting one")
+    parser.add_argument('--workers', type=int, default=8, help="worker threads of the started server")
+    parser.add_argument('--sessions', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=500, help="requests per session")
+    parser.add_argument('--pipeline', type=int, default=8, help="requests in flight per session")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        process = None
+        port = args.port
+        if port is None:
+            process, port = start_server(data_dir, args.workers)
+        try:
+            elapsed, latencies = asyncio.run(run(args.host, port, args.sessions, args.requests, args.pipeline))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    latencies.sort()
+    print(f"{len(latencies)} requests from {args.sessions} sessions (pipeline {args.pipeline}) "
+          f"in {elapsed:.2f}s, {len(latencies) / elapsed:,.0f} requests/s")
+    print(f"latency p50 {percentile(latencies, 0.50) * 1000:.2f}ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f}ms, "
+          f"max {latencies[-1] * 1000:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Measure posting throughput of the sharded ledger from 1 to N shards
+
+A share of the transfers goes to an account on another shard and runs
+through the two-phase commit. The operations are posted in batches, then
+a smaller set is posted one at a time by concurrent teller threads, as
+BankServer does. Run from the project root:
+    python -m benchmarks.bench_sharding --max-shards 4 --operations 200000 --cross-shard 0.1
+"""
+import argparse
+import os
+import random
+import threading
+import time
+
+from credentials import CredentialHasher
+from ledger import LedgerError
+from sharded_ledger import ShardedLedger
+
+
+def build_sharded_ledger(num_shards, num_accounts, batch_size):
+    """Return a memory-only sharded ledger with funded accounts"""
+    # Cheap PIN hashing, as account setup is not what is measured
+    ledger = ShardedLedger(num_shards, hasher=CredentialHasher(n=2, r=1))
+    for i in range(num_accounts):
+        ledger.create_account(f"user{i}", '30', '50000', '1234', 'Savings', "What is your favorite color?", 'blue')
+    names = [f"user{i}" for i in range(num_accounts)]
+    for start in range(0, num_accounts, batch_size):
+        ledger.run_batch([('deposit', name, 20000) for name in names[start:start + batch_size]])
+    return ledger
+
+
+def make_operations(ledger, num_accounts, num_operations, cross_shard, seed=0):
+    """Return a seeded mix of deposits, withdrawals and transfers"""
+    rng = random.Random(seed)
+    names = [f"user{i}" for i in range(num_accounts)]
+    by_shard = {}
+    for name in names:
+        by_shard.setdefault(ledger.shard_of(name), []).append(name)
+
+    operations = []
+    for _ in range(num_operations):
+        op = rng.random()
+        name = rng.choice(names)
+        amount = rng.randint(1, 500)
+        if op < 0.4:
+            operations.append(('deposit', name, amount))
+        elif op < 0.7:
+            operations.append(('withdraw', name, amount))
+        else:
+            shard = ledger.shard_of(name)
+            if ledger.num_shards > 1 and rng.random() < cross_shard:
+                shard = rng.choice([other for other in by_shard if other != shard])
+            operations.append(('transfer', name, rng.choice(by_shard[shard]), amount))
+    return operations
+
+
+def run(ledger, operations, batch_size):
+    """Post the operations in batches and return (seconds, rejected, net cash)
+
+    Net cash is the sum of accepted deposits less accepted withdrawals.
+    """
+    rejected = 0
+    net_cash = 0
+    start = time.perf_counter()
+    for offset in range(0, len(operations), batch_size):
+        batch = operations[offset:offset + batch_size]
+        for operation, result in zip(batch, ledger.run_batch(batch)):
+            if isinstance(result, LedgerError):
+                rejected += 1
+            elif operation[0] != 'transfer':
+                net_cash += result['amount']
+    return time.perf_counter() - start, rejected, net_cash
+
+
+def run_tellers(ledger, operations, tellers):
+    """Post the operations one at a time from teller threads and return
+    (seconds, rejected, net cash)"""
+    totals = [[0, 0] for _ in range(tellers)]
+
+    def teller(index):
+        for operation in operations[index::tellers]:
+            try:
+                result = getattr(ledger, operation[0])(*operation[1:])
+            except LedgerError:
+                totals[index][0] += 1
+                continue
+            if operation[0] != 'transfer':
+                totals[index][1] += result['amount']
+
+    threads = [threading.Thread(target=teller, args=(index,)) for index in range(tellers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, sum(t[0] for t in totals), sum(t[1] for t in totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-shards', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--accounts', type=int, default=2000)
+    parser.add_argument('--operations', type=int, default=200000)
+    parser.add_argument('--cross-shard', type=float, default=0.1, help="share of transfers across shards")
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--tellers', type=int, default=8, help="threads posting single operations")
+    parser.add_argument('--single-operations', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores available")
+    base_rate = base_single_rate = None
+    for num_shards in range(1, args.max_shards + 1):
+        ledger = build_sharded_ledger(num_shards, args.accounts, args.batch_size)
+        try:
+            total_before = sum(ledger.get_account(f"user{i}")['balance'] for i in range(args.accounts))
+            operations = make_operations(ledger, args.accounts, args.operations, args.cross_shard)
+            elapsed, rejected, net_cash = run(ledger, operations, args.batch_size)
+            singles = make_operations(ledger, args.accounts, args.single_operations, args.cross_shard, seed=1)
+            single_elapsed, single_rejected, single_cash = run_tellers(ledger, singles, args.tellers)
+            net_cash += single_cash
+            total_after = sum(ledger.get_account(f"user{i}")['balance'] for i in range(args.accounts))
+        finally:
+            ledger.close()
+
+        # Transfers, including cross-shard ones, move money without creating it
+        assert abs(total_after - total_before - net_cash) < 1e-6, (total_before, total_after, net_cash)
+
+        rate = args.operations / elapsed
+        base_rate = base_rate or rate
+        single_rate = args.single_operations / single_elapsed
+        base_single_rate = base_single_rate or single_rate
+        print(f"{num_shards} shard(s): {args.operations} operations in {elapsed:.2f}s, "
+              f"{rate:,.0f} ops/s ({rate / base_rate:.2f}x), {rejected} rejected; "
+              f"{args.tellers} tellers {single_rate:,.0f} ops/s ({single_rate / base_single_rate:.2f}x), "
+              f"{single_rejected} rejected")
+
+
+if __name__ == '__main__':
+    main()
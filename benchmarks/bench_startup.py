@@ -0,0 +1,82 @@
+"""Measure ledger startup time against ledger size
+
+Run from the project root:
+    python -m benchmarks.bench_startup --sizes 1000 10000 100000
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+from persistence import LedgerPersistence
+
+
+def build_ledger(data_dir, num_accounts, tail_records, snapshot):
+    """Write a ledger with the given number of accounts and log tail"""
+    persistence = LedgerPersistence(data_dir, snapshot_interval=float('inf'), fsync=False)
+    persistence.load()
+
+    for i in range(num_accounts):
+        name = f"user{i}"
+        user_data = {
+            'name': name,
+            'age': 30,
+            'salary': 50000.0,
+            'pin': '1234',
+            'account_number': f"{i:010d}",
+            'balance': 0,
+            'account_type': 'Savings',
+            'security_question': "What is your favorite color?",
+            'security_answer': 'blue',
+            'transaction_log': []
+        }
+        persistence.users[name] = user_data
+        persistence.record_account(name, user_data)
+
+    if snapshot:
+        persistence.snapshot()
+
+    # Post deposits after the snapshot so they have to be replayed
+    for i in range(tail_records):
+        name = f"user{i % num_accounts}"
+        user_data = persistence.users[name]
+        user_data['balance'] += 100
+        transaction = {'timestamp': 1704067200, 'type': 'Deposit', 'amount': 100, 'balance': user_data['balance']}
+        persistence.record_transaction(name, transaction)
+
+    persistence._log_file.close()
+
+
+def time_load(data_dir):
+    """Return the seconds needed to load the ledger and the number of users"""
+    start = time.perf_counter()
+    persistence = LedgerPersistence(data_dir, snapshot_interval=float('inf'), fsync=False)
+    users = persistence.load()
+    elapsed = time.perf_counter() - start
+    persistence._log_file.close()
+    return elapsed, len(users)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--tail', type=int, default=1000, help="log records written after the snapshot")
+    args = parser.parse_args()
+
+    print(f"{'accounts':>10} {'snapshot+tail (s)':>18} {'full replay (s)':>16}")
+    for size in args.sizes:
+        results = []
+        for snapshot in (True, False):
+            data_dir = tempfile.mkdtemp(prefix='ledger_bench_')
+            try:
+                build_ledger(data_dir, size, args.tail, snapshot)
+                elapsed, loaded = time_load(data_dir)
+                assert loaded == size
+                results.append(elapsed)
+            finally:
+                shutil.rmtree(data_dir)
+        print(f"{size:>10} {results[0]:>18.3f} {results[1]:>16.3f}")
+
+
+if __name__ == '__main__':
+    main()
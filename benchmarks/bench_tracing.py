@@ -0,0 +1,98 @@
+"""Measure the cost of tracing transfers and check the trace file
+
+Run from the project root:
+    python -m benchmarks.bench_tracing --operations 20000 --sample 0.01
+
+Times transfers through a plain Ledger, through a TracedLedger keeping a
+sample of the traces and through one keeping every trace, in alternating
+rounds so machine noise hits all alike. The trace file written is then read
+back as the JSON array the trace viewers load, and the steps of one
+transfer are listed.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from credentials import CredentialHasher
+from ledger import DEFAULT_ACCOUNT_TYPES
+from storage import MemoryAccountStore
+from tracing import TraceFile, Tracer, open_ledger
+
+
+def build_ledger(accounts, tracer):
+    """Return a ledger of funded accounts, traced through tracer if given"""
+    hasher = CredentialHasher(n=2, r=1)
+    ledger = open_ledger(MemoryAccountStore(None), DEFAULT_ACCOUNT_TYPES, tracer, hasher)
+    for i in range(accounts):
+        ledger.create_account(f"user{i}", '30', '50000', '1234', 'Savings', "What is your favorite color?", 'blue')
+        ledger.store.update_account(f"user{i}", {'balance': 1e9})
+    return ledger
+
+
+def run_round(ledger, accounts, operations):
+    """Return the seconds taken by a round of transfers"""
+    start = time.perf_counter()
+    for i in range(operations):
+        ledger.transfer(f"user{i % accounts}", f"user{(i + 1) % accounts}", 1)
+    return time.perf_counter() - start
+
+
+def load_trace(path):
+    """Return the events of a trace file, closing its array as a viewer does"""
+    with open(path, encoding='utf-8') as f:
+        return json.loads(f.read().rstrip().rstrip(',') + ']')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--operations', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--sample', type=float, default=0.01, help="fraction of transfers traced when sampling")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as trace_dir:
+        sampled_path = os.path.join(trace_dir, 'sampled.json')
+        full_path = os.path.join(trace_dir, 'full.json')
+        # No rotation, so every trace can be counted
+        modes = {
+            'off': None,
+            f"sampled {args.sample:g}": Tracer(TraceFile(sampled_path, max_bytes=0), args.sample),
+            'every transfer': Tracer(TraceFile(full_path, max_bytes=0), 1.0),
+        }
+        ledgers = {mode: build_ledger(args.accounts, tracer) for mode, tracer in modes.items()}
+        best = dict.fromkeys(modes, float('inf'))
+        for _ in range(args.rounds):
+            for mode, ledger in ledgers.items():
+                best[mode] = min(best[mode], run_round(ledger, args.accounts, args.operations))
+
+        base = best['off'] / args.operations * 1e6
+        for mode, tracer in modes.items():
+            per_op = best[mode] / args.operations * 1e6
+            traced = f", {tracer.exported} traces written" if tracer else ""
+            print(f"transfer, tracing {mode:16s} {per_op:7.2f}us ({per_op - base:+.2f}us, "
+                  f"{best[mode] / best['off'] - 1:+.1%}){traced}")
+        for tracer in modes.values():
+            if tracer:
+                tracer.close()
+
+        # Read the file back and show the last transfer's steps
+        events = load_trace(full_path)
+        spans = [event for event in events if event['ph'] == 'X']
+        trace_id = spans[-1]['args']['trace_id']
+        steps = sorted((event for event in spans if event['args']['trace_id'] == trace_id), key=lambda e: e['ts'])
+        print(f"{full_path}: {len(spans)} spans, {os.path.getsize(full_path) / len(spans):.0f} bytes each; "
+              f"trace {trace_id}:")
+        for event in steps:
+            depth = 0
+            parent = event['args'].get('parent_id')
+            while parent is not None:
+                depth += 1
+                parent = next(e for e in steps if e['args']['span_id'] == parent)['args'].get('parent_id')
+            print(f"  {'  ' * depth}{event['name']:20s} {event['dur']:8.2f}us")
+
+
+if __name__ == '__main__':
+    main()
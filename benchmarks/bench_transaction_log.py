@@ -0,0 +1,67 @@
+"""Compare per-entry dictionaries with the columnar transaction log
+
+Run from the project root:
+    python -m benchmarks.bench_transaction_log --entries 1000000
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime
+
+from transaction_log import TransactionLog
+
+
+def append_dicts(count):
+    """Log transactions the old way, one dictionary per entry"""
+    transactions = []
+    balance = 0.0
+    for i in range(count):
+        amount = float(i % 500 + 1)
+        balance += amount
+        transactions.append({
+            'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'type': "Deposit",
+            'amount': amount,
+            'balance': balance
+        })
+    return transactions
+
+
+def append_columns(count):
+    """Log transactions into a columnar TransactionLog"""
+    log = TransactionLog()
+    balance = 0.0
+    for i in range(count):
+        amount = float(i % 500 + 1)
+        balance += amount
+        log.append(int(time.time()), "Deposit", amount, balance)
+    return log
+
+
+def measure(func, count):
+    """Return (seconds, bytes retained) for building a log of count entries"""
+    start = time.perf_counter()
+    func(count)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    result = func(count)
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return elapsed, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=1000000)
+    args = parser.parse_args()
+
+    print(f"{'log':>10} {'appends/s':>12} {'bytes/entry':>12}")
+    for label, func in (('dicts', append_dicts), ('columnar', append_columns)):
+        elapsed, retained = measure(func, args.entries)
+        print(f"{label:>10} {args.entries / elapsed:>12,.0f} {retained / args.entries:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+"""Run the benchmark suite headless and compare it with a baseline
+
+Run from the project root:
+    python -m benchmarks.suite --sizes 1000 10000 100000 1000000 --output results.json
+    python -m benchmarks.suite --baseline results.json --threshold 0.2
+
+Every case times single operations, one by one, against a population of
+accounts held in memory, so no display is needed: account creation, login,
+deposit, withdraw, transfer, transaction logging, history rendering, the
+admin user list refresh and the financial calculators. Ledger cases run
+once per population size; the calculators do not depend on it and run
+once. Each case is measured in several rounds and the round with the
+lowest median is kept, which filters out most of the noise of a busy
+machine. Results are written as JSON. With --baseline, a case whose median
+latency is slower than the baseline's by more than the threshold is
+reported as a regression and the exit status is 1.
+"""
+import argparse
+import itertools
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from admin_panel import AdminPanel
+from credentials import CredentialHasher
+from financial_tools import FinancialTools
+from interest_calculator import COMPOUNDING, compound_amounts
+from ledger import Ledger, DEFAULT_ACCOUNT_TYPES
+from login_throttle import LoginThrottle
+from metrics import Metrics
+from storage import MemoryAccountStore
+from transaction_management import TransactionManagement
+from ui_components import VirtualRows
+from workload import PopulationGenerator
+
+OPENING_BALANCE = 1000000.0
+
+# Transactions of the account whose history is rendered
+HISTORY_LENGTH = 10000
+
+SECURITY_QUESTION = "What is your favorite color?"
+
+
+class _BankSystem:
+    """Just enough of BankSystem for the UI classes' data access"""
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self.users = ledger.store
+        self.metrics = Metrics()
+
+
+class _Label:
+    """Stands in for the result label of a calculator"""
+
+    def __init__(self):
+        self.text = ''
+
+    def config(self, text):
+        self.text = text
+
+
+# PINs are hashed at a trivial cost so login cases time the ledger rather
+# than scrypt
+POPULATION = PopulationGenerator(hasher=CredentialHasher(n=2, r=1), distinct_pins=1)
+PIN = POPULATION.pin(0)
+account_name = POPULATION.username
+
+
+def build_population(size):
+    """Return a ledger over an in-memory store with size generated accounts
+
+    Every account is funded far above its minimum balance so no withdrawal
+    or transfer is refused.
+    """
+    ledger = Ledger(MemoryAccountStore(None), DEFAULT_ACCOUNT_TYPES, POPULATION.hasher)
+    POPULATION.populate(ledger.store, size)
+    for name, user_data in ledger.store.items():
+        user_data['balance'] = OPENING_BALANCE
+
+    # One account with a long history to render
+    for i in range(HISTORY_LENGTH):
+        ledger.log_transaction(account_name(0), "Deposit", float(i % 500 + 1))
+    return ledger
+
+
+# Each ledger case takes (ledger, size, rng) and returns an operation
+# taking the operation number
+
+def case_create_account(ledger, size, rng):
+    # Every round opens new accounts
+    numbers = itertools.count()
+    return lambda i: ledger.create_account(f"new{next(numbers)}", '30', '50000', PIN, 'Savings',
+                                           SECURITY_QUESTION, 'blue')
+
+
+def case_login(ledger, size, rng):
+    throttle = LoginThrottle()
+    names = [account_name(rng.randrange(size)) for _ in range(1024)]
+    return lambda i: ledger.authenticate(names[i % 1024], PIN, throttle)
+
+
+def case_deposit(ledger, size, rng):
+    names = [account_name(rng.randrange(size)) for _ in range(1024)]
+    return lambda i: ledger.deposit(names[i % 1024], i % 500 + 1)
+
+
+def case_withdraw(ledger, size, rng):
+    names = [account_name(rng.randrange(size)) for _ in range(1024)]
+    return lambda i: ledger.withdraw(names[i % 1024], i % 500 + 1)
+
+
+def case_transfer(ledger, size, rng):
+    pairs = []
+    for _ in range(1024):
+        sender, recipient = rng.randrange(size), rng.randrange(size - 1)
+        pairs.append((account_name(sender), account_name(recipient + (recipient >= sender))))
+    return lambda i: ledger.transfer(*pairs[i % 1024], i % 500 + 1)
+
+
+def case_log_transaction(ledger, size, rng):
+    transaction_management = TransactionManagement(_BankSystem(ledger))
+    names = [account_name(rng.randrange(size)) for _ in range(1024)]
+    return lambda i: transaction_management._log_transaction_for_user(names[i % 1024], "Deposit", 10.0)
+
+
+def case_history_render(ledger, size, rng):
+    """Format one screen of a long history at a random scroll position"""
+    transaction_management = TransactionManagement(_BankSystem(ledger))
+    offsets = [rng.randrange(HISTORY_LENGTH - 15) for _ in range(1024)]
+    return lambda i: transaction_management._fetch_transaction_rows(account_name(0), offsets[i % 1024], 15)
+
+
+def case_admin_refresh(ledger, size, rng):
+    """Reload the visible user rows after one of them changed"""
+    admin_panel = AdminPanel(_BankSystem(ledger))
+    store = ledger.store
+    rows = VirtualRows(lambda: len(store), admin_panel._fetch_user_rows, height=20)
+    rows.scroll_to(size // 2)
+
+    def refresh(i):
+        store.update_account(rows.rows[i % len(rows.rows)][0], {'balance': float(i)})
+        rows.reload()
+    return refresh
+
+
+LEDGER_CASES = {
+    'create_account': case_create_account,
+    'login': case_login,
+    'deposit': case_deposit,
+    'withdraw': case_withdraw,
+    'transfer': case_transfer,
+    'log_transaction': case_log_transaction,
+    'history_render': case_history_render,
+    'admin_refresh': case_admin_refresh,
+}
+
+
+# The calculators take only the random source
+
+def case_loan_calculator(rng):
+    tools, label = FinancialTools(None), _Label()
+    return lambda i: tools._calculate_loan(str(10000 + i % 1000 * 100), '6.5', '30', label)
+
+
+def case_emi_calculator(rng):
+    tools, label = FinancialTools(None), _Label()
+    return lambda i: tools._calculate_emi(str(10000 + i % 1000 * 100), '8.25', '60', label)
+
+
+def case_interest_calculator(rng):
+    tools, label = FinancialTools(None), _Label()
+    return lambda i: tools._calculate_interest(str(1000 + i % 1000), '5', '10', label)
+
+
+def case_amortization(rng):
+    tools = FinancialTools(None)
+    return lambda i: tools._calculate_schedule(str(300000 + i % 1000), '6.5', '360', '60:20000', '120:8')
+
+
+def case_interest_grid(rng):
+    """Compute a 100 rate by 30 term grid for every compounding, uncached"""
+    rates = [0.5 + 0.1 * step for step in range(100)]
+    years = list(range(1, 31))
+    return lambda i: compound_amounts(1000 + i % 1000, rates, years, tuple(COMPOUNDING))
+
+
+CALCULATOR_CASES = {
+    'loan_calculator': case_loan_calculator,
+    'emi_calculator': case_emi_calculator,
+    'interest_calculator': case_interest_calculator,
+    'amortization': case_amortization,
+    'interest_grid': case_interest_grid,
+}
+
+
+def measure(operation, operations, warmup):
+    """Time operations one by one and return their latency statistics"""
+    for i in range(warmup):
+        operation(-1 - i)
+
+    samples = []
+    clock = time.perf_counter
+    for i in range(operations):
+        start = clock()
+        operation(i)
+        samples.append(clock() - start)
+    samples.sort()
+    total = sum(samples)
+
+    def percentile(fraction):
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1e6
+
+    return {
+        'operations': operations,
+        'ops_per_s': operations / total if total else float('inf'),
+        'mean_us': total / operations * 1e6,
+        'p50_us': percentile(0.5),
+        'p95_us': percentile(0.95),
+        'p99_us': percentile(0.99),
+        'max_us': samples[-1] * 1e6,
+    }
+
+
+def best_of(operation, operations, warmup, rounds):
+    """Measure several rounds and return the one with the lowest median"""
+    return min((measure(operation, operations, warmup) for _ in range(rounds)), key=lambda result: result['p50_us'])
+
+
+def run(sizes, names, operations, warmup, rounds, seed, log=print):
+    """Run the selected cases and return their results by case key"""
+    results = {}
+    ledger_names = [name for name in names if name in LEDGER_CASES]
+    for size in sizes if ledger_names else ():
+        start = time.perf_counter()
+        ledger = build_population(size)
+        log(f"built {size} accounts in {time.perf_counter() - start:.1f}s")
+        for name in ledger_names:
+            operation = LEDGER_CASES[name](ledger, size, random.Random(seed))
+            results[f"{name}@{size}"] = result = best_of(operation, operations, warmup, rounds)
+            log(format_result(f"{name}@{size}", result))
+        del ledger
+
+    for name in names:
+        if name in CALCULATOR_CASES:
+            operation = CALCULATOR_CASES[name](random.Random(seed))
+            results[name] = result = best_of(operation, operations, warmup, rounds)
+            log(format_result(name, result))
+    return results
+
+
+def compare(results, baseline, threshold, metric='p50_us'):
+    """Return (key, baseline, current, change) for cases slower than the threshold"""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None or not base.get(metric):
+            continue
+        change = result[metric] / base[metric] - 1
+        if change > threshold:
+            regressions.append((key, base[metric], result[metric], change))
+    return regressions
+
+
+def format_result(key, result):
+    return (f"{key:28s} {result['ops_per_s']:>12,.0f} ops/s  p50 {result['p50_us']:>9.1f}us  "
+            f"p95 {result['p95_us']:>9.1f}us  p99 {result['p99_us']:>9.1f}us")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--cases', nargs='+', choices=list(LEDGER_CASES) + list(CALCULATOR_CASES),
+                        default=list(LEDGER_CASES) + list(CALCULATOR_CASES))
+    parser.add_argument('--operations', type=int, default=2000, help="timed operations per case")
+    parser.add_argument('--warmup', type=int, default=100, help="untimed operations before each round")
+    parser.add_argument('--rounds', type=int, default=3, help="rounds per case; the best is kept")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare with the results in this JSON file")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="allowed slowdown of the median latency, as a fraction")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.cases, args.operations, args.warmup, args.rounds, args.seed)
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sizes': args.sizes,
+            'operations': args.operations,
+            'rounds': args.rounds,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.threshold)
+        print(f"compared with {args.baseline} (commit {baseline['meta'].get('commit')}), "
+              f"threshold {args.threshold:.0%}")
+        for key, before, after, change in regressions:
+            print(f"REGRESSION {key}: p50 {before:.1f}us -> {after:.1f}us ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Stream end-of-day transaction files into the ledger
+
+Rows are read lazily in chunks and each chunk is applied as one batch, so
+memory use does not depend on the size of the file. Rows rejected by the
+ledger are written to a side file together with the reason.
+
+Each row has a ``type`` (Deposit, Withdrawal or Transfer), an ``account``, an
+``amount`` and, for transfers, a ``recipient``. CSV files need a header line;
+JSONL files hold one object per line.
+
+    python bulk_import.py transactions.csv --rejects rejects.csv
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from ledger import Ledger, LedgerError, DEFAULT_ACCOUNT_TYPES
+from storage import open_store
+
+FIELDS = ('type', 'account', 'amount', 'recipient')
+
+
+class ImportResult:
+    """Counts and timing of an import run"""
+
+    def __init__(self):
+        self.applied = 0
+        self.rejected = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows(self):
+        return self.applied + self.rejected
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f"{self.rows} rows ({self.applied} applied, {self.rejected} rejected) "
+                f"in {self.elapsed:.2f}s, {self.rows_per_second:,.0f} rows/s")
+
+
+def read_rows(path):
+    """Yield the rows of a CSV or JSONL file one at a time"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.jsonl') or path.endswith('.json'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def read_chunks(rows, chunk_size):
+    """Group an iterator of rows into lists of at most chunk_size rows"""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def apply_row(ledger, row):
+    """Apply one row through the ledger's validation rules"""
+    transaction_type = (row.get('type') or '').strip().lower()
+    account = (row.get('account') or '').strip()
+    amount = row.get('amount')
+
+    if transaction_type == 'deposit':
+        ledger.deposit(account, amount)
+    elif transaction_type in ('withdraw', 'withdrawal'):
+        ledger.withdraw(account, amount)
+    elif transaction_type == 'transfer':
+        ledger.transfer(account, (row.get('recipient') or '').strip(), amount)
+    else:
+        raise LedgerError(f"Unknown transaction type: {row.get('type')}")
+
+
+def import_file(ledger, path, rejects_path=None, chunk_size=1000, progress=None):
+    """Import a transaction file and return an ImportResult"""
+    return import_rows(ledger, read_rows(path), rejects_path, chunk_size, progress)
+
+
+def import_rows(ledger, rows, rejects_path=None, chunk_size=1000, progress=None):
+    """Apply an iterable of rows in batches and return an ImportResult"""
+    result = ImportResult()
+    rejects_file = None
+    rejects_writer = None
+    start = time.perf_counter()
+
+    try:
+        for chunk in read_chunks(rows, chunk_size):
+            with ledger.store.batch():
+                for row in chunk:
+                    try:
+                        apply_row(ledger, row)
+                        result.applied += 1
+                    except LedgerError as e:
+                        result.rejected += 1
+                        if rejects_path is None:
+                            continue
+                        if rejects_writer is None:
+                            rejects_file = open(rejects_path, 'w', newline='', encoding='utf-8')
+                            rejects_writer = csv.writer(rejects_file)
+                            rejects_writer.writerow(FIELDS + ('error',))
+                        rejects_writer.writerow([row.get(field, '') for field in FIELDS] + [str(e)])
+
+            result.elapsed = time.perf_counter() - start
+            if progress:
+                progress(result)
+    finally:
+        if rejects_file is not None:
+            rejects_file.close()
+
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a CSV or JSONL transaction file into the ledger")
+    parser.add_argument('path')
+    parser.add_argument('--rejects', help="CSV file for rejected rows (default: <path>.rejects.csv)")
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    store = open_store(os.environ.get('BANK_DATA_DIR', 'bank_data'), os.environ.get('BANK_STORAGE', 'memory'))
+    ledger = Ledger(store, DEFAULT_ACCOUNT_TYPES)
+    try:
+        result = import_file(ledger, args.path, args.rejects or args.path + '.rejects.csv',
+                             args.chunk_size, progress=lambda r: print(f"\r{r}", end='', flush=True))
+    finally:
+        store.close()
+    print(f"\r{result}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Salted scrypt hashes of PINs and security answers
+
+A stored credential reads ``scrypt$n$r$p$salt$hash`` with the salt and hash
+in hex, so the cost parameters travel with the hash and can be raised later
+without breaking old accounts. Values stored before hashing was introduced
+are plain text; they still verify and are rehashed by the caller on the
+next successful check.
+
+A check costs tens of milliseconds by design, which is too long for the Tk
+main loop. CredentialPool runs checks on worker threads (scrypt releases the
+GIL while it works) and delivers each result back on the Tk thread.
+"""
+import hashlib
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+PREFIX = 'scrypt'
+
+
+def normalize_answer(answer):
+    """Return a security answer in the form it is hashed in"""
+    return answer.strip().lower()
+
+
+class CredentialHasher:
+    """Hashes and verifies secrets with scrypt at a fixed cost"""
+
+    def __init__(self, n=2**14, r=8, p=1, salt_size=16, key_size=32):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.salt_size = salt_size
+        self.key_size = key_size
+
+    def hash(self, secret):
+        """Return the stored form of a secret with a fresh salt"""
+        salt = os.urandom(self.salt_size)
+        key = self._derive(secret, salt, self.n, self.r, self.p, self.key_size)
+        return f"{PREFIX}${self.n}${self.r}${self.p}${salt.hex()}${key.hex()}"
+
+    def verify(self, secret, stored):
+        """Return True if a secret matches its stored form"""
+        parts = stored.split('$')
+        if len(parts) != 6 or parts[0] != PREFIX:
+            # Plain text stored before hashing was introduced
+            return hmac.compare_digest(secret.encode(), stored.encode())
+        n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+        expected = bytes.fromhex(parts[5])
+        key = self._derive(secret, bytes.fromhex(parts[4]), n, r, p, len(expected))
+        return hmac.compare_digest(key, expected)
+
+    def needs_rehash(self, stored):
+        """Return True if a stored form is plain text or uses another cost"""
+        parts = stored.split('$')
+        return len(parts) != 6 or parts[0] != PREFIX or parts[1:4] != [str(self.n), str(self.r), str(self.p)]
+
+    @staticmethod
+    def _derive(secret, salt, n, r, p, key_size):
+        # Allow the memory the cost parameters need (128 * n * r bytes)
+        return hashlib.scrypt(secret.encode(), salt=salt, n=n, r=r, p=p, dklen=key_size,
+                              maxmem=256 * n * r + 1024 * 1024)
+
+
+DEFAULT_HASHER = CredentialHasher()
+
+
+class CredentialPool:
+    """Runs slow credential checks off the Tk thread
+
+    ``submit`` starts a call on a worker thread. While calls are pending the
+    pool polls them with ``root.after``, and calls ``on_done`` with the
+    result, or ``on_error`` with the exception, on the Tk thread, so the
+    callbacks may touch widgets.
+    """
+
+    def __init__(self, root, workers=None, poll_ms=15):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.executor = ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1),
+                                           thread_name_prefix='credentials')
+        self._pending = []
+        self._polling = False
+
+    def submit(self, fn, args, on_done, on_error):
+        """Run fn(*args) on a worker thread and return its future"""
+        future = self.executor.submit(fn, *args)
+        self._pending.append((future, on_done, on_error))
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+        return future
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _poll(self):
+        """Deliver the results of finished calls"""
+        finished = [item for item in self._pending if item[0].done()]
+        self._pending = [item for item in self._pending if item not in finished]
+        for future, on_done, on_error in finished:
+            error = future.exception()
+            if error is None:
+                on_done(future.result())
+            else:
+                on_error(error)
+
+        if self._pending:
+            self.root.after(self.poll_ms, self._poll)
+        else:
+            self._polling = False
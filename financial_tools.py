@@ -1,6 +1,12 @@
-from tkinter import messagebox, Toplevel, Label, Entry, Button, Frame, ttk
-from tkinter import StringVar
+from tkinter import messagebox, filedialog, Toplevel, Label, Entry, Button, Frame, LabelFrame, Checkbutton, ttk
+from tkinter import StringVar, BooleanVar
 import math
+import time
+
+import interest_calculator
+from loan_calculator import (loan_payments, price_file, amortization_schedule, parse_schedule_events,
+                             schedule_file, write_schedule)
+from ui_components import VirtualTreeview
 
 class FinancialTools:
     def __init__(self, bank_system):
@@ -27,6 +33,11 @@ class FinancialTools:
         notebook.add(emi_frame, text="EMI Calculator")
         self._create_emi_calculator_tab(emi_frame)
         
+        # Amortization Schedule tab
+        amortization_frame = Frame(notebook)
+        notebook.add(amortization_frame, text="Amortization Schedule")
+        self._create_amortization_tab(amortization_frame)
+        
         # Interest Calculator tab
         interest_frame = Frame(notebook)
         notebook.add(interest_frame, text="Interest Calculator")
@@ -97,6 +108,122 @@ class FinancialTools:
         # Result label
         result_label = Label(frame, text="", wraplength=300)
         result_label.grid(row=4, column=0, columnspan=2, pady=10)
+        
+        # Batch pricing of a whole loan file
+        Label(frame, text="Loan book (CSV with principal, rate, months columns):").grid(row=5, column=0, columnspan=2, pady=(20, 5))
+        Button(frame, text="Price Loan File...", command=self._price_loan_file).grid(row=6, column=0, columnspan=2, pady=5)
+    
+    def _create_amortization_tab(self, parent):
+        """Create amortization schedule tab"""
+        # Create frame
+        frame = Frame(parent)
+        frame.pack(padx=20, pady=10)
+        
+        # Loan amount, rate and term
+        Label(frame, text="Loan Amount:").grid(row=0, column=0, padx=5, pady=2, sticky='w')
+        loan_amount_entry = Entry(frame)
+        loan_amount_entry.grid(row=0, column=1, padx=5, pady=2)
+        Label(frame, text="Annual Interest Rate (%):").grid(row=1, column=0, padx=5, pady=2, sticky='w')
+        interest_rate_entry = Entry(frame)
+        interest_rate_entry.grid(row=1, column=1, padx=5, pady=2)
+        Label(frame, text="Loan Term (months):").grid(row=2, column=0, padx=5, pady=2, sticky='w')
+        loan_term_entry = Entry(frame)
+        loan_term_entry.grid(row=2, column=1, padx=5, pady=2)
+        
+        # Prepayments and rate changes as "period:value" lists
+        Label(frame, text="Prepayments (month:amount, ...):").grid(row=3, column=0, padx=5, pady=2, sticky='w')
+        prepayments_entry = Entry(frame, width=30)
+        prepayments_entry.grid(row=3, column=1, padx=5, pady=2)
+        Label(frame, text="Rate Changes (month:rate %, ...):").grid(row=4, column=0, padx=5, pady=2, sticky='w')
+        rate_changes_entry = Entry(frame, width=30)
+        rate_changes_entry.grid(row=4, column=1, padx=5, pady=2)
+        
+        # The schedule shown in the table
+        state = {'schedule': None}
+        
+        def calculate():
+            return self._calculate_schedule(loan_amount_entry.get(), interest_rate_entry.get(), loan_term_entry.get(),
+                                            prepayments_entry.get(), rate_changes_entry.get())
+        
+        def show():
+            schedule = calculate()
+            if schedule is None:
+                return
+            state['schedule'] = schedule
+            summary_label.config(text=f"{len(schedule)} payments, total payment ${schedule.total_payment:.2f}, "
+                                      f"total interest ${schedule.total_interest:.2f}")
+            table.scroll_to(0)
+        
+        # Buttons
+        button_frame = Frame(frame)
+        button_frame.grid(row=5, column=0, columnspan=2, pady=5)
+        Button(button_frame, text="Show Schedule", command=show).pack(side='left', padx=5)
+        Button(button_frame, text="Export CSV...", command=lambda: self._export_schedule(calculate())).pack(side='left', padx=5)
+        Button(button_frame, text="Schedules for Loan File...", command=self._export_loan_file_schedules).pack(side='left', padx=5)
+        
+        # Summary label
+        summary_label = Label(frame, text="")
+        summary_label.grid(row=6, column=0, columnspan=2)
+        
+        # Create virtual table that only formats the periods in view
+        columns = ('Month', 'Payment', 'Interest', 'Principal', 'Balance')
+        table = VirtualTreeview(parent, columns,
+            count_rows=lambda: len(state['schedule']) if state['schedule'] is not None else 0,
+            fetch_rows=lambda offset, limit: self._fetch_schedule_rows(state['schedule'], offset, limit),
+            height=10, column_width=110)
+        table.pack(padx=20, pady=(0, 10), fill='both', expand=True)
+    
+    def _calculate_schedule(self, amount, rate, term, prepayments, rate_changes):
+        """Return the amortization schedule for the entered loan, or None"""
+        try:
+            return amortization_schedule(float(amount), float(rate), int(term),
+                                         parse_schedule_events(prepayments), parse_schedule_events(rate_changes))
+        except ValueError as e:
+            messagebox.showerror("Error", f"Please enter valid numbers! {e}")
+            return None
+    
+    def _fetch_schedule_rows(self, schedule, offset, limit):
+        """Return a page of formatted schedule rows"""
+        if schedule is None:
+            return []
+        return [(period, (period, f"${payment:.2f}", f"${interest:.2f}", f"${principal:.2f}", f"${balance:.2f}"))
+                for period, payment, interest, principal, balance in schedule.rows(offset, limit)]
+    
+    def _export_schedule(self, schedule):
+        """Save an amortization schedule as CSV"""
+        if schedule is None:
+            return
+        target = filedialog.asksaveasfilename(title="Export Schedule", defaultextension=".csv",
+                                              filetypes=[("CSV files", "*.csv")])
+        if not target:
+            return
+        try:
+            with open(target, 'w', newline='', encoding='utf-8') as out:
+                write_schedule(out, schedule)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not export the schedule: {e}")
+            return
+        messagebox.showinfo("Success", f"Schedule saved to {target}")
+    
+    def _export_loan_file_schedules(self):
+        """Write the amortization schedules of every loan of a CSV file"""
+        source = filedialog.askopenfilename(title="Loan File", filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not source:
+            return
+        target = filedialog.asksaveasfilename(title="Save Schedules", defaultextension=".csv",
+                                              filetypes=[("CSV files", "*.csv")])
+        if not target:
+            return
+        
+        try:
+            start = time.perf_counter()
+            loans, rows = schedule_file(source, target)
+            elapsed = time.perf_counter() - start
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not create the schedules: {e}")
+            return
+        
+        messagebox.showinfo("Success", f"Wrote {rows} rows for {loans} loans in {elapsed:.2f} seconds.\nSchedules saved to {target}")
     
     def _create_interest_calculator_tab(self, parent):
         """Create interest calculator tab"""
@@ -130,23 +257,102 @@ class FinancialTools:
         # Result label
         result_label = Label(frame, text="", wraplength=300)
         result_label.grid(row=4, column=0, columnspan=2, pady=10)
+        
+        # What-if grid over ranges of rates and terms
+        grid_frame = LabelFrame(parent, text="What-if Grid (final amount for the principal above)")
+        grid_frame.pack(padx=20, pady=(0, 10), fill='both', expand=True)
+        range_frame = Frame(grid_frame)
+        range_frame.pack(pady=5)
+        
+        # Range entries: from, to and step
+        range_entries = {}
+        for row, (label, defaults) in enumerate([("Rates (%)", ("2", "8", "1")), ("Terms (years)", ("1", "10", "1"))]):
+            Label(range_frame, text=f"{label} from / to / step:").grid(row=row, column=0, padx=5, pady=2, sticky='w')
+            entries = []
+            for column, default in enumerate(defaults):
+                entry = Entry(range_frame, width=6)
+                entry.insert(0, default)
+                entry.grid(row=row, column=column + 1, padx=2, pady=2)
+                entries.append(entry)
+            range_entries[label] = entries
+        
+        # Compounding frequencies
+        frequency_vars = {}
+        frequency_frame = Frame(range_frame)
+        frequency_frame.grid(row=2, column=0, columnspan=4, pady=2)
+        for name in interest_calculator.COMPOUNDING:
+            var = BooleanVar(value=name in ('Annual', 'Monthly'))
+            frequency_vars[name] = var
+            Checkbutton(frequency_frame, text=name, variable=var).pack(side='left', padx=5)
+        
+        # Grid table: one row per frequency and rate, one column per term
+        table_frame = Frame(grid_frame)
+        grid_tree = ttk.Treeview(table_frame, show='headings', height=8)
+        xscrollbar = ttk.Scrollbar(table_frame, orient='horizontal', command=grid_tree.xview)
+        yscrollbar = ttk.Scrollbar(table_frame, orient='vertical', command=grid_tree.yview)
+        grid_tree.configure(xscrollcommand=xscrollbar.set, yscrollcommand=yscrollbar.set)
+        yscrollbar.pack(side='right', fill='y')
+        xscrollbar.pack(side='bottom', fill='x')
+        grid_tree.pack(side='left', fill='both', expand=True)
+        
+        # Show button and status
+        status_label = Label(range_frame, text="")
+        Button(range_frame, text="Show Grid", command=lambda: self._show_interest_grid(
+            principal_entry.get(),
+            [entry.get() for entry in range_entries["Rates (%)"]],
+            [entry.get() for entry in range_entries["Terms (years)"]],
+            [name for name, var in frequency_vars.items() if var.get()],
+            grid_tree,
+            status_label
+        )).grid(row=3, column=0, columnspan=4, pady=5)
+        status_label.grid(row=4, column=0, columnspan=4)
+        table_frame.pack(padx=5, pady=5, fill='both', expand=True)
+    
+    def _show_interest_grid(self, principal, rate_range, term_range, frequencies, grid_tree, status_label):
+        """Fill the what-if table with final amounts for every scenario"""
+        try:
+            principal = float(principal)
+            rates = interest_calculator.value_range(*rate_range)
+            years = interest_calculator.value_range(*term_range)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Please enter valid numbers! {e}")
+            return
+        if not frequencies:
+            messagebox.showerror("Error", "Please select at least one compounding frequency!")
+            return
+        
+        # Repeated scenarios come from the cache
+        hits = interest_calculator.cache_info().hits
+        start = time.perf_counter()
+        grid = interest_calculator.interest_grid(principal, rates, years, frequencies)
+        elapsed = time.perf_counter() - start
+        cached = interest_calculator.cache_info().hits > hits
+        
+        # Rebuild the table columns for the terms
+        columns = ['Compounding', 'Rate'] + [f"{term:g}y" for term in years]
+        grid_tree.delete(*grid_tree.get_children())
+        grid_tree.config(columns=columns)
+        for column in columns:
+            grid_tree.heading(column, text=column)
+            grid_tree.column(column, width=90 if column == 'Compounding' else 75, stretch=False)
+        for frequency, amounts in zip(frequencies, grid.tolist()):
+            for rate, row in zip(rates, amounts):
+                grid_tree.insert('', 'end', values=[frequency, f"{rate:g}%"] + [f"{amount:,.2f}" for amount in row])
+        
+        status_label.config(text=f"{grid.size} scenarios in {elapsed * 1000:.2f} ms" + (" (cached)" if cached else ""))
     
     def _calculate_loan(self, amount, rate, term, result_label):
         """Calculate loan details"""
         try:
             # Convert inputs to float
             amount = float(amount)
-            rate = float(rate) / 100
+            rate = float(rate)
             term = float(term)
             
-            # Calculate monthly payment
-            monthly_rate = rate / 12
-            num_payments = term * 12
-            monthly_payment = (amount * monthly_rate * (1 + monthly_rate)**num_payments) / ((1 + monthly_rate)**num_payments - 1)
-            
-            # Calculate total payment and interest
-            total_payment = monthly_payment * num_payments
-            total_interest = total_payment - amount
+            # Calculate monthly payment, total payment and interest
+            monthly_payment, total_payment, total_interest = map(float, loan_payments(amount, rate, term * 12))
+            if not math.isfinite(monthly_payment):
+                raise ValueError("Loan term must be positive")
             
             # Display results
             result_text = f"Monthly Payment: ${monthly_payment:.2f}\n"
@@ -162,18 +368,13 @@ class FinancialTools:
         try:
             # Convert inputs to float
             amount = float(amount)
-            rate = float(rate) / 100
+            rate = float(rate)
             term = float(term)
             
-            # Calculate monthly interest rate
-            monthly_rate = rate / 12
-            
-            # Calculate EMI
-            emi = (amount * monthly_rate * (1 + monthly_rate)**term) / ((1 + monthly_rate)**term - 1)
-            
-            # Calculate total payment and interest
-            total_payment = emi * term
-            total_interest = total_payment - amount
+            # Calculate EMI, total payment and interest
+            emi, total_payment, total_interest = map(float, loan_payments(amount, rate, term))
+            if not math.isfinite(emi):
+                raise ValueError("Loan term must be positive")
             
             # Display results
             result_text = f"EMI: ${emi:.2f}\n"
@@ -184,6 +385,26 @@ class FinancialTools:
         except ValueError:
             messagebox.showerror("Error", "Please enter valid numbers!")
     
+    def _price_loan_file(self):
+        """Price every loan of a CSV file and save the results"""
+        source = filedialog.askopenfilename(title="Loan File", filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not source:
+            return
+        target = filedialog.asksaveasfilename(title="Save Results", defaultextension=".csv",
+                                              filetypes=[("CSV files", "*.csv")])
+        if not target:
+            return
+        
+        try:
+            start = time.perf_counter()
+            count = price_file(source, target)
+            elapsed = time.perf_counter() - start
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not price the loan file: {e}")
+            return
+        
+        messagebox.showinfo("Success", f"Priced {count} loans in {elapsed:.2f} seconds.\nResults saved to {target}")
+    
     def _calculate_interest(self, principal, rate, time, result_label):
         """Calculate interest details"""
         try:
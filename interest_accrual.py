@@ -0,0 +1,157 @@
+"""Post month-end interest to every account
+
+Interest is one month of the annual ``interest_rate`` of the account type,
+credited on positive balances. Accounts are processed a page at a time in
+username order: the interest of a page is computed with one vectorized
+operation, looking up each account's rate by its type, and the credits are
+logged through the ledger together with the run's progress in one store
+batch. An interrupted run therefore resumes after the last page it finished,
+and a month is never credited twice.
+
+    python interest_accrual.py --period 2026-10
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from ledger import Ledger, LedgerError, DEFAULT_ACCOUNT_TYPES
+from storage import open_store
+
+# Store metadata holding the progress of a run and the last finished month
+PROGRESS_KEY = 'interest_run'
+LAST_PERIOD_KEY = 'interest_last_period'
+
+TRANSACTION_TYPE = "Interest"
+
+
+class AccrualResult:
+    """Totals of an interest run, overall and by account type"""
+
+    def __init__(self, period):
+        self.period = period
+        self.accounts = 0
+        self.credited = 0
+        self.total = 0.0
+        self.by_type = {}
+        self.resumed = False
+        self.elapsed = 0.0
+
+    def to_json(self):
+        return {'accounts': self.accounts, 'credited': self.credited, 'total': self.total, 'by_type': self.by_type}
+
+    def __str__(self):
+        lines = [f"Interest for {self.period}: {self.credited} of {self.accounts} accounts credited "
+                 f"${self.total:,.2f} in {self.elapsed:.2f}s" + (" (resumed)" if self.resumed else "")]
+        for account_type, amount in sorted(self.by_type.items()):
+            lines.append(f"  {account_type}: ${amount:,.2f}")
+        return '\n'.join(lines)
+
+
+def monthly_interest(balances, type_codes, monthly_rates):
+    """Return the interest in currency units for arrays of accounts
+
+    ``type_codes`` index ``monthly_rates``; negative balances earn nothing.
+    """
+    return np.round(np.maximum(balances, 0) * monthly_rates[type_codes], 2)
+
+
+def accrue_interest(ledger, period=None, chunk_size=10000, progress=None):
+    """Credit a month of interest to every account and return an AccrualResult
+
+    ``period`` is the month as YYYY-MM and defaults to the current month.
+    """
+    store = ledger.store
+    period = period or time.strftime('%Y-%m')
+    result = AccrualResult(period)
+    start = time.perf_counter()
+
+    # Refuse to post a month twice or to start over an unfinished month
+    last_period = store.get_meta(LAST_PERIOD_KEY)
+    if last_period is not None and last_period >= period:
+        raise LedgerError(f"Interest for {period} has already been posted")
+    state = store.get_meta(PROGRESS_KEY)
+    after = None
+    if state:
+        if state['period'] != period:
+            raise LedgerError(f"The interest run for {state['period']} was interrupted; finish it first")
+        after = state['after']
+        totals = state['totals']
+        result.accounts = totals['accounts']
+        result.credited = totals['credited']
+        result.total = totals['total']
+        result.by_type = dict(totals['by_type'])
+        result.resumed = True
+
+    # Monthly rate of every account type, plus zero for unknown types
+    type_names = list(ledger.account_types)
+    type_codes = {account_type: code for code, account_type in enumerate(type_names)}
+    monthly_rates = np.array([ledger.account_types[account_type].get('interest_rate', 0) / 12
+                              for account_type in type_names] + [0.0])
+
+    while True:
+        page = store.list_accounts(after=after, limit=chunk_size)
+        if not page:
+            break
+
+        balances = np.fromiter((user_data['balance'] for _, user_data in page), dtype=float, count=len(page))
+        codes = np.fromiter((type_codes.get(user_data.get('account_type', 'Savings'), -1) for _, user_data in page),
+                            dtype=np.intp, count=len(page))
+        interest = monthly_interest(balances, codes, monthly_rates)
+
+        # Post the credits and the progress of the run atomically. An account
+        # deleted since the page was read is skipped, checked under its lock
+        # so it cannot go while being credited
+        posted = np.zeros(len(page), dtype=bool)
+        with store.batch():
+            for index in np.flatnonzero(interest > 0).tolist():
+                name = page[index][0]
+                with ledger.locked(name):
+                    if name in store:
+                        ledger.log_transaction(name, TRANSACTION_TYPE, float(interest[index]))
+                        posted[index] = True
+            interest = np.where(posted, interest, 0.0)
+
+            # Totals by account type for the report
+            type_totals = np.bincount(codes % len(monthly_rates), weights=interest, minlength=len(monthly_rates))
+            for account_type, amount in zip(type_names, type_totals.tolist()):
+                if amount:
+                    result.by_type[account_type] = round(result.by_type.get(account_type, 0.0) + amount, 2)
+            result.accounts += len(page)
+            result.credited += int(np.count_nonzero(posted))
+            result.total = round(result.total + float(interest.sum()), 2)
+            after = page[-1][0]
+            store.set_meta(PROGRESS_KEY, {'period': period, 'after': after, 'totals': result.to_json()})
+
+        if progress:
+            progress(result)
+
+    with store.batch():
+        store.set_meta(LAST_PERIOD_KEY, period)
+        store.set_meta(PROGRESS_KEY, None)
+
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Credit a month of interest to every account")
+    parser.add_argument('--period', help="month to post as YYYY-MM (default: current month)")
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    store = open_store(os.environ.get('BANK_DATA_DIR', 'bank_data'), os.environ.get('BANK_STORAGE', 'memory'))
+    ledger = Ledger(store, DEFAULT_ACCOUNT_TYPES)
+    try:
+        result = accrue_interest(ledger, args.period, args.chunk_size,
+                                 progress=lambda r: print(f"\r{r.accounts} accounts", end='', flush=True))
+    except LedgerError as e:
+        raise SystemExit(str(e))
+    finally:
+        store.close()
+    print(f"\r{result}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""What-if grids of deposit growth over rates, terms and compounding
+
+A grid covers every combination of a range of annual rates, a range of
+terms in years and a set of compounding frequencies, and is computed as one
+broadcasted array operation. Grids are memoized on their normalized inputs,
+so flipping back to a scenario that was already shown is a cache lookup.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+# Compounding periods per year; continuous compounding has no periods
+COMPOUNDING = {
+    'Annual': 1,
+    'Monthly': 12,
+    'Daily': 365,
+    'Continuous': None
+}
+
+# Largest number of values a range may expand to
+MAX_RANGE_VALUES = 1000
+
+# Inputs are rounded to this many decimals before they are used as a key
+KEY_DECIMALS = 6
+
+
+def value_range(start, stop, step):
+    """Return the values from start to stop inclusive as a normalized tuple"""
+    start, stop, step = float(start), float(stop), float(step)
+    if stop < start:
+        raise ValueError("Range end must not be below its start")
+    if step <= 0:
+        if stop != start:
+            raise ValueError("Range step must be positive")
+        step = 1.0
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    if count > MAX_RANGE_VALUES:
+        raise ValueError(f"Range has more than {MAX_RANGE_VALUES} values")
+    return tuple(np.round(start + step * np.arange(count), KEY_DECIMALS).tolist())
+
+
+def compound_amounts(principal, rates, years, frequencies):
+    """Return final amounts as an array of (frequency, rate, term)
+
+    ``rates`` are annual rates in percent; ``frequencies`` are names from
+    COMPOUNDING.
+    """
+    rate = np.asarray(rates, dtype=float)[None, :, None] / 100
+    term = np.asarray(years, dtype=float)[None, None, :]
+    periods = np.array([COMPOUNDING[name] or np.inf for name in frequencies], dtype=float)[:, None, None]
+
+    with np.errstate(invalid='ignore'):
+        # (1 + r/n)^(n t), written through log1p for accuracy at small r/n
+        discrete = np.exp(periods * term * np.log1p(rate / periods))
+    return principal * np.where(np.isinf(periods), np.exp(rate * term), discrete)
+
+
+def interest_grid(principal, rates, years, frequencies):
+    """Return the memoized grid of final amounts for normalized inputs
+
+    The returned array is shared between callers and is read-only.
+    """
+    key = (round(float(principal), KEY_DECIMALS),
+           tuple(round(float(rate), KEY_DECIMALS) for rate in rates),
+           tuple(round(float(term), KEY_DECIMALS) for term in years),
+           tuple(frequencies))
+    return _cached_grid(*key)
+
+
+@lru_cache(maxsize=256)
+def _cached_grid(principal, rates, years, frequencies):
+    grid = compound_amounts(principal, rates, years, frequencies)
+    grid.setflags(write=False)
+    return grid
+
+
+def cache_info():
+    """Return the hit and miss counts of the grid cache"""
+    return _cached_grid.cache_info()
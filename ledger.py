@@ -0,0 +1,404 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from account_numbers import AccountNumberAllocator
+from credentials import DEFAULT_HASHER, normalize_answer
+
+# Account types with their minimum balance and annual interest rate
+DEFAULT_ACCOUNT_TYPES = {
+    "Savings": {"min_balance": 1000, "interest_rate": 0.04},
+    "Current": {"min_balance": 5000, "interest_rate": 0.02},
+    "Fixed Deposit": {"min_balance": 10000, "interest_rate": 0.08}
+}
+
+# Largest amount and balance accepted. The transaction log keeps them as
+# 64-bit whole cents, which end at about 9.2e16
+MAX_AMOUNT = 10 ** 12
+MAX_BALANCE = 10 ** 16
+
+DEFAULT_SECURITY_QUESTIONS = [
+    "What is your mother's maiden name?",
+    "What is the name of your first pet?",
+    "What is your favorite book?",
+    "What is the name of the school you first attended?",
+    "What is your favorite color?"
+]
+
+
+class LedgerError(Exception):
+    """Base class for errors raised by ledger operations"""
+
+
+class InvalidAmountError(LedgerError):
+    """Raised when an amount is not a positive number within the ledger's limits"""
+
+    def __init__(self, message="Please enter a valid positive amount!"):
+        super().__init__(message)
+
+
+class InvalidAccountDataError(LedgerError):
+    """Raised when account details fail validation"""
+
+
+class AccountExistsError(LedgerError):
+    """Raised when creating an account for a name that is taken"""
+
+    def __init__(self, name):
+        super().__init__("User already exists!")
+        self.name = name
+
+
+class AccountNotFoundError(LedgerError):
+    """Raised when an account does not exist"""
+
+    def __init__(self, name, message="User not found!"):
+        super().__init__(message)
+        self.name = name
+
+
+class SelfTransferError(LedgerError):
+    """Raised when a transfer names the sender as recipient"""
+
+    def __init__(self):
+        super().__init__("Cannot transfer to yourself!")
+
+
+class AuthenticationError(LedgerError):
+    """Raised when a login is refused"""
+
+
+class AccountLockedError(AuthenticationError):
+    """Raised when an account is locked after too many failed logins"""
+
+    def __init__(self, retry_after):
+        minutes = max(1, -(-int(retry_after) // 60))
+        super().__init__("Account locked due to too many failed attempts. "
+                         f"Try again in {minutes} minute{'s' if minutes != 1 else ''} or use 'Forgot PIN' to reset.")
+        self.retry_after = retry_after
+
+
+class InsufficientFundsError(LedgerError):
+    """Raised when an operation would break the minimum balance requirement"""
+
+    def __init__(self, min_balance):
+        super().__init__(f"Insufficient balance! Minimum balance requirement: ${min_balance:.2f}")
+        self.min_balance = min_balance
+
+
+def _check_pin(pin):
+    if not pin.isdigit() or len(pin) != 4:
+        raise InvalidAccountDataError("PIN must be a 4-digit number!")
+
+
+def new_account_data(account_types, hasher, name, age, salary, pin, account_type, security_question,
+                     security_answer):
+    """Validate the fields of a new account and return its data, secrets hashed
+
+    The account number is left to be allocated when the account is opened.
+    """
+    if not all([name, age, salary, pin, security_answer]):
+        raise InvalidAccountDataError("All fields are required!")
+
+    try:
+        age = int(age)
+        salary = float(salary)
+    except ValueError as e:
+        raise InvalidAccountDataError(str(e))
+    _check_pin(pin)
+    if account_type not in account_types:
+        raise InvalidAccountDataError(f"Unknown account type: {account_type}")
+
+    return {
+        'name': name,
+        'age': age,
+        'salary': salary,
+        'pin': hasher.hash(pin),
+        'account_number': None,
+        'balance': 0,
+        'account_type': account_type,
+        'security_question': security_question,
+        'security_answer': hasher.hash(normalize_answer(security_answer)),
+        'transaction_log': []
+    }
+
+
+def verify_pin(hasher, throttle, name, pin, pin_hash):
+    """Check a PIN against its hash, counting failures per name in a LoginThrottle
+
+    A locked name is refused even with the right PIN until its lockout
+    expires. The attempt is counted as a failure before the slow check, so
+    concurrent logins cannot try more PINs than the throttle allows; a
+    successful check clears the count.
+    """
+    # Refuse locked accounts before looking at the PIN
+    failures = throttle.reserve(name)
+    if failures is None:
+        raise AccountLockedError(throttle.retry_after(name))
+
+    # Check if PIN is correct
+    if not hasher.verify(pin, pin_hash):
+        # Check if max attempts reached
+        if failures >= throttle.max_attempts:
+            raise AccountLockedError(throttle.window)
+        raise AuthenticationError(f"Invalid PIN. {throttle.max_attempts - failures} attempts remaining.")
+
+    # Reset login attempts on successful login
+    throttle.reset(name)
+
+
+class Ledger:
+    """GUI-free banking operations on top of an account store
+
+    Every operation validates its input, applies the change to the store and
+    returns the result, raising a LedgerError subclass when it is rejected.
+    The Tk modules only translate between widgets and these calls.
+
+    Operations may be called from several threads. Each account has its own
+    lock, held across the balance check and the update; transfers take both
+    locks in username order so two opposite transfers cannot deadlock.
+
+    PINs and security answers are stored as scrypt hashes made by
+    ``hasher``, so checking one is slow; call those operations off the UI
+    thread.
+
+    With ``metrics`` (a metrics.Metrics) every logged transaction is timed
+    as the ``log_transaction`` operation.
+    """
+
+    def __init__(self, store, account_types, hasher=DEFAULT_HASHER, metrics=None):
+        self.store = store
+        self.account_types = account_types
+        self.hasher = hasher
+        self.account_numbers = AccountNumberAllocator(store)
+        self._log_recorder = None if metrics is None else metrics.recorder('log_transaction')
+        self._account_locks = {}
+        self._account_locks_guard = threading.Lock()
+        self._create_lock = threading.Lock()
+
+    @contextmanager
+    def locked(self, *names):
+        """Hold the locks of the given accounts, taken in a fixed order"""
+        locks = [self._lock_for(name) for name in sorted(set(names))]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def _lock_for(self, name):
+        """Return the lock of an account, creating it on first use"""
+        lock = self._account_locks.get(name)
+        if lock is None:
+            with self._account_locks_guard:
+                lock = self._account_locks.setdefault(name, threading.RLock())
+        return lock
+
+    def parse_amount(self, amount):
+        """Convert an amount to a positive float no larger than MAX_AMOUNT"""
+        try:
+            amount = float(amount)
+        except (TypeError, ValueError):
+            raise InvalidAmountError()
+        # Also rejects infinity and NaN
+        if not 0 < amount <= MAX_AMOUNT:
+            raise InvalidAmountError()
+        return amount
+
+    def min_balance(self, user_data):
+        """Return the minimum balance required for an account"""
+        account_type = user_data.get('account_type', 'Savings')
+        return self.account_types[account_type]['min_balance']
+
+    def check_min_balance(self, user_data, amount):
+        """Refuse to take an amount that would leave less than the minimum balance"""
+        min_balance = self.min_balance(user_data)
+        if user_data['balance'] - amount < min_balance:
+            raise InsufficientFundsError(min_balance)
+
+    def get_account(self, name, message="User not found!"):
+        """Return the data of an account"""
+        user_data = self.store.get(name)
+        if user_data is None:
+            raise AccountNotFoundError(name, message)
+        return user_data
+
+    def resolve_account(self, identifier, message="User not found!"):
+        """Return the username for a username or an account number"""
+        identifier = identifier.strip()
+        if identifier in self.store:
+            return identifier
+        name = self.store.find_by_account_number(identifier)
+        if name is None:
+            raise AccountNotFoundError(identifier, message)
+        return name
+
+    def authenticate(self, name, pin, throttle):
+        """Check the PIN of an account and return its data
+
+        Failed attempts are counted per name in ``throttle`` (a
+        LoginThrottle), as verify_pin describes.
+        """
+        user_data = self.get_account(name)
+        verify_pin(self.hasher, throttle, name, pin, user_data['pin'])
+        self._rehash(name, 'pin', pin, user_data['pin'])
+        return user_data
+
+    def change_pin(self, name, current_pin, new_pin, confirm_pin):
+        """Replace the PIN of an account after checking the current one"""
+        if not current_pin or not new_pin or not confirm_pin:
+            raise InvalidAccountDataError("All fields are required!")
+
+        # Validate the new PIN before paying for the hash check
+        _check_pin(new_pin)
+        if new_pin != confirm_pin:
+            raise InvalidAccountDataError("New PINs do not match!")
+        if not self.hasher.verify(current_pin, self.get_account(name)['pin']):
+            raise AuthenticationError("Current PIN is incorrect!")
+
+        self.store.update_account(name, {'pin': self.hasher.hash(new_pin)})
+
+    def reset_pin(self, name, answer, new_pin):
+        """Replace the PIN of an account after checking its security answer"""
+        if not name or not answer or not new_pin:
+            raise InvalidAccountDataError("All fields are required!")
+        user_data = self.get_account(name)
+
+        _check_pin(new_pin)
+
+        # Answers compare case-insensitively; hashes are already lower case
+        answer = normalize_answer(answer)
+        if not self.hasher.verify(answer, normalize_answer(user_data['security_answer'])):
+            raise AuthenticationError("Incorrect security answer!")
+
+        self.store.update_account(name, {'pin': self.hasher.hash(new_pin)})
+        self._rehash(name, 'security_answer', answer, user_data['security_answer'])
+
+    def set_security_question(self, name, question, answer):
+        """Replace the security question and answer of an account"""
+        if not question or not answer:
+            raise InvalidAccountDataError("All fields are required!")
+        self.store.update_account(name, {
+            'security_question': question,
+            'security_answer': self.hasher.hash(normalize_answer(answer))
+        })
+
+    def _rehash(self, name, field, secret, stored):
+        """Store a fresh hash of a verified secret kept in plain text or at an old cost"""
+        if self.hasher.needs_rehash(stored):
+            self.store.update_account(name, {field: self.hasher.hash(secret)})
+
+    def create_account(self, name, age, salary, pin, account_type, security_question, security_answer,
+                       account_number=None):
+        """Validate and open a new account, returning its data
+
+        A new account number is allocated unless one is given.
+        """
+        # Hash outside the lock, as it is the slow part
+        user_data = new_account_data(self.account_types, self.hasher, name, age, salary, pin, account_type,
+                                     security_question, security_answer)
+        return self.open_account(name, user_data, account_number)
+
+    def open_account(self, name, user_data, account_number=None):
+        """Store the data made by new_account_data as a new account"""
+        # Allocate the account number and store the account together
+        with self._create_lock, self.store.batch():
+            if name in self.store:
+                raise AccountExistsError(name)
+            user_data['account_number'] = account_number or self.account_numbers.allocate()
+            self.store.add_account(name, user_data)
+        return user_data
+
+    def deposit(self, name, amount):
+        """Deposit into an account and return the logged transaction"""
+        amount = self.parse_amount(amount)
+        with self.locked(name):
+            self.get_account(name)
+            return self.log_transaction(name, "Deposit", amount)
+
+    def withdraw(self, name, amount):
+        """Withdraw from an account and return the logged transaction"""
+        amount = self.parse_amount(amount)
+        with self.locked(name):
+            user_data = self.get_account(name)
+
+            # Check minimum balance requirement
+            self.check_min_balance(user_data, amount)
+
+            return self.log_transaction(name, "Withdrawal", -amount)
+
+    def transfer(self, sender, recipient, amount):
+        """Transfer between accounts and return the sender's transaction
+
+        The recipient may be given by username or account number.
+        """
+        recipient, amount = self.validate_transfer(sender, recipient, amount)
+
+        with self.locked(sender, recipient):
+            sender_data = self.get_account(sender)
+            self.get_account(recipient, "Recipient not found!")
+
+            # Check minimum balance requirement
+            self.check_min_balance(sender_data, amount)
+
+            # Log both sides of the transfer atomically
+            with self.store.batch():
+                transaction = self.log_transaction(sender, "Transfer to " + recipient, -amount)
+                self.log_transaction(recipient, "Transfer from " + sender, amount)
+            return transaction
+
+    def validate_transfer(self, sender, recipient, amount):
+        """Return the recipient's username and the amount of a transfer"""
+        amount = self.parse_amount(amount)
+        recipient = self.resolve_account(recipient, "Recipient not found!")
+        if recipient == sender:
+            raise SelfTransferError()
+        return recipient, amount
+
+    def log_transaction(self, name, transaction_type, amount):
+        """Apply a transaction amount to an account and log it"""
+        recorder = self._log_recorder
+        if recorder is None:
+            return self._log_transaction(name, transaction_type, amount)
+        # Timed inline, as every balance change comes through here
+        start = time.perf_counter_ns()
+        try:
+            transaction = self._log_transaction(name, transaction_type, amount)
+        except BaseException:
+            recorder.record(time.perf_counter_ns() - start, error=True)
+            raise
+        recorder.record(time.perf_counter_ns() - start)
+        return transaction
+
+    def _log_transaction(self, name, transaction_type, amount):
+        with self.locked(name):
+            user_data = self.store[name]
+            balance = user_data['balance'] + amount
+            if not -MAX_BALANCE <= balance <= MAX_BALANCE:
+                raise InvalidAmountError("The balance would exceed the largest the bank can hold!")
+
+            # Create transaction record
+            transaction = {
+                'timestamp': int(time.time()),
+                'type': transaction_type,
+                'amount': amount,
+                'balance': balance
+            }
+
+            # Add transaction to log, which also updates the stored balance
+            self.store.append_transaction(name, transaction)
+            return transaction
+
+    def get_transactions(self, name):
+        """Return the transaction log of an account"""
+        return self.store.get_transactions(name)
+
+    def count_transactions(self, name, after=None):
+        """Return the number of transactions, or those made after a timestamp"""
+        return self.store.count_transactions(name, after)
+
+    def list_transactions(self, name, offset=0, limit=100):
+        """Return a page of transactions, newest first"""
+        return self.store.list_transactions(name, offset, limit)
@@ -0,0 +1,104 @@
+"""Bounded, expiring count of failed logins
+
+Replaces an ever-growing dictionary of attempt counts: a lockout ends on its
+own after a quiet period, and a flood of failures for random names can
+never hold more than a fixed number of entries.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LoginThrottle:
+    """Failed login counts per name that expire and never outgrow a cap
+
+    A name is locked once it has ``max_attempts`` failures, each less than
+    ``window`` seconds after the previous one; the lock lifts by itself
+    ``window`` seconds after the last failure. Entries are kept in the
+    order of their last failure, so expired entries are always at the front
+    and are dropped as new failures come in. When more than ``max_entries``
+    names are tracked the stalest entry is dropped. Every check is O(1).
+    """
+
+    def __init__(self, max_attempts=3, window=900, max_entries=100000, clock=time.monotonic):
+        self.max_attempts = max_attempts
+        self.window = window
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def failures(self, name):
+        """Return the number of recent failures of a name"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry[1] <= self.clock():
+                return 0
+            return entry[0]
+
+    def is_locked(self, name):
+        """Return True while a name has too many recent failures"""
+        return self.failures(name) >= self.max_attempts
+
+    def remaining(self, name):
+        """Return the number of attempts left before the name is locked"""
+        return max(0, self.max_attempts - self.failures(name))
+
+    def retry_after(self, name):
+        """Return the seconds until a locked name is unlocked"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry[0] < self.max_attempts:
+                return 0.0
+            return max(0.0, entry[1] - self.clock())
+
+    def record_failure(self, name):
+        """Count a failed login and return the number of recent failures"""
+        with self._lock:
+            return self._record(name, self.clock())
+
+    def reserve(self, name):
+        """Count a login attempt about to be checked as a failure, unless the
+        name is locked
+
+        Returns the number of recent failures counting this attempt, or None
+        when the name is locked. The check and the count are one step, so
+        concurrent attempts can never check more than ``max_attempts`` PINs
+        per window; a successful attempt clears the count with reset().
+        """
+        with self._lock:
+            now = self.clock()
+            entry = self._entries.get(name)
+            if entry is not None and entry[1] > now and entry[0] >= self.max_attempts:
+                return None
+            return self._record(name, now)
+
+    def reset(self, name):
+        """Forget the failures of a name"""
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def _record(self, name, now):
+        """Count a failure at now and return the recent failures; the lock is held"""
+        self._evict_expired(now)
+
+        entry = self._entries.pop(name, None)
+        count = entry[0] + 1 if entry is not None and entry[1] > now else 1
+        self._entries[name] = (count, now + self.window)
+
+        # Keep the number of tracked names bounded
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return count
+
+    def _evict_expired(self, now):
+        """Drop expired entries from the front of the queue"""
+        entries = self._entries
+        while entries:
+            name, (count, expires) = next(iter(entries.items()))
+            if expires > now:
+                return
+            del entries[name]
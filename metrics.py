@@ -0,0 +1,311 @@
+"""Latency histograms and throughput counters for ledger operations
+
+LatencyHistogram follows the HdrHistogram layout: values are counted in
+buckets whose width doubles with every power of two, each power of two split
+into 128 linear sub-buckets. Any latency from a microsecond to hours is thus
+kept to within 1% in a few thousand counters, and recording is an index
+computation and an increment, with no allocation.
+
+Metrics is the registry the application times its operations with:
+
+    with metrics.timer('deposit'):
+        ledger.deposit(name, amount)
+
+An operation that raises is timed too and counted as an error. Hot paths
+keep the Recorder of their operation and record into it, which skips the
+lookup and the context manager:
+
+    recorder = metrics.recorder('log_transaction')
+    start = perf_counter_ns()
+    post(name, amount)
+    recorder.record(perf_counter_ns() - start)
+
+Recording appends the latency to a list, which needs no lock as a single
+append is atomic; the values are counted into the histogram in batches, with
+NumPy, by
+the recording thread once a batch is full or by a snapshot. Snapshots give
+counts, rates and percentiles per operation, and ``dump`` writes them with
+the raw bucket counts to a JSON file.
+"""
+import json
+import threading
+import time
+
+perf_counter_ns = time.perf_counter_ns
+
+# Sub-buckets per power of two; values are kept to within 1 / SUB_BUCKETS
+SUB_BUCKET_BITS = 7
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+# Latencies from this many nanoseconds up (about 18 minutes) share the last bucket
+HIGHEST_VALUE = 1 << 40
+
+# Percentiles shown in snapshots
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def bucket_index(value):
+    """Return the bucket counting a non-negative integer value"""
+    if value < 2 * SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return shift * SUB_BUCKETS + (value >> shift)
+
+
+def bucket_bounds(index):
+    """Return the lowest value of a bucket and its width"""
+    if index < 2 * SUB_BUCKETS:
+        return index, 1
+    shift = index // SUB_BUCKETS - 1
+    return (index - shift * SUB_BUCKETS) << shift, 1 << shift
+
+
+class LatencyHistogram:
+    """Counts of latencies in nanoseconds in log-linear buckets
+
+    ``errors`` counts the recorded operations that failed.
+    """
+
+    BUCKETS = bucket_index(HIGHEST_VALUE)
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.errors = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        """Count one latency in nanoseconds"""
+        if value < 2 * SUB_BUCKETS:
+            self.counts[value] += 1
+        elif value < HIGHEST_VALUE:
+            shift = value.bit_length() - SUB_BUCKET_BITS - 1
+            self.counts[shift * SUB_BUCKETS + (value >> shift)] += 1
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def record_all(self, values):
+        """Count a list of latencies in nanoseconds, with NumPy"""
+        if not values:
+            return
+        # Imported here rather than with the module, which the application
+        # loads before its login screen
+        import numpy as np
+
+        # Bucket indexes as in record; frexp gives the bit length of values
+        # below 2 ** 53 exactly
+        array = np.minimum(np.array(values, dtype=np.int64), HIGHEST_VALUE - 1)
+        shift = np.maximum(np.frexp(array.astype(np.float64))[1] - SUB_BUCKET_BITS - 1, 0)
+        buckets = np.bincount(shift * SUB_BUCKETS + (array >> shift), minlength=self.BUCKETS)
+        counts = self.counts
+        used = np.flatnonzero(buckets)
+        for index, count in zip(used.tolist(), buckets[used].tolist()):
+            counts[index] += count
+        self.count += len(values)
+        self.total += sum(values)
+        self.max = max(self.max, max(values))
+
+    @property
+    def min(self):
+        """Return the lowest value of the lowest non-empty bucket"""
+        for index, count in enumerate(self.counts):
+            if count:
+                return bucket_bounds(index)[0]
+        return 0
+
+    def percentile(self, percent):
+        """Return the latency at a percentile, in nanoseconds"""
+        if not self.count:
+            return 0
+        # Rank of the value, counting from one
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                low, width = bucket_bounds(index)
+                # The middle of the bucket, within the observed range
+                return min(low + (width - 1) // 2, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def merge(self, other):
+        """Add the counts of another histogram"""
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.errors += other.errors
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def to_json(self):
+        """Return the non-empty buckets as {lowest value: count}"""
+        return {str(bucket_bounds(index)[0]): count for index, count in enumerate(self.counts) if count}
+
+
+class Recorder:
+    """Latencies of one operation, counted into a histogram in batches"""
+
+    # Values waiting before the recording thread counts them
+    BATCH = 4096
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.values = []
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def record(self, value, error=False):
+        """Record one latency in nanoseconds"""
+        values = self.values
+        values.append(value)
+        if error:
+            self.failures.append(value)
+        if len(values) >= self.BATCH:
+            self.flush()
+
+    def flush(self):
+        """Count the waiting values into the histogram"""
+        with self._lock:
+            # Values appended meanwhile by other threads stay for next time
+            count = len(self.values)
+            values = self.values[:count]
+            del self.values[:count]
+            failures = len(self.failures)
+            del self.failures[:failures]
+            self.histogram.record_all(values)
+            self.histogram.errors += failures
+
+    def copy(self):
+        """Return a copy of the histogram with every value counted"""
+        self.flush()
+        histogram = LatencyHistogram()
+        with self._lock:
+            histogram.merge(self.histogram)
+        return histogram
+
+    def reset(self):
+        with self._lock:
+            self.histogram = LatencyHistogram()
+            del self.values[:]
+            del self.failures[:]
+
+
+class _Timing:
+    """Times one operation into a recorder for Metrics.timer"""
+
+    __slots__ = ('recorder', 'start')
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.recorder.record(perf_counter_ns() - self.start, exc_type is not None)
+        return False
+
+
+class _NoTiming:
+    """Stands in for _Timing when metrics are disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NO_TIMING = _NoTiming()
+
+
+class Metrics:
+    """Latency histograms with operation and error counts by name
+
+    Safe to record from several threads. With ``enabled`` false every
+    timer is a shared no-op and there are no recorders, so the
+    instrumentation can be measured against its absence.
+    """
+
+    def __init__(self, enabled=True, clock=time.monotonic):
+        self.enabled = enabled
+        self.clock = clock
+        self.started = clock()
+        self._recorders = {}
+        self._lock = threading.Lock()
+
+    def timer(self, name):
+        """Return a context manager timing one operation"""
+        if not self.enabled:
+            return _NO_TIMING
+        return _Timing(self.recorder(name))
+
+    def recorder(self, name):
+        """Return the Recorder of an operation, or None when disabled"""
+        if not self.enabled:
+            return None
+        recorder = self._recorders.get(name)
+        if recorder is None:
+            with self._lock:
+                recorder = self._recorders.setdefault(name, Recorder())
+        return recorder
+
+    def start(self):
+        """Return a start time for an operation that ends in a callback"""
+        return perf_counter_ns()
+
+    def record(self, name, start, error=False):
+        """Record an operation that began at a start time from start()"""
+        if not self.enabled:
+            return
+        self.recorder(name).record(perf_counter_ns() - start, error)
+
+    def histograms(self):
+        """Return a copy of the histogram of every operation recorded"""
+        with self._lock:
+            recorders = list(self._recorders.items())
+        return {name: recorder.copy() for name, recorder in recorders if recorder.values or recorder.histogram.count}
+
+    def reset(self):
+        with self._lock:
+            for recorder in self._recorders.values():
+                recorder.reset()
+            self.started = self.clock()
+
+    def snapshot(self):
+        """Return a summary per operation, with latencies in milliseconds"""
+        uptime = max(self.clock() - self.started, 1e-9)
+        summary = {}
+        for name, histogram in sorted(self.histograms().items()):
+            summary[name] = {
+                'count': histogram.count,
+                'errors': histogram.errors,
+                'rate_per_s': histogram.count / uptime,
+                'mean_ms': histogram.mean / 1e6,
+                'min_ms': histogram.min / 1e6,
+                'max_ms': histogram.max / 1e6,
+            }
+            for percent in PERCENTILES:
+                summary[name][f'p{percent:g}_ms'] = histogram.percentile(percent) / 1e6
+        return summary
+
+    def dump(self, path):
+        """Write the summaries and raw bucket counts to a JSON file"""
+        summary = self.snapshot()
+        buckets = {name: histogram.to_json() for name, histogram in self.histograms().items()}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'time': time.time(),
+                'uptime_s': self.clock() - self.started,
+                'operations': summary,
+                'buckets_ns': buckets
+            }, f, indent=2)
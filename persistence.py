@@ -0,0 +1,325 @@
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+from transaction_log import TransactionLog
+
+
+class LedgerPersistence:
+    """Append-only write-ahead log with periodic snapshots of the user accounts
+
+    Every mutation of the users dictionary is written as one JSON line to the
+    log before the caller moves on. Once the log holds ``snapshot_interval``
+    records, the log is sealed and a new one started, and a background
+    thread writes the users dictionary to a snapshot file, after which the
+    sealed log is removed. A restart only has to load one snapshot and
+    replay a short tail of the log.
+
+    Callers that change the users dictionary from several threads hold
+    ``lock`` while applying a change and recording it. The snapshot is
+    written in chunks of accounts, each encoded under the lock and tagged
+    with the sequence number it is current to, so record writers only ever
+    wait for one chunk. Replay skips the records a chunk already contains.
+    Batches are kept per thread, and no chunk is encoded while any batch is
+    open, so a snapshot never contains a change whose record is written
+    after it.
+    """
+
+    SNAPSHOT_FILE = 'snapshot.json'
+    LOG_FILE = 'ledger.log'
+    # The sealed log whose records the snapshot being written will contain
+    SEALED_LOG_FILE = 'ledger.log.sealed'
+
+    # Accounts encoded per hold of the lock while writing a snapshot
+    SNAPSHOT_CHUNK = 1000
+
+    def __init__(self, data_dir, snapshot_interval=10000, fsync=True):
+        self.data_dir = data_dir
+        self.snapshot_interval = snapshot_interval
+        self.fsync = fsync
+        self.snapshot_path = data_dir and os.path.join(data_dir, self.SNAPSHOT_FILE)
+        self.log_path = data_dir and os.path.join(data_dir, self.LOG_FILE)
+        self.sealed_log_path = data_dir and os.path.join(data_dir, self.SEALED_LOG_FILE)
+        self.users = {}
+        self.meta = {}
+        self.sequence = 0
+        self.records_since_snapshot = 0
+        self._log_file = None
+        self.lock = threading.RLock()
+        self._local = threading.local()
+        self._open_batches = 0
+        self._snapshot_thread = None
+
+    def load(self):
+        """Load the latest snapshot, replay the log tail and return the users"""
+        if self.data_dir is None:
+            # Without a data directory the ledger is kept in memory only
+            return self.users
+
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        # Load the snapshot if one has been taken
+        users = {}
+        meta = {}
+        sequence = 0
+        meta_sequence = 0
+        account_sequences = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding='utf-8') as snapshot_file:
+                snapshot = json.load(snapshot_file)
+            meta = snapshot.get('meta', {})
+            sequence = snapshot['sequence']
+            meta_sequence = snapshot.get('meta_sequence', sequence)
+
+            # Older snapshots hold every account as of the snapshot sequence
+            users = snapshot.get('users', {})
+            for chunk in snapshot.get('chunks', ()):
+                users.update(chunk['users'])
+                account_sequences.update(dict.fromkeys(chunk['users'], chunk['seq']))
+
+            # Rebuild the columnar transaction logs
+            for user_data in users.values():
+                transactions = user_data.get('transactions')
+                if isinstance(transactions, dict):
+                    user_data['transactions'] = TransactionLog.from_json(transactions)
+                elif isinstance(transactions, list):
+                    user_data['transactions'] = TransactionLog.from_records(transactions)
+
+        # Replay the records the snapshot does not contain: those of a sealed
+        # log left by a snapshot that did not finish, then those of the log
+        replayed = 0
+        last_sequence = sequence
+        for path in (self.sealed_log_path, self.log_path):
+            if not os.path.exists(path):
+                continue
+            valid_length = 0
+            with open(path, 'rb') as log_file:
+                for line in log_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn write at the end of the log is discarded
+                        break
+                    if not line.endswith(b'\n'):
+                        break
+                    valid_length += len(line)
+                    if record['seq'] <= last_sequence:
+                        # Already contained in the snapshot, or copied twice
+                        # into the sealed log
+                        continue
+                    for sub_record in record['records'] if record['op'] == 'batch' else (record,):
+                        # Skip changes already contained in the snapshot chunk
+                        if sub_record['op'] == 'meta':
+                            applied = meta_sequence
+                        else:
+                            applied = account_sequences.get(sub_record['name'], sequence)
+                        if record['seq'] > applied:
+                            apply_record(users, sub_record, meta)
+                    last_sequence = record['seq']
+                    replayed += 1
+
+            # Cut off a torn tail so new records are not appended after it
+            if valid_length != os.path.getsize(path):
+                with open(path, 'r+b') as log_file:
+                    log_file.truncate(valid_length)
+
+        self.users = users
+        self.meta = meta
+        self.sequence = last_sequence
+        self.records_since_snapshot = replayed
+        self._log_file = open(self.log_path, 'a', encoding='utf-8')
+        return users
+
+    def record_account(self, name, user_data):
+        """Record the creation of an account"""
+        self._append({'op': 'put', 'name': name, 'data': user_data})
+
+    def record_update(self, name, fields):
+        """Record changed fields of an account"""
+        self._append({'op': 'set', 'name': name, 'fields': fields})
+
+    def record_delete(self, name):
+        """Record the deletion of an account"""
+        self._append({'op': 'delete', 'name': name})
+
+    def record_transaction(self, name, transaction):
+        """Record a logged transaction together with the resulting balance"""
+        self._append({'op': 'txn', 'name': name, 'txn': transaction})
+
+    def record_meta(self, key, value):
+        """Record a change of store metadata"""
+        self._append({'op': 'meta', 'key': key, 'value': value})
+
+    @contextmanager
+    def batch(self):
+        """Write all records made inside the block as one atomic log entry"""
+        if getattr(self._local, 'batch', None) is not None:
+            # Nested batches are folded into the outer one
+            yield
+            return
+
+        with self.lock:
+            self._open_batches += 1
+        self._local.batch = []
+        try:
+            yield
+        finally:
+            records, self._local.batch = self._local.batch, None
+            with self.lock:
+                self._open_batches -= 1
+                if records:
+                    self._write('{"op":"batch","records":[' + ','.join(records) + ']')
+
+    def snapshot(self):
+        """Write a compact snapshot of all users, truncate the log and wait for it"""
+        self.wait_for_snapshot()
+        with self.lock:
+            if self._log_file is None:
+                return
+            thread = self._snapshot_thread or self._start_snapshot()
+        thread.join()
+
+    def wait_for_snapshot(self):
+        """Wait until a snapshot being written in the background is done"""
+        thread = self._snapshot_thread
+        if thread is not None:
+            thread.join()
+
+    def close(self):
+        """Take a final snapshot and close the log"""
+        self.wait_for_snapshot()
+        with self.lock:
+            if self._log_file is None:
+                return
+            pending = self.records_since_snapshot
+        if pending:
+            self.snapshot()
+        with self.lock:
+            self._log_file.close()
+            self._log_file = None
+
+    def _start_snapshot(self):
+        """Seal the log and write a snapshot in the background; the lock is held"""
+        self._log_file.close()
+        if os.path.exists(self.sealed_log_path):
+            # A snapshot that did not finish left its sealed log; keep both
+            with open(self.log_path, 'rb') as log_file, open(self.sealed_log_path, 'ab') as sealed_file:
+                shutil.copyfileobj(log_file, sealed_file)
+        else:
+            os.replace(self.log_path, self.sealed_log_path)
+        self._log_file = open(self.log_path, 'w', encoding='utf-8')
+        self.records_since_snapshot = 0
+
+        self._snapshot_thread = threading.Thread(target=self._write_snapshot, args=(self.sequence,),
+                                                 name='ledger-snapshot', daemon=True)
+        self._snapshot_thread.start()
+        return self._snapshot_thread
+
+    def _write_snapshot(self, sequence):
+        """Write a snapshot containing every record up to sequence"""
+        try:
+            with self.lock:
+                names = list(self.users)
+
+            # Write the snapshot next to the old one and swap it in atomically
+            temp_path = self.snapshot_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as snapshot_file:
+                snapshot_file.write(f'{{"sequence":{sequence},"chunks":[')
+                for start in range(0, len(names), self.SNAPSHOT_CHUNK):
+                    with self._quiescent():
+                        users = {name: self.users[name] for name in names[start:start + self.SNAPSHOT_CHUNK]
+                                 if name in self.users}
+                        chunk = json.dumps({'seq': self.sequence, 'users': users}, separators=(',', ':'),
+                                           default=_encode)
+                    snapshot_file.write(chunk if not start else ',' + chunk)
+                with self._quiescent():
+                    meta = json.dumps(self.meta, separators=(',', ':'))
+                    meta_sequence = self.sequence
+                snapshot_file.write(f'],"meta_sequence":{meta_sequence},"meta":{meta}}}')
+                snapshot_file.flush()
+                os.fsync(snapshot_file.fileno())
+            os.replace(temp_path, self.snapshot_path)
+
+            # The sealed log holds only records up to the snapshot sequence, so
+            # a crash before its removal is harmless
+            with self.lock:
+                os.remove(self.sealed_log_path)
+        finally:
+            with self.lock:
+                self._snapshot_thread = None
+
+    @contextmanager
+    def _quiescent(self):
+        """Hold the lock at a moment when no batch holds unwritten changes"""
+        while True:
+            self.lock.acquire()
+            if not self._open_batches:
+                break
+            self.lock.release()
+            time.sleep(0.001)
+        try:
+            yield
+        finally:
+            self.lock.release()
+
+    def _append(self, record):
+        """Append a record to the log, or to the current thread's batch"""
+        if self._log_file is None:
+            return
+
+        # Records are encoded right away so later changes to the objects they
+        # reference are not picked up
+        encoded = json.dumps(record, separators=(',', ':'), default=_encode)
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            batch.append(encoded)
+            return
+
+        with self.lock:
+            self._write(encoded[:-1])
+
+    def _write(self, encoded):
+        """Write an encoded record missing its closing brace and sequence number"""
+        self.sequence += 1
+        self._log_file.write(f'{encoded},"seq":{self.sequence}}}\n')
+        self._log_file.flush()
+        if self.fsync:
+            os.fsync(self._log_file.fileno())
+
+        # Snapshot once it is due, unless one is still being written
+        self.records_since_snapshot += 1
+        if self.records_since_snapshot >= self.snapshot_interval and self._snapshot_thread is None:
+            self._start_snapshot()
+
+
+def apply_record(users, record, meta):
+    """Apply one log record to the users and metadata dictionaries"""
+    op = record['op']
+    if op == 'put':
+        users[record['name']] = record['data']
+    elif op == 'set':
+        users[record['name']].update(record['fields'])
+    elif op == 'delete':
+        users.pop(record['name'], None)
+    elif op == 'txn':
+        user_data = users[record['name']]
+        transactions = user_data.get('transactions')
+        if transactions is None:
+            transactions = user_data['transactions'] = TransactionLog()
+        transactions.append_record(record['txn'])
+        user_data['balance'] = record['txn']['balance']
+    elif op == 'meta':
+        meta[record['key']] = record['value']
+    elif op == 'batch':
+        for sub_record in record['records']:
+            apply_record(users, sub_record, meta)
+
+
+def _encode(value):
+    """Encode values the json module does not handle natively"""
+    if isinstance(value, TransactionLog):
+        return value.to_json()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
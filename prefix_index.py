@@ -0,0 +1,174 @@
+"""Prefix search over usernames and account holder names
+
+The index is a sorted collection of "term\0username" strings, where the
+terms of an account are its username and holder name in lower case. All
+entries starting with a prefix are adjacent, so a search is a bisect
+followed by a short scan, independent of the number of accounts. Plain
+strings sort and compare much faster than tuples, which matters when the
+index is built over a million accounts. The entries are kept in chunks of
+about a thousand, so adding or removing one shifts a single chunk rather
+than the whole collection.
+
+The index follows the account store through its identity change feed:
+before a search it applies only the accounts created, deleted or renamed
+since the last one, so they show up without the callers having to tell
+the index, and balance updates cost it nothing.
+"""
+from bisect import bisect_left, insort
+from itertools import islice
+
+SEPARATOR = '\0'
+
+
+def normalize_term(text):
+    return str(text).strip().lower()
+
+
+class SortedChunks:
+    """Sorted strings held as a list of sorted chunks
+
+    ``maxes`` holds the last string of every chunk, so the chunk a string
+    belongs in is found by bisecting it. Chunks are split when they grow to
+    twice CHUNK_SIZE and dropped when they empty.
+    """
+
+    CHUNK_SIZE = 1000
+
+    def __init__(self, items=()):
+        items = sorted(items)
+        size = self.CHUNK_SIZE
+        self.chunks = [items[start:start + size] for start in range(0, len(items), size)]
+        self.maxes = [chunk[-1] for chunk in self.chunks]
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def add(self, item):
+        if not self.chunks:
+            self.chunks.append([item])
+            self.maxes.append(item)
+            return
+        index = bisect_left(self.maxes, item)
+        if index == len(self.maxes):
+            # Past the end: append to the last chunk
+            index -= 1
+            self.chunks[index].append(item)
+            self.maxes[index] = item
+        else:
+            insort(self.chunks[index], item)
+
+        chunk = self.chunks[index]
+        if len(chunk) >= 2 * self.CHUNK_SIZE:
+            half = len(chunk) // 2
+            self.chunks[index:index + 1] = [chunk[:half], chunk[half:]]
+            self.maxes[index:index + 1] = [chunk[half - 1], chunk[-1]]
+
+    def discard(self, item):
+        index = bisect_left(self.maxes, item)
+        if index == len(self.maxes):
+            return
+        chunk = self.chunks[index]
+        position = bisect_left(chunk, item)
+        if chunk[position] != item:
+            return
+        del chunk[position]
+        if not chunk:
+            del self.chunks[index]
+            del self.maxes[index]
+        elif position == len(chunk):
+            self.maxes[index] = chunk[-1]
+
+    def iter_from(self, item):
+        """Iterate over the strings from the first one not below item"""
+        index = bisect_left(self.maxes, item)
+        if index == len(self.maxes):
+            return
+        chunk = self.chunks[index]
+        yield from islice(chunk, bisect_left(chunk, item), None)
+        for chunk in islice(self.chunks, index + 1, None):
+            yield from chunk
+
+
+class PrefixIndex:
+    """Sorted term and username entries of an account store, searched by prefix"""
+
+    def __init__(self, store):
+        self.store = store
+        self.version = None
+        self._entries = SortedChunks()
+        self._terms = {}
+
+    def __len__(self):
+        return len(self._terms)
+
+    def search(self, prefix, limit=10):
+        """Return up to limit usernames whose username or name starts with prefix
+
+        Matches are ordered by the matching term, usernames first on ties.
+        """
+        self.sync()
+        prefix = normalize_term(prefix).replace(SEPARATOR, '')
+        if not prefix:
+            return []
+
+        matches = []
+        seen = set()
+        for entry in self._entries.iter_from(prefix):
+            if not entry.startswith(prefix):
+                break
+            username = entry.partition(SEPARATOR)[2]
+            if username not in seen:
+                seen.add(username)
+                matches.append(username)
+                if len(matches) == limit:
+                    break
+        return matches
+
+    def sync(self):
+        """Apply the accounts created, deleted or renamed since the last sync"""
+        store = self.store
+        if self.version == store.identity_version:
+            return
+        changes = None if self.version is None else store.identity_changes_since(self.version)
+        version = store.identity_version
+        if changes is None:
+            self.rebuild()
+        else:
+            for username in changes:
+                user_data = store.get(username)
+                if user_data is None:
+                    self.remove(username)
+                else:
+                    self.add(username, user_data.get('name'))
+        self.version = version
+
+    def rebuild(self):
+        """Index every account of the store from scratch"""
+        version = self.store.identity_version
+        terms_of = self._terms_of
+        self._terms = {username: terms_of(username, user_data.get('name')) for username, user_data in self.store.items()}
+        self._entries = SortedChunks(term + SEPARATOR + username for username, terms in self._terms.items() for term in terms)
+        self.version = version
+
+    def add(self, username, name=None):
+        """Index an account, replacing the terms it had before"""
+        terms = self._terms_of(username, name)
+        old_terms = self._terms.get(username, ())
+        if terms == old_terms:
+            return
+        for term in old_terms:
+            self._entries.discard(term + SEPARATOR + username)
+        for term in terms:
+            self._entries.add(term + SEPARATOR + username)
+        self._terms[username] = terms
+
+    def remove(self, username):
+        """Drop an account from the index"""
+        for term in self._terms.pop(username, ()):
+            self._entries.discard(term + SEPARATOR + username)
+
+    @staticmethod
+    def _terms_of(username, name):
+        username_term = username.lower()
+        name_term = name.strip().lower() if isinstance(name, str) and name else username_term
+        return (username_term,) if name_term == username_term else (username_term, name_term)
@@ -0,0 +1,421 @@
+"""In-memory indexes for admin searches over accounts and transactions
+
+Answers four kinds of queries without scanning every account:
+
+- names like a text: a trigram inverted index over usernames and holder
+  names finds substring matches, and ranks near misses by shared trigrams;
+  texts too short for trigrams match name prefixes in a sorted array
+- account numbers starting with a prefix: a sorted array searched by bisect
+- balances within a range: a sorted array of balances
+- transactions of a kind over an amount: per kind ("Deposit",
+  "Transfer to", ...) an array of transactions sorted by amount
+
+Accounts are referred to by small integer ids, so the sorted indexes are
+NumPy arrays of a few bytes per entry rather than lists of tuples. Changes
+wait in short side lists that queries also read, and are merged into the
+arrays with one vectorized insert once enough have piled up.
+
+Like PrefixIndex, the indexes follow the account store's change feed: before
+each query only the accounts that changed are read again, and of those only
+the transactions logged since the last query. When the feed no longer
+reaches back far enough, every account is compared with what was indexed
+for it, which still reads only the new transactions but takes long enough
+to be run off the UI thread (see needs_rescan).
+"""
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+import numpy as np
+
+from transaction_log import TRANSACTION_TYPES, type_code
+
+# Transaction types that name the other account after a fixed kind
+COUNTERPARTY_KINDS = ('Transfer to', 'Transfer from')
+
+# Trigrams shared by more accounts than this carry too little signal to
+# rank fuzzy matches
+FUZZY_POSTING_LIMIT = 20000
+
+
+def transaction_kind(transaction_type):
+    """Split a transaction type into (kind, counterparty)"""
+    for kind in COUNTERPARTY_KINDS:
+        if transaction_type.startswith(kind + ' '):
+            return kind, transaction_type[len(kind) + 1:]
+    return transaction_type, ''
+
+
+def trigrams(text):
+    """Return the set of three-character substrings of a text"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def term_trigrams(text):
+    """Return the trigrams indexed for a term, padded to mark its ends
+
+    Every trigram of a substring of the term is among them.
+    """
+    return trigrams(f" {text} ")
+
+
+class SortedArrays:
+    """Parallel NumPy arrays kept sorted by the first, with account ids second
+
+    Changes are not applied to the arrays one at a time. Added rows wait in
+    a pending list and the ids whose rows were dropped are remembered;
+    reads merge the pending rows in and skip the dropped ids. Once
+    MERGE_ROWS changes are waiting they are applied in one vectorized pass.
+    """
+
+    MERGE_ROWS = 20000
+
+    # Rows converted from the arrays at a time while reading
+    BLOCK = 256
+
+    def __init__(self, *dtypes):
+        self.columns = [np.empty(0, dtype=dtype) for dtype in dtypes]
+        self._pending = []
+        self._pending_firsts = None
+        self._dropped = set()
+
+    def update(self, removed_ids=(), added=None):
+        """Drop the rows of some account ids and add new rows
+
+        ``added`` is a list of row tuples in column order.
+        """
+        if removed_ids:
+            removed_ids = set(removed_ids)
+            self._dropped |= removed_ids
+            if self._pending:
+                self._pending = [row for row in self._pending if row[1] not in removed_ids]
+                self._pending_firsts = None
+        if added:
+            self._pending.extend(added)
+            self._pending_firsts = None
+        if len(self._pending) + len(self._dropped) >= self.MERGE_ROWS:
+            self.merge()
+
+    def merge(self):
+        """Apply the waiting changes to the arrays"""
+        columns = self.columns
+        if self._dropped:
+            keep = ~np.isin(columns[1], np.fromiter(self._dropped, dtype=np.int64, count=len(self._dropped)))
+            columns = [column[keep] for column in columns]
+        if self._pending:
+            new_columns = [np.array(values, dtype=None if column.dtype.kind == 'U' else column.dtype)
+                           for values, column in zip(zip(*self._pending), columns)]
+            order = np.argsort(new_columns[0], kind='stable')
+            new_columns = [column[order] for column in new_columns]
+            # Text columns widen to the longest value
+            columns = [column.astype(np.promote_types(column.dtype, new_column.dtype), copy=False)
+                       for column, new_column in zip(columns, new_columns)]
+            positions = np.searchsorted(columns[0], new_columns[0], side='right')
+            columns = [np.insert(column, positions, new_column) for column, new_column in zip(columns, new_columns)]
+        self.columns = columns
+        self._pending = []
+        self._pending_firsts = None
+        self._dropped = set()
+
+    def ascending(self, value, side='left'):
+        """Iterate over the rows from value up, as tuples in order
+
+        With ``side='right'`` rows whose first column equals value are
+        skipped, as for np.searchsorted.
+        """
+        start = int(np.searchsorted(self.columns[0], value, side=side))
+        pending, firsts = self._sorted_pending()
+        pending_start = (bisect_left if side == 'left' else bisect_right)(firsts, value)
+        return heapq.merge(self._rows(start, len(self.columns[0])), pending[pending_start:])
+
+    def descending(self, value):
+        """Iterate over the rows above value, as tuples largest first"""
+        start = int(np.searchsorted(self.columns[0], value, side='right'))
+        pending, firsts = self._sorted_pending()
+        pending_start = bisect_right(firsts, value)
+        return heapq.merge(self._rows_reversed(start, len(self.columns[0])), reversed(pending[pending_start:]),
+                           reverse=True)
+
+    def _sorted_pending(self):
+        """Return the pending rows sorted, with their first columns"""
+        if self._pending_firsts is None:
+            self._pending.sort()
+            self._pending_firsts = [row[0] for row in self._pending]
+        return self._pending, self._pending_firsts
+
+    def _rows(self, start, stop):
+        dropped = self._dropped
+        for block_start in range(start, stop, self.BLOCK):
+            block = [column[block_start:block_start + self.BLOCK].tolist() for column in self.columns]
+            for row in zip(*block):
+                if row[1] not in dropped:
+                    yield row
+
+    def _rows_reversed(self, start, stop):
+        dropped = self._dropped
+        for block_stop in range(stop, start, -self.BLOCK):
+            block_start = max(block_stop - self.BLOCK, start)
+            block = [column[block_start:block_stop].tolist() for column in self.columns]
+            for row in reversed(list(zip(*block))):
+                if row[1] not in dropped:
+                    yield row
+
+
+class AccountSearchIndex:
+    """Inverted and range indexes over an account store"""
+
+    def __init__(self, store):
+        self.store = store
+        self.version = None
+        self._lock = threading.Lock()
+        self._reset()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def transaction_kinds(self):
+        self.sync()
+        return sorted(self._transactions)
+
+    def names_like(self, text, limit=100, fuzzy=True):
+        """Return usernames whose username or name contains text
+
+        Substring matches come first, sorted by username; when there are
+        fewer than limit, accounts sharing the most trigrams with the text
+        follow, so a misspelt name still finds its account. Texts of one or
+        two characters have no trigrams and match the start of usernames
+        and names instead.
+
+        The scan stops at limit matches, so when more accounts match, the
+        ones returned are not the first in username order: for short texts
+        they are those whose matching username or name sorts first, and for
+        longer ones the earliest indexed.
+        """
+        self.sync()
+        text = text.strip().lower()
+        if not text:
+            return []
+
+        if len(text) < 3:
+            matches = set()
+            for term, account_id in self._names.ascending(text):
+                if not term.startswith(text):
+                    break
+                matches.add(self._usernames[account_id])
+                if len(matches) == limit:
+                    break
+            return sorted(matches)
+
+        candidates = min((self._trigrams.get(gram, ()) for gram in trigrams(text)), key=len)
+        matches = set()
+        for account_id in candidates:
+            terms = self._terms[account_id]
+            if terms is not None and (text in terms[0] or text in terms[1]):
+                matches.add(self._usernames[account_id])
+                if len(matches) == limit:
+                    break
+        matches = sorted(matches)
+
+        if fuzzy and len(matches) < limit and len(text) >= 3:
+            matches.extend(self._similar(text, limit - len(matches), set(matches)))
+        return matches
+
+    def account_numbers_with_prefix(self, prefix, limit=100):
+        """Return (account number, username) pairs starting with a prefix"""
+        self.sync()
+        prefix = prefix.strip()
+        matches = []
+        for number, account_id in self._numbers.ascending(prefix):
+            if not number.startswith(prefix) or len(matches) == limit:
+                break
+            matches.append((number, self._usernames[account_id]))
+        return matches
+
+    def balance_between(self, low, high, limit=1000):
+        """Return (balance, username) pairs with a balance in [low, high]"""
+        self.sync()
+        high = float(high)
+        matches = []
+        for balance, account_id in self._balances.ascending(float(low)):
+            if balance > high or len(matches) == limit:
+                break
+            matches.append((balance, self._usernames[account_id]))
+        return matches
+
+    def transactions_over(self, kind, amount, counterparty='', limit=1000):
+        """Return (amount, username, timestamp, type) of a kind over an amount
+
+        Amounts are compared without their sign, largest first. For
+        transfers, ``counterparty`` narrows the results to one other account.
+        """
+        self.sync()
+        column = self._transactions.get(kind)
+        if column is None:
+            return []
+        results = []
+        for transaction_amount, account_id, timestamp, code in column.descending(float(amount)):
+            transaction_type = TRANSACTION_TYPES[code]
+            if counterparty and transaction_kind(transaction_type)[1] != counterparty:
+                continue
+            results.append((transaction_amount, self._usernames[account_id], timestamp, transaction_type))
+            if len(results) == limit:
+                break
+        return results
+
+    def needs_rescan(self):
+        """Return whether the next sync has to compare every account"""
+        store = self.store
+        return self.version != store.version and (self.version is None or store.changes_since(self.version) is None)
+
+    def sync(self):
+        """Apply the store changes made since the last sync
+
+        When the change feed no longer reaches back to the last sync, every
+        account of the store is compared with what was indexed for it.
+        """
+        with self._lock:
+            store = self.store
+            version = store.version
+            if self.version == version:
+                return
+            changes = None if self.version is None else store.changes_since(self.version)
+            if changes is None:
+                # Indexed accounts that are gone are found by looking them up
+                self._apply(set(self._ids).union(store))
+            else:
+                self._apply(changes[0])
+            self.version = version
+
+    def rebuild(self):
+        """Index every account and transaction of the store from scratch"""
+        with self._lock:
+            self._reset()
+            self.version = None
+        self.sync()
+
+    def _reset(self):
+        self._ids = {}
+        self._usernames = []
+        self._terms = []
+        self._counts = {}
+        self._numbers_of = []
+        self._balances_of = []
+        self._trigrams = {}
+        self._names = SortedArrays(str, np.int64)
+        self._numbers = SortedArrays(str, np.int64)
+        self._balances = SortedArrays(np.float64, np.int64)
+        self._transactions = {}
+
+    def _apply(self, usernames):
+        """Index the current state of changed accounts"""
+        store = self.store
+        deleted = set()
+        names = {}
+        numbers = {}
+        balances = {}
+        transactions = {}
+
+        for username in usernames:
+            user_data = store.get(username)
+            account_id = self._ids.get(username)
+            count = self._counts.get(username, 0)
+            new_count = 0 if user_data is None else store.count_transactions(username)
+
+            # Deleted accounts, and accounts deleted and created again in
+            # between, lose their entries
+            if account_id is not None and (user_data is None or new_count < count):
+                self._remove_account(username)
+                deleted.add(account_id)
+                account_id = None
+                count = 0
+            if user_data is None:
+                continue
+
+            name_term = str(user_data.get('name') or username).strip().lower()
+            if account_id is None:
+                account_id = self._add_account(username, name_term)
+                names[account_id] = self._terms[account_id]
+            elif self._rename_account(account_id, name_term):
+                names[account_id] = self._terms[account_id]
+            number = str(user_data['account_number'])
+            if self._numbers_of[account_id] != number:
+                numbers[account_id] = self._numbers_of[account_id] = number
+            balance = float(user_data['balance'])
+            if self._balances_of[account_id] != balance:
+                balances[account_id] = self._balances_of[account_id] = balance
+
+            # Only the transactions logged since the last sync are read
+            if new_count > count:
+                entries = store.get_transactions(username) if count == 0 else \
+                    store.list_transactions(username, 0, new_count - count)
+                for timestamp, transaction_type, amount, _ in entries:
+                    transactions.setdefault(transaction_kind(transaction_type)[0], []).append(
+                        (abs(amount), account_id, timestamp, type_code(transaction_type)))
+            self._counts[username] = new_count
+
+        # Merge the batch into the sorted arrays; changed accounts have their
+        # old entry dropped and the new one inserted
+        self._names.update(deleted | set(names),
+                           [(term, account_id) for account_id, terms in names.items() for term in set(terms)])
+        self._numbers.update(deleted | set(numbers), [(number, account_id) for account_id, number in numbers.items()])
+        self._balances.update(deleted | set(balances),
+                              [(balance, account_id) for account_id, balance in balances.items()])
+        for kind in set(self._transactions) | set(transactions):
+            column = self._transactions.setdefault(kind, SortedArrays(np.float64, np.int64, np.int64, np.int32))
+            column.update(deleted, transactions.get(kind))
+
+    def _add_account(self, username, name_term):
+        account_id = len(self._usernames)
+        username_term = username.lower()
+        self._ids[username] = account_id
+        self._usernames.append(username)
+        self._terms.append((username_term, name_term))
+        self._numbers_of.append(None)
+        self._balances_of.append(None)
+        self._post(term_trigrams(username_term) | term_trigrams(name_term), account_id)
+        return account_id
+
+    def _rename_account(self, account_id, name_term):
+        # Postings are never shrunk: candidates are checked against the
+        # current terms, so stale entries only cost a comparison
+        username_term, old_name_term = self._terms[account_id]
+        if name_term == old_name_term:
+            return False
+        self._terms[account_id] = (username_term, name_term)
+        self._post(term_trigrams(name_term) - term_trigrams(old_name_term) - term_trigrams(username_term), account_id)
+        return True
+
+    def _post(self, grams, account_id):
+        """Add an account to the postings of some trigrams"""
+        postings = self._trigrams
+        for gram in grams:
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array('i')
+            posting.append(account_id)
+
+    def _remove_account(self, username):
+        account_id = self._ids.pop(username)
+        self._terms[account_id] = None
+        self._counts.pop(username, None)
+
+    def _similar(self, text, limit, exclude):
+        """Return usernames ranked by the share of text's trigrams they have"""
+        grams = term_trigrams(text)
+        shared = Counter()
+        for gram in grams:
+            posting = self._trigrams.get(gram, ())
+            if len(posting) <= FUZZY_POSTING_LIMIT:
+                shared.update(set(posting))
+
+        scored = []
+        for account_id, count in shared.most_common(limit * 5):
+            terms = self._terms[account_id]
+            if terms is None or self._usernames[account_id] in exclude:
+                continue
+            score = count / len(grams)
+            if score >= 0.3:
+                scored.append((-score, self._usernames[account_id]))
+        return [username for _, username in sorted(scored)[:limit]]
@@ -1,6 +1,9 @@
-from tkinter import messagebox, Toplevel, Label, Entry, Button, Frame, StringVar, OptionMenu
+from tkinter import messagebox, Label, Entry, Button, Frame, StringVar, OptionMenu
 from tkinter import ttk
 
+from ledger import LedgerError
+from ui_components import Autocomplete, clear_entries
+
 class SecurityManagement:
     def __init__(self, bank_system):
         self.bank_system = bank_system
@@ -11,11 +14,12 @@ class SecurityManagement:
             messagebox.showerror("Error", "Please login first!")
             return
         
-        # Create PIN change window
-        pin_window = Toplevel(self.bank_system.root)
-        pin_window.title("Change PIN")
-        pin_window.geometry("300x200")
-        
+        # Show the PIN change window, built on first use
+        widgets = self.bank_system.dialogs.show('change_pin', "Change PIN", "300x200", self._build_change_pin)
+        widgets['current_pin'].focus_set()
+    
+    def _build_change_pin(self, pin_window):
+        """Create the widgets of the PIN change window"""
         # Create frame
         frame = Frame(pin_window)
         frame.pack(padx=20, pady=20)
@@ -39,39 +43,28 @@ class SecurityManagement:
         Button(frame, text="Change PIN", command=lambda: self._process_pin_change(
             current_pin_entry.get(),
             new_pin_entry.get(),
-            confirm_pin_entry.get(),
-            pin_window
+            confirm_pin_entry.get()
         )).grid(row=3, column=0, columnspan=2, pady=10)
+        return {'current_pin': current_pin_entry, 'new_pin': new_pin_entry, 'confirm_pin': confirm_pin_entry}
     
-    def _process_pin_change(self, current_pin, new_pin, confirm_pin, window):
+    def _process_pin_change(self, current_pin, new_pin, confirm_pin):
         """Process PIN change"""
-        # Validate inputs
-        if not current_pin or not new_pin or not confirm_pin:
-            messagebox.showerror("Error", "All fields are required!")
-            return
-        
-        # Check if current PIN is correct
-        user_data = self.bank_system.users[self.bank_system.current_user]
-        if current_pin != user_data['pin']:
-            messagebox.showerror("Error", "Current PIN is incorrect!")
-            return
-        
-        # Check if new PIN is valid
-        if not new_pin.isdigit() or len(new_pin) != 4:
-            messagebox.showerror("Error", "PIN must be a 4-digit number!")
-            return
-        
-        # Check if PINs match
-        if new_pin != confirm_pin:
-            messagebox.showerror("Error", "New PINs do not match!")
-            return
-        
-        # Update PIN
-        user_data['pin'] = new_pin
-        
-        # Show success message and close window
-        messagebox.showinfo("Success", "PIN changed successfully!")
-        window.destroy()
+        # Check the current PIN and store the new one on a worker thread
+        self.bank_system.credential_pool.submit(
+            self.bank_system.ledger.change_pin,
+            (self.bank_system.current_user, current_pin, new_pin, confirm_pin),
+            lambda result: self._finish('change_pin', "PIN changed successfully!"), self._show_error)
+    
+    def _finish(self, dialog, message):
+        """Show success message and close window"""
+        messagebox.showinfo("Success", message)
+        self.bank_system.dialogs.hide(dialog)
+    
+    def _show_error(self, error):
+        """Show a rejected change"""
+        if not isinstance(error, LedgerError):
+            raise error
+        messagebox.showerror("Error", str(error))
     
     def show_security_settings(self):
         """Show security settings window"""
@@ -79,57 +72,59 @@ class SecurityManagement:
             messagebox.showerror("Error", "Please login first!")
             return
         
-        # Create security settings window
-        settings_window = Toplevel(self.bank_system.root)
-        settings_window.title("Security Settings")
-        settings_window.geometry("400x300")
-        
+        # Show the security settings window, built on first use
+        self.bank_system.dialogs.show('security_settings', "Security Settings", "400x300",
+                                      self._build_security_settings, self._reset_security_settings)
+    
+    def _build_security_settings(self, settings_window):
+        """Create the widgets of the security settings window"""
         # Create frame
         frame = Frame(settings_window)
         frame.pack(padx=20, pady=20)
         
+        user_data = self.bank_system.users[self.bank_system.current_user]
+        
         # Security question
         Label(frame, text="Security Question:").grid(row=0, column=0, padx=5, pady=5)
-        question_var = StringVar(value=self.bank_system.users[self.bank_system.current_user]['security_question'])
+        question_var = StringVar(frame, value=user_data['security_question'])
         question_menu = OptionMenu(frame, question_var, *self.bank_system.security_questions)
         question_menu.grid(row=0, column=1, padx=5, pady=5)
         
-        # Security answer
-        Label(frame, text="Security Answer:").grid(row=1, column=0, padx=5, pady=5)
+        # Security answer; only its hash is stored, so a new one is entered
+        Label(frame, text="New Security Answer:").grid(row=1, column=0, padx=5, pady=5)
         answer_entry = Entry(frame)
-        answer_entry.insert(0, self.bank_system.users[self.bank_system.current_user]['security_answer'])
         answer_entry.grid(row=1, column=1, padx=5, pady=5)
         
         # Save button
         Button(frame, text="Save Settings", command=lambda: self._save_security_settings(
             question_var.get(),
-            answer_entry.get(),
-            settings_window
+            answer_entry.get()
         )).grid(row=2, column=0, columnspan=2, pady=10)
+        return {'question': question_var, 'answer': answer_entry}
     
-    def _save_security_settings(self, question, answer, window):
-        """Save security settings"""
-        # Validate inputs
-        if not question or not answer:
-            messagebox.showerror("Error", "All fields are required!")
-            return
-        
-        # Update security settings
+    def _reset_security_settings(self, widgets):
+        """Show the current user's question and clear the answer"""
         user_data = self.bank_system.users[self.bank_system.current_user]
-        user_data['security_question'] = question
-        user_data['security_answer'] = answer
-        
-        # Show success message and close window
-        messagebox.showinfo("Success", "Security settings updated successfully!")
-        window.destroy()
+        widgets['question'].set(user_data['security_question'])
+        clear_entries(widgets)
+    
+    def _save_security_settings(self, question, answer):
+        """Save security settings"""
+        # Hash the new answer on a worker thread
+        self.bank_system.credential_pool.submit(
+            self.bank_system.ledger.set_security_question,
+            (self.bank_system.current_user, question, answer),
+            lambda result: self._finish('security_settings', "Security settings updated successfully!"), self._show_error)
     
     def forgot_pin(self):
         """Handle forgot PIN"""
-        # Create forgot PIN window
-        forgot_window = Toplevel(self.bank_system.root)
-        forgot_window.title("Forgot PIN")
-        forgot_window.geometry("400x200")
-        
+        # Show the forgot PIN window, built on first use
+        widgets = self.bank_system.dialogs.show('forgot_pin', "Forgot PIN", "400x200", self._build_forgot_pin,
+                                                self._reset_forgot_pin)
+        widgets['username'].focus_set()
+    
+    def _build_forgot_pin(self, forgot_window):
+        """Create the widgets of the forgot PIN window"""
         # Create frame
         frame = Frame(forgot_window)
         frame.pack(padx=20, pady=20)
@@ -154,55 +149,42 @@ class SecurityManagement:
         new_pin_entry.grid(row=3, column=1, padx=5, pady=5)
         
         # Function to update security question when username is entered
-        def update_security_question(*args):
-            username = username_entry.get().strip()
+        def update_security_question(text):
+            username = text.strip()
             if username in self.bank_system.users:
                 user_data = self.bank_system.users[username]
                 question_label.config(text=f"Security Question: {user_data['security_question']}")
             else:
                 question_label.config(text="Security Question: User not found")
         
-        # Bind username entry to update function
-        username_entry.bind('<KeyRelease>', update_security_question)
+        # Suggest usernames and look up the question once typing pauses
+        username_autocomplete = Autocomplete(username_entry, self.bank_system.name_index.search,
+                                             on_change=update_security_question)
         
         # Reset PIN button
         Button(frame, text="Reset PIN", command=lambda: self._process_forgot_pin(
             username_entry.get(),
             answer_entry.get(),
-            new_pin_entry.get(),
-            forgot_window
+            new_pin_entry.get()
         )).grid(row=4, column=0, columnspan=2, pady=10)
+        return {'username': username_entry, 'answer': answer_entry, 'new_pin': new_pin_entry,
+                'question': question_label, 'autocomplete': username_autocomplete}
     
-    def _process_forgot_pin(self, username, answer, new_pin, window):
+    def _reset_forgot_pin(self, widgets):
+        """Clear the forgot PIN window and its suggestions for the next use"""
+        clear_entries(widgets)
+        widgets['question'].config(text="Security Question:")
+        widgets['autocomplete'].hide()
+    
+    def _process_forgot_pin(self, username, answer, new_pin):
         """Process forgot PIN"""
-        # Validate inputs
-        if not username or not answer or not new_pin:
-            messagebox.showerror("Error", "All fields are required!")
-            return
-        
-        # Check if user exists
-        if username not in self.bank_system.users:
-            messagebox.showerror("Error", "User not found!")
-            return
-        
-        # Check if security answer is correct
-        user_data = self.bank_system.users[username]
-        if answer.lower() != user_data['security_answer'].lower():
-            messagebox.showerror("Error", "Incorrect security answer!")
-            return
-        
-        # Check if new PIN is valid
-        if not new_pin.isdigit() or len(new_pin) != 4:
-            messagebox.showerror("Error", "PIN must be a 4-digit number!")
-            return
-        
-        # Update PIN
-        user_data['pin'] = new_pin
-        
+        # Check the security answer and store the new PIN on a worker thread
+        self.bank_system.credential_pool.submit(
+            self.bank_system.ledger.reset_pin, (username.strip(), answer, new_pin),
+            lambda result: self._finish_forgot_pin(username.strip()), self._show_error)
+    
+    def _finish_forgot_pin(self, username):
+        """Unlock an account whose PIN was reset"""
         # Reset login attempts
-        if username in self.bank_system.login_attempts:
-            self.bank_system.login_attempts[username] = 0
-        
-        # Show success message and close window
-        messagebox.showinfo("Success", "PIN reset successfully!")
-        window.destroy() 
\ No newline at end of file
+        self.bank_system.login_throttle.reset(username)
+        self._finish('forgot_pin', "PIN reset successfully!") 
\ No newline at end of file
@@ -0,0 +1,541 @@
+"""Ledger partitioned across worker processes
+
+Accounts are assigned to a shard by a hash of their account number and each
+shard is a separate process with its own Ledger and store, so postings to
+different shards run on different cores. Transfers between two accounts of
+one shard commit inside that shard; transfers across shards use a two-phase
+commit coordinated by this process:
+
+1. The sender's shard reserves the amount, checking the minimum balance of
+   the account type against the balance less earlier reservations, and the
+   recipient's shard checks that the account exists. Both votes are logged
+   by the shards.
+2. If both shards voted yes, the decision is logged by the coordinator and
+   both sides are posted; otherwise the reservations are released.
+
+Transfers still prepared when the ledger is reopened are committed if the
+coordinator logged a commit decision for them and aborted otherwise.
+
+Split the accounts of the application's data directory into shards with:
+
+    python sharded_ledger.py bank_data sharded_data --shards 4
+"""
+import argparse
+import multiprocessing
+import os
+import threading
+import uuid
+import zlib
+from contextlib import contextmanager
+
+from account_numbers import AccountNumberAllocator
+from credentials import DEFAULT_HASHER
+from ledger import (Ledger, LedgerError, AccountExistsError, AccountNotFoundError, InsufficientFundsError,
+                    SelfTransferError, DEFAULT_ACCOUNT_TYPES, new_account_data, verify_pin)
+from storage import MemoryAccountStore, open_store
+from transaction_log import TransactionLog
+
+
+def shard_of(account_number, num_shards):
+    """Return the shard holding an account number"""
+    return zlib.crc32(account_number.encode()) % num_shards
+
+
+class ShardWorker:
+    """Runs the commands sent to one shard process
+
+    Each command list from the coordinator is written to the shard's log as
+    one batch before the replies go back. Reservations of prepared
+    cross-shard transfers are kept in the store metadata, so a vote is never
+    forgotten once it has been sent.
+    """
+
+    PENDING_KEY = 'pending_transfers'
+
+    def __init__(self, store, account_types, hasher=DEFAULT_HASHER):
+        self.store = store
+        self.ledger = Ledger(store, account_types, hasher)
+        self.pending = dict(store.get_meta(self.PENDING_KEY, {}))
+        self.reserved = {}
+        self._pending_changed = False
+        for _, name, amount, _ in self.pending.values():
+            if amount < 0:
+                self.reserved[name] = self.reserved.get(name, 0) - amount
+
+    def run_all(self, commands):
+        """Run a list of (command, args) and return the replies"""
+        with self.store.batch():
+            replies = [self.run(command, args) for command, args in commands]
+            if self._pending_changed:
+                self.store.set_meta(self.PENDING_KEY, self.pending)
+                self._pending_changed = False
+        return replies
+
+    def run(self, command, args):
+        """Run one command and return ('ok', result) or ('error', message)
+
+        Any exception is sent back as an error, so one bad command never
+        ends the shard process.
+        """
+        try:
+            return 'ok', getattr(self, 'do_' + command)(*args)
+        except LedgerError as e:
+            return 'error', str(e)
+        except Exception as e:
+            return 'error', f"{type(e).__name__}: {e}"
+
+    def do_open_account(self, name, user_data, account_number):
+        return self._public(self.ledger.open_account(name, user_data, account_number))
+
+    def do_update_account(self, name, fields):
+        self.ledger.get_account(name)
+        self.store.update_account(name, fields)
+
+    def do_restore(self, name, user_data, transactions):
+        user_data = dict(user_data)
+        if transactions is not None:
+            user_data['transactions'] = TransactionLog.from_json(transactions)
+        self.store.add_account(name, user_data)
+
+    def do_get_account(self, name):
+        return self._public(self.ledger.get_account(name))
+
+    def do_count_transactions(self, name, after):
+        self.ledger.get_account(name)
+        return self.ledger.count_transactions(name, after)
+
+    def do_list_transactions(self, name, offset, limit):
+        self.ledger.get_account(name)
+        return list(self.ledger.list_transactions(name, offset, limit))
+
+    def do_accounts(self):
+        return [(name, user_data['account_number']) for name, user_data in self.store.items()]
+
+    def do_pending(self):
+        return list(self.pending)
+
+    def do_deposit(self, name, amount):
+        return self.ledger.deposit(name, amount)
+
+    def do_withdraw(self, name, amount):
+        self._check_available(name, self.ledger.parse_amount(amount))
+        return self.ledger.withdraw(name, amount)
+
+    def do_transfer(self, sender, recipient, amount):
+        self._check_available(sender, self.ledger.parse_amount(amount))
+        return self.ledger.transfer(sender, recipient, amount)
+
+    def do_prepare_debit(self, txid, sender, recipient, amount):
+        amount = self.ledger.parse_amount(amount)
+        self._check_available(sender, amount)
+        self.reserved[sender] = self.reserved.get(sender, 0) + amount
+        self._set_pending(txid, ("Transfer to " + recipient, sender, -amount, recipient))
+
+    def do_prepare_credit(self, txid, recipient, sender, amount):
+        self.ledger.get_account(recipient, "Recipient not found!")
+        self._set_pending(txid, ("Transfer from " + sender, recipient, self.ledger.parse_amount(amount), sender))
+
+    def do_commit(self, txid):
+        transaction_type, name, amount, _ = self.pending[txid]
+        transaction = self.ledger.log_transaction(name, transaction_type, amount)
+        self._release(txid)
+        return transaction
+
+    def do_abort(self, txid):
+        if txid in self.pending:
+            self._release(txid)
+
+    def _check_available(self, name, amount):
+        """Enforce the minimum balance net of reserved transfer amounts"""
+        user_data = self.ledger.get_account(name)
+        min_balance = self.ledger.min_balance(user_data)
+        if user_data['balance'] - self.reserved.get(name, 0) - amount < min_balance:
+            raise InsufficientFundsError(min_balance)
+
+    def _set_pending(self, txid, entry):
+        self.pending[txid] = entry
+        self._pending_changed = True
+
+    def _release(self, txid):
+        _, name, amount, _ = self.pending.pop(txid)
+        if amount < 0:
+            self.reserved[name] += amount
+            if abs(self.reserved[name]) < 1e-9:
+                del self.reserved[name]
+        self._pending_changed = True
+
+    def _public(self, user_data):
+        """Return account data without the transaction log"""
+        return {key: value for key, value in user_data.items() if key != 'transactions'}
+
+
+def _shard_main(connection, data_dir, account_types, fsync, hasher):
+    """Serve command lists from the coordinator until told to stop"""
+    store = MemoryAccountStore(data_dir, fsync=fsync)
+    worker = ShardWorker(store, account_types, hasher)
+    try:
+        while True:
+            commands = connection.recv()
+            if commands is None:
+                break
+            connection.send(worker.run_all(commands))
+    finally:
+        store.close()
+        connection.close()
+
+
+class ShardedLedger:
+    """Coordinator of a ledger split over ``num_shards`` processes
+
+    Offers the account and posting operations of Ledger that BankServer
+    uses, so it can serve teller terminals. Each shard's pipe has a lock:
+    single operations hold only the lock of their shard, so operations of
+    different shards run at the same time, and a cross-shard transfer holds
+    the locks of both its shards, taken in shard order. ``run_batch`` holds
+    every shard and sends the operations of many tellers to all of them at
+    once. PINs are hashed and checked in this process outside the shard
+    locks.
+    """
+
+    COORDINATOR_DIR = 'coordinator'
+    DECISIONS_KEY = 'commit_decisions'
+    SHARDS_KEY = 'num_shards'
+
+    def __init__(self, num_shards=None, data_dir=None, account_types=DEFAULT_ACCOUNT_TYPES, fsync=True,
+                 hasher=DEFAULT_HASHER):
+        self.account_types = account_types
+        self.hasher = hasher
+
+        # Coordinator state: account number sequence and commit decisions.
+        # Without num_shards an existing ledger keeps its own count and a new
+        # one gets a shard per core
+        self.store = MemoryAccountStore(data_dir and os.path.join(data_dir, self.COORDINATOR_DIR), fsync=fsync)
+        num_shards = num_shards or self.store.get_meta(self.SHARDS_KEY) or os.cpu_count() or 1
+        if self.store.get_meta(self.SHARDS_KEY, num_shards) != num_shards:
+            self.store.close()
+            raise ValueError(f"Ledger in {data_dir} is split into {self.store.get_meta(self.SHARDS_KEY)} shards")
+        self.store.set_meta(self.SHARDS_KEY, num_shards)
+        self.num_shards = num_shards
+        self.account_numbers = AccountNumberAllocator(self.store)
+
+        # Guards the account directory while accounts are added; shard pipes
+        # have their own locks, and commit decisions one of their own
+        self._lock = threading.Lock()
+        self._shard_locks = [threading.Lock() for _ in range(num_shards)]
+        self._decisions = set()
+        self._decisions_lock = threading.Lock()
+
+        # Start one process per shard
+        context = multiprocessing.get_context('spawn')
+        self._connections = []
+        self._processes = []
+        for shard in range(num_shards):
+            parent, child = context.Pipe()
+            shard_dir = data_dir and os.path.join(data_dir, f"shard-{shard}")
+            process = context.Process(target=_shard_main, args=(child, shard_dir, account_types, fsync, hasher),
+                                      daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+        # Directory of usernames and account numbers to shards
+        self._shard_by_name = {}
+        self._name_by_number = {}
+        for shard, accounts in enumerate(self._broadcast('accounts')):
+            for name, account_number in accounts:
+                self._shard_by_name[name] = shard
+                self._name_by_number[account_number] = name
+
+        self._recover()
+
+    def __len__(self):
+        return len(self._shard_by_name)
+
+    def __contains__(self, name):
+        return name in self._shard_by_name
+
+    def shard_of(self, name):
+        """Return the shard holding an account"""
+        shard = self._shard_by_name.get(name)
+        if shard is None:
+            raise AccountNotFoundError(name)
+        return shard
+
+    def resolve_account(self, identifier, message="User not found!"):
+        """Return the username for a username or an account number"""
+        identifier = identifier.strip()
+        if identifier in self._shard_by_name:
+            return identifier
+        name = self._name_by_number.get(identifier)
+        if name is None:
+            raise AccountNotFoundError(identifier, message)
+        return name
+
+    def create_account(self, name, age, salary, pin, account_type, security_question, security_answer):
+        """Open an account on the shard of its new account number"""
+        # Hash before taking the lock, as it is the slow part
+        user_data = new_account_data(self.account_types, self.hasher, name, age, salary, pin, account_type,
+                                     security_question, security_answer)
+        with self._lock:
+            if name in self._shard_by_name:
+                raise AccountExistsError(name)
+            account_number = self.account_numbers.allocate()
+            while account_number in self._name_by_number:
+                account_number = self.account_numbers.allocate()
+
+            shard = shard_of(account_number, self.num_shards)
+            with self._shard_locks[shard]:
+                user_data = self._call(shard, 'open_account', name, user_data, account_number)
+            self._shard_by_name[name] = shard
+            self._name_by_number[account_number] = name
+            return user_data
+
+    def partition(self, store):
+        """Copy the accounts of an unsharded store onto the shards"""
+        with self._lock, self._holding(range(self.num_shards)):
+            commands = [[] for _ in range(self.num_shards)]
+            for name, user_data in store.items():
+                if name in self._shard_by_name:
+                    raise AccountExistsError(name)
+                shard = shard_of(user_data['account_number'], self.num_shards)
+                transactions = user_data.get('transactions')
+                fields = {key: value for key, value in user_data.items() if key != 'transactions'}
+                commands[shard].append(('restore', (name, fields, transactions and transactions.to_json())))
+                self._shard_by_name[name] = shard
+                self._name_by_number[user_data['account_number']] = name
+            self._exchange(commands)
+
+            # Continue the account number sequence of the source store
+            key = AccountNumberAllocator.META_KEY
+            self.store.set_meta(key, max(self.store.get_meta(key, 0), store.get_meta(key, 0)))
+
+    def get_account(self, name):
+        """Return the data of an account, without its transaction log"""
+        return self._single(name, 'get_account', name)
+
+    def authenticate(self, name, pin, throttle):
+        """Check the PIN of an account and return its data, as Ledger.authenticate does"""
+        user_data = self.get_account(name)
+        verify_pin(self.hasher, throttle, name, pin, user_data['pin'])
+
+        # Store a fresh hash of a PIN kept in plain text or at an old cost
+        if self.hasher.needs_rehash(user_data['pin']):
+            self._single(name, 'update_account', name, {'pin': self.hasher.hash(pin)})
+        return user_data
+
+    def count_transactions(self, name, after=None):
+        """Return the number of transactions, or those made after a timestamp"""
+        return self._single(name, 'count_transactions', name, after)
+
+    def list_transactions(self, name, offset=0, limit=100):
+        """Return a page of transactions, newest first"""
+        return self._single(name, 'list_transactions', name, offset, limit)
+
+    def deposit(self, name, amount):
+        return self._single(name, 'deposit', name, amount)
+
+    def withdraw(self, name, amount):
+        return self._single(name, 'withdraw', name, amount)
+
+    def transfer(self, sender, recipient, amount):
+        """Transfer between accounts and return the sender's transaction
+
+        A transfer within one shard holds only that shard; one across shards
+        holds both for its two-phase commit.
+        """
+        sender_shard = self.shard_of(sender)
+        recipient = self.resolve_account(recipient, "Recipient not found!")
+        if recipient == sender:
+            raise SelfTransferError()
+        recipient_shard = self._shard_by_name[recipient]
+        if recipient_shard == sender_shard:
+            return self._single(sender, 'transfer', sender, recipient, amount)
+
+        with self._holding((sender_shard, recipient_shard)):
+            for _, result in self._two_phase_transfers([(0, sender, recipient, amount)]):
+                if isinstance(result, LedgerError):
+                    raise result
+                return result
+
+    def run_batch(self, operations):
+        """Run ('deposit'|'withdraw', name, amount) and ('transfer', sender,
+        recipient, amount) operations and return a result for each
+
+        A result is the logged transaction or the LedgerError that rejected
+        the operation. Operations on one shard run in the order given;
+        cross-shard transfers run after the operations local to a shard.
+        """
+        with self._holding(range(self.num_shards)):
+            results = [None] * len(operations)
+            local = [[] for _ in range(self.num_shards)]
+            local_positions = [[] for _ in range(self.num_shards)]
+            remote = []
+
+            # Route every operation to its shard
+            for position, operation in enumerate(operations):
+                try:
+                    shard = self.shard_of(operation[1])
+                    if operation[0] == 'transfer':
+                        recipient = self.resolve_account(operation[2], "Recipient not found!")
+                        if recipient == operation[1]:
+                            raise SelfTransferError()
+                        if self._shard_by_name[recipient] != shard:
+                            remote.append((position, operation[1], recipient, operation[3]))
+                            continue
+                        operation = ('transfer', operation[1], recipient, operation[3])
+                except LedgerError as e:
+                    results[position] = e
+                    continue
+                local[shard].append((operation[0], operation[1:]))
+                local_positions[shard].append(position)
+
+            # Same-shard operations commit inside their shard
+            for shard, replies in enumerate(self._exchange(local)):
+                for position, reply in zip(local_positions[shard], replies):
+                    results[position] = self._result(reply)
+
+            if remote:
+                for position, result in self._two_phase_transfers(remote):
+                    results[position] = result
+            return results
+
+    def close(self):
+        """Stop the shard processes and flush the coordinator"""
+        with self._lock, self._holding(range(self.num_shards)):
+            for connection in self._connections:
+                connection.send(None)
+            for process in self._processes:
+                process.join()
+            for connection in self._connections:
+                connection.close()
+            self.store.close()
+
+    def _two_phase_transfers(self, transfers):
+        """Run cross-shard transfers and yield (position, result)"""
+        prepares = [[] for _ in range(self.num_shards)]
+        prepared = []
+        for position, sender, recipient, amount in transfers:
+            txid = uuid.uuid4().hex
+            sender_shard = self._shard_by_name[sender]
+            recipient_shard = self._shard_by_name[recipient]
+            prepares[sender_shard].append(('prepare_debit', (txid, sender, recipient, amount)))
+            prepares[recipient_shard].append(('prepare_credit', (txid, recipient, sender, amount)))
+            prepared.append((position, txid, sender_shard, recipient_shard))
+
+        # Phase one: collect the votes of both shards of every transfer
+        votes = [iter(replies) for replies in self._exchange(prepares)]
+        decisions = []
+        for position, txid, sender_shard, recipient_shard in prepared:
+            debit = next(votes[sender_shard])
+            credit = next(votes[recipient_shard])
+            decisions.append((position, txid, sender_shard, recipient_shard, debit, credit))
+
+        # Log the commit decisions before any shard is told to commit
+        committed = [txid for _, txid, _, _, debit, credit in decisions if debit[0] == credit[0] == 'ok']
+        if committed:
+            self._log_decisions(committed, [])
+
+        # Phase two: commit or release both sides
+        finishes = [[] for _ in range(self.num_shards)]
+        for _, txid, sender_shard, recipient_shard, debit, credit in decisions:
+            command = 'commit' if debit[0] == credit[0] == 'ok' else 'abort'
+            finishes[sender_shard].append((command, (txid,)))
+            finishes[recipient_shard].append((command, (txid,)))
+        replies = [iter(shard_replies) for shard_replies in self._exchange(finishes)]
+        if committed:
+            self._log_decisions([], committed)
+
+        for position, txid, sender_shard, recipient_shard, debit, credit in decisions:
+            sender_reply = next(replies[sender_shard])
+            next(replies[recipient_shard])
+            if debit[0] != 'ok':
+                yield position, self._result(debit)
+            elif credit[0] != 'ok':
+                yield position, self._result(credit)
+            else:
+                yield position, self._result(sender_reply)
+
+    def _recover(self):
+        """Finish transfers left prepared by an interrupted coordinator"""
+        committed = set(self.store.get_meta(self.DECISIONS_KEY, []))
+        finishes = [[('commit' if txid in committed else 'abort', (txid,)) for txid in pending]
+                    for pending in self._broadcast('pending')]
+        self._exchange(finishes)
+        if committed:
+            self.store.set_meta(self.DECISIONS_KEY, [])
+
+    def _log_decisions(self, added, finished):
+        """Update the logged commit decisions of the transfers in flight"""
+        with self._decisions_lock:
+            self._decisions.update(added)
+            self._decisions.difference_update(finished)
+            self.store.set_meta(self.DECISIONS_KEY, sorted(self._decisions))
+
+    @contextmanager
+    def _holding(self, shards):
+        """Hold the pipe locks of the given shards, taken in shard order"""
+        locks = [self._shard_locks[shard] for shard in sorted(set(shards))]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def _single(self, name, command, *args):
+        """Run one command on the shard of an account, holding only that shard"""
+        shard = self.shard_of(name)
+        with self._shard_locks[shard]:
+            return self._call(shard, command, *args)
+
+    def _call(self, shard, command, *args):
+        """Run one command on a shard, whose lock is held, and return its result"""
+        self._connections[shard].send([(command, args)])
+        reply = self._connections[shard].recv()[0]
+        result = self._result(reply)
+        if isinstance(result, LedgerError):
+            raise result
+        return result
+
+    def _broadcast(self, command, *args):
+        """Run one command on every shard and return the results"""
+        return [self._result(replies[0]) for replies in self._exchange([[(command, args)]] * self.num_shards)]
+
+    def _exchange(self, commands):
+        """Send a command list to every shard with work, then collect replies"""
+        for connection, shard_commands in zip(self._connections, commands):
+            if shard_commands:
+                connection.send(shard_commands)
+        return [connection.recv() if shard_commands else []
+                for connection, shard_commands in zip(self._connections, commands)]
+
+    def _result(self, reply):
+        """Turn a shard reply into a result or a LedgerError"""
+        status, value = reply
+        return value if status == 'ok' else LedgerError(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the accounts of a data directory into shards")
+    parser.add_argument('source', help="data directory of the application")
+    parser.add_argument('target', help="directory for the sharded ledger")
+    parser.add_argument('--shards', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--backend', default=os.environ.get('BANK_STORAGE', 'memory'))
+    args = parser.parse_args()
+
+    store = open_store(args.source, args.backend)
+    try:
+        ledger = ShardedLedger(args.shards, args.target)
+        try:
+            ledger.partition(store)
+        finally:
+            ledger.close()
+    finally:
+        store.close()
+    print(f"Split {len(store)} accounts into {args.shards} shards in {args.target}")
+
+
+if __name__ == '__main__':
+    main()
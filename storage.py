@@ -0,0 +1,657 @@
+import json
+import os
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from contextlib import contextmanager
+
+from persistence import LedgerPersistence
+from transaction_log import TransactionLog
+
+# Fields accounts are looked up by besides the username
+IDENTITY_FIELDS = frozenset(('name', 'account_number'))
+
+
+class AccountStore:
+    """Interface shared by the account storage backends
+
+    Accounts are keyed by username and read with ``store[username]``,
+    ``username in store``, ``store.get(username)`` and ``store.items()``.
+    All changes go through the mutation methods so every backend can make
+    them durable.
+
+    Every change bumps ``version`` and is remembered in a bounded change
+    feed, so views can refresh only the accounts that changed. Accounts
+    added, deleted or given a new name or account number also bump
+    ``identity_version`` and go into a second feed, so lookup indexes are
+    not pushed off the end of the first by balance updates.
+    """
+
+    CHANGE_FEED_SIZE = 10000
+
+    def __init__(self):
+        self.version = 0
+        self.identity_version = 0
+        self._changes = deque(maxlen=self.CHANGE_FEED_SIZE)
+        self._identity_changes = deque(maxlen=self.CHANGE_FEED_SIZE)
+        self._changes_lock = threading.Lock()
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def __getitem__(self, name):
+        user_data = self.get(name)
+        if user_data is None:
+            raise KeyError(name)
+        return user_data
+
+    def __iter__(self):
+        for name, _ in self.items():
+            yield name
+
+    def items(self):
+        """Iterate over all (username, user_data) pairs in username order"""
+        after = None
+        while True:
+            page = self.list_accounts(after=after, limit=1000)
+            if not page:
+                return
+            yield from page
+            after = page[-1][0]
+
+    def get(self, name, default=None):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def list_accounts(self, after=None, limit=100, offset=0):
+        """Return up to ``limit`` (username, user_data) pairs in username order
+
+        Pages start after the username ``after`` when it is given, otherwise
+        at position ``offset``.
+        """
+        raise NotImplementedError
+
+    def account_index(self, name):
+        """Return the position of a username in username order"""
+        raise NotImplementedError
+
+    def changes_since(self, version):
+        """Return (usernames, structural) changed after a version
+
+        ``structural`` is true when accounts were added or deleted. None is
+        returned when the change feed no longer reaches back to the version.
+        """
+        # Read under the lock, as writers append from other threads
+        with self._changes_lock:
+            changes = self._feed_since(self._changes, self.version, version)
+        if changes is None:
+            return None
+        names = set()
+        structural = False
+        for _, name, added_or_deleted in changes:
+            names.add(name)
+            structural = structural or added_or_deleted
+        return names, structural
+
+    def identity_changes_since(self, identity_version):
+        """Return the usernames added, deleted or renamed after an identity version
+
+        Renamed accounts are those given a new holder name or account
+        number. None is returned as by changes_since.
+        """
+        with self._changes_lock:
+            changes = self._feed_since(self._identity_changes, self.identity_version, identity_version)
+        return None if changes is None else {name for _, name in changes}
+
+    @staticmethod
+    def _feed_since(feed, current, version):
+        """Return the entries of a feed after a version, or None if it no longer reaches back"""
+        # Versions are consecutive, so the entries wanted are the last ones
+        count = current - version
+        if count < 0 or count > len(feed):
+            return None
+        return [feed[-index] for index in range(1, count + 1)]
+
+    def _changed(self, name, structural=False, renamed=False):
+        """Record a change of an account in the change feeds"""
+        with self._changes_lock:
+            self.version += 1
+            self._changes.append((self.version, name, structural))
+            if structural or renamed:
+                self.identity_version += 1
+                self._identity_changes.append((self.identity_version, name))
+
+    def find_by_account_number(self, account_number):
+        """Return the username owning an account number, or None"""
+        raise NotImplementedError
+
+    def get_meta(self, key, default=None):
+        """Return a store-wide metadata value"""
+        raise NotImplementedError
+
+    def set_meta(self, key, value):
+        raise NotImplementedError
+
+    def get_transactions(self, name):
+        """Return the transaction log of an account"""
+        raise NotImplementedError
+
+    def count_transactions(self, name, after=None):
+        """Return the number of transactions, or those made after a timestamp"""
+        raise NotImplementedError
+
+    def list_transactions(self, name, offset=0, limit=100):
+        """Return (timestamp, type, amount, balance) entries, newest first"""
+        raise NotImplementedError
+
+    def add_account(self, name, user_data):
+        raise NotImplementedError
+
+    def add_accounts(self, accounts):
+        """Add (username, user_data) pairs as one batch"""
+        with self.batch():
+            for name, user_data in accounts:
+                self.add_account(name, user_data)
+
+    def update_account(self, name, fields):
+        raise NotImplementedError
+
+    def delete_account(self, name):
+        raise NotImplementedError
+
+    def append_transaction(self, name, transaction):
+        """Append a transaction and set the balance it carries"""
+        raise NotImplementedError
+
+    @contextmanager
+    def batch(self):
+        """Apply all changes made inside the block atomically"""
+        yield
+
+    def close(self):
+        pass
+
+
+class MemoryAccountStore(AccountStore):
+    """Accounts held in a dictionary and made durable by the ledger log
+
+    Changes from several threads are serialized by a store lock; keeping
+    each account's balance consistent across a read and a write is up to the
+    caller (see ledger.Ledger).
+    """
+
+    def __init__(self, data_dir, snapshot_interval=10000, fsync=True):
+        super().__init__()
+        self.persistence = LedgerPersistence(data_dir, snapshot_interval, fsync)
+        self._users = self.persistence.load()
+
+        # Changes are applied and logged under the persistence lock so a
+        # snapshot never sees a change before its log record
+        self._lock = self.persistence.lock
+
+        # Index of account numbers for constant time lookups
+        self._by_number = {user_data['account_number']: name for name, user_data in self._users.items()}
+
+        # Usernames in sorted order for paging
+        self._sorted_names = sorted(self._users)
+
+    def __contains__(self, name):
+        return name in self._users
+
+    def __len__(self):
+        return len(self._users)
+
+    def __iter__(self):
+        return iter(self._users)
+
+    def items(self):
+        return self._users.items()
+
+    def get(self, name, default=None):
+        return self._users.get(name, default)
+
+    def list_accounts(self, after=None, limit=100, offset=0):
+        start = offset if after is None else bisect_right(self._sorted_names, after)
+        return [(name, self._users[name]) for name in self._sorted_names[start:start + limit]]
+
+    def account_index(self, name):
+        return bisect_left(self._sorted_names, name)
+
+    def find_by_account_number(self, account_number):
+        return self._by_number.get(account_number)
+
+    def get_meta(self, key, default=None):
+        return self.persistence.meta.get(key, default)
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self.persistence.meta[key] = value
+            self.persistence.record_meta(key, value)
+
+    def get_transactions(self, name):
+        return self._users[name].get('transactions') or TransactionLog()
+
+    def count_transactions(self, name, after=None):
+        log = self.get_transactions(name)
+        return len(log) if after is None else log.count_after(after)
+
+    def list_transactions(self, name, offset=0, limit=100):
+        return self.get_transactions(name).newest_first(offset, limit)
+
+    def add_account(self, name, user_data):
+        with self._lock:
+            self._users[name] = user_data
+            self._by_number[user_data['account_number']] = name
+            insort(self._sorted_names, name)
+            self.persistence.record_account(name, user_data)
+            self._changed(name, structural=True)
+
+    def add_accounts(self, accounts):
+        # New names are merged into the sorted order with one sort rather
+        # than inserted one at a time
+        with self._lock, self.persistence.batch():
+            new_names = []
+            for name, user_data in accounts:
+                if name not in self._users:
+                    new_names.append(name)
+                self._users[name] = user_data
+                self._by_number[user_data['account_number']] = name
+                self.persistence.record_account(name, user_data)
+                self._changed(name, structural=True)
+            self._sorted_names.extend(new_names)
+            self._sorted_names.sort()
+
+    def update_account(self, name, fields):
+        with self._lock:
+            user_data = self._users[name]
+            if 'account_number' in fields:
+                self._by_number.pop(user_data['account_number'], None)
+                self._by_number[fields['account_number']] = name
+            user_data.update(fields)
+            self.persistence.record_update(name, fields)
+            self._changed(name, renamed=not IDENTITY_FIELDS.isdisjoint(fields))
+
+    def delete_account(self, name):
+        with self._lock:
+            user_data = self._users.pop(name)
+            self._by_number.pop(user_data['account_number'], None)
+            del self._sorted_names[bisect_left(self._sorted_names, name)]
+            self.persistence.record_delete(name)
+            self._changed(name, structural=True)
+
+    def append_transaction(self, name, transaction):
+        with self._lock:
+            user_data = self._users[name]
+            transactions = user_data.get('transactions')
+            if transactions is None:
+                transactions = user_data['transactions'] = TransactionLog()
+            transactions.append_record(transaction)
+            user_data['balance'] = transaction['balance']
+            self.persistence.record_transaction(name, transaction)
+            self._changed(name)
+
+    def batch(self):
+        return self.persistence.batch()
+
+    def close(self):
+        self.persistence.close()
+
+
+class SQLiteAccountStore(AccountStore):
+    """Accounts held in an SQLite database in WAL mode
+
+    Only the rows that are asked for are loaded, so the number of accounts is
+    bounded by disk rather than memory. Lookups by username, name, account
+    number and account type go through B-tree indexes.
+
+    Each thread gets its own connection; WAL mode lets readers run alongside
+    the single writer, and writers wait for each other up to ``timeout``.
+    """
+
+    ACCOUNT_FIELDS = ('name', 'age', 'salary', 'pin', 'account_number', 'balance',
+                      'account_type', 'security_question', 'security_answer')
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS accounts (
+            username TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            age INTEGER,
+            salary REAL,
+            pin TEXT,
+            account_number TEXT NOT NULL,
+            balance REAL NOT NULL DEFAULT 0,
+            account_type TEXT NOT NULL,
+            security_question TEXT,
+            security_answer TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_accounts_name ON accounts(name);
+        CREATE INDEX IF NOT EXISTS idx_accounts_account_number ON accounts(account_number);
+        CREATE INDEX IF NOT EXISTS idx_accounts_account_type ON accounts(account_type);
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            amount REAL NOT NULL,
+            balance REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_transactions_username ON transactions(username, id);
+        CREATE INDEX IF NOT EXISTS idx_transactions_username_timestamp ON transactions(username, timestamp);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value
+        );
+    """
+
+    # Statements are kept constant so sqlite3 reuses the prepared versions
+    SELECT_ACCOUNT = "SELECT username, " + ", ".join(ACCOUNT_FIELDS) + " FROM accounts WHERE username = ?"
+    SELECT_PAGE = "SELECT username, " + ", ".join(ACCOUNT_FIELDS) + " FROM accounts WHERE username > ? ORDER BY username LIMIT ?"
+    SELECT_PAGE_FROM = ("SELECT username, " + ", ".join(ACCOUNT_FIELDS)
+                        + " FROM accounts WHERE username >= ? ORDER BY username LIMIT ? OFFSET ?")
+    SELECT_USERNAMES = "SELECT username FROM accounts ORDER BY username"
+    SELECT_USERNAME_AT = "SELECT username FROM accounts WHERE username >= ? ORDER BY username LIMIT 1 OFFSET ?"
+    COUNT_BETWEEN = "SELECT COUNT(*) FROM accounts WHERE username >= ? AND username < ?"
+    SELECT_BY_NUMBER = "SELECT username FROM accounts WHERE account_number = ?"
+    COUNT_ACCOUNTS = "SELECT COUNT(*) FROM accounts"
+    INSERT_ACCOUNT = ("INSERT INTO accounts (username, " + ", ".join(ACCOUNT_FIELDS) + ") VALUES ("
+                      + ", ".join("?" * (len(ACCOUNT_FIELDS) + 1)) + ")")
+    DELETE_ACCOUNT = "DELETE FROM accounts WHERE username = ?"
+    DELETE_TRANSACTIONS = "DELETE FROM transactions WHERE username = ?"
+    SELECT_TRANSACTIONS = "SELECT timestamp, type, amount, balance FROM transactions WHERE username = ? ORDER BY id"
+    SELECT_TRANSACTION_PAGE = ("SELECT timestamp, type, amount, balance FROM transactions WHERE username = ? "
+                               "ORDER BY id DESC LIMIT ? OFFSET ?")
+    COUNT_TRANSACTIONS = "SELECT COUNT(*) FROM transactions WHERE username = ?"
+    COUNT_TRANSACTIONS_AFTER = "SELECT COUNT(*) FROM transactions WHERE username = ? AND timestamp > ?"
+    INSERT_TRANSACTION = "INSERT INTO transactions (username, timestamp, type, amount, balance) VALUES (?, ?, ?, ?, ?)"
+    UPDATE_BALANCE = "UPDATE accounts SET balance = ? WHERE username = ?"
+    SELECT_META = "SELECT value FROM meta WHERE key = ?"
+    UPSERT_META = "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value"
+
+    def __init__(self, path, timeout=30.0):
+        super().__init__()
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._ranks = None
+        self._ranks_lock = threading.Lock()
+        self.connection.executescript(self.SCHEMA)
+
+    @property
+    def connection(self):
+        """Return the connection of the calling thread"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                         cached_statements=256, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.batch_depth = 0
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def __len__(self):
+        return self.connection.execute(self.COUNT_ACCOUNTS).fetchone()[0]
+
+    def get(self, name, default=None):
+        row = self.connection.execute(self.SELECT_ACCOUNT, (name,)).fetchone()
+        if row is None:
+            return default
+        return self._row_to_user(row)
+
+    def list_accounts(self, after=None, limit=100, offset=0):
+        if after is not None:
+            rows = self.connection.execute(self.SELECT_PAGE, (after, limit))
+        else:
+            # Seek to the anchor before the offset and skip the rest of the
+            # way, rather than have SQLite count through every earlier row
+            anchor, skip = self._account_ranks().locate(offset)
+            if anchor is None:
+                return []
+            rows = self.connection.execute(self.SELECT_PAGE_FROM, (anchor, limit, skip))
+        return [(row[0], self._row_to_user(row)) for row in rows]
+
+    def account_index(self, name):
+        anchor, rank = self._account_ranks().rank_before(name)
+        if anchor is None:
+            return 0
+        return rank + self.connection.execute(self.COUNT_BETWEEN, (anchor, name)).fetchone()[0]
+
+    def find_by_account_number(self, account_number):
+        row = self.connection.execute(self.SELECT_BY_NUMBER, (account_number,)).fetchone()
+        return None if row is None else row[0]
+
+    def get_meta(self, key, default=None):
+        row = self.connection.execute(self.SELECT_META, (key,)).fetchone()
+        if row is None:
+            return default
+        # Values are stored as JSON; numbers written before that are not
+        return json.loads(row[0]) if isinstance(row[0], str) else row[0]
+
+    def set_meta(self, key, value):
+        with self.batch():
+            self.connection.execute(self.UPSERT_META, (key, json.dumps(value)))
+
+    def get_transactions(self, name):
+        log = TransactionLog()
+        for timestamp, transaction_type, amount, balance in self.connection.execute(self.SELECT_TRANSACTIONS, (name,)):
+            log.append(timestamp, transaction_type, amount, balance)
+        return log
+
+    def count_transactions(self, name, after=None):
+        if after is None:
+            return self.connection.execute(self.COUNT_TRANSACTIONS, (name,)).fetchone()[0]
+        return self.connection.execute(self.COUNT_TRANSACTIONS_AFTER, (name, after)).fetchone()[0]
+
+    def list_transactions(self, name, offset=0, limit=100):
+        return self.connection.execute(self.SELECT_TRANSACTION_PAGE, (name, limit, offset)).fetchall()
+
+    def add_account(self, name, user_data):
+        values = [name] + [user_data.get(field) for field in self.ACCOUNT_FIELDS]
+        with self.batch():
+            self.connection.execute(self.INSERT_ACCOUNT, values)
+        self._ranked(name, 1)
+        self._changed(name, structural=True)
+
+    def add_accounts(self, accounts):
+        rows = [[name] + [user_data.get(field) for field in self.ACCOUNT_FIELDS] for name, user_data in accounts]
+        with self.batch():
+            self.connection.executemany(self.INSERT_ACCOUNT, rows)
+        if len(rows) > AccountRanks.STRIDE:
+            # Rebuilt on the next use rather than split chunk by chunk
+            self._ranks = None
+        else:
+            for row in rows:
+                self._ranked(row[0], 1)
+        for row in rows:
+            self._changed(row[0], structural=True)
+
+    def update_account(self, name, fields):
+        # Column names are checked against the schema before being formatted in
+        columns = [field for field in fields if field in self.ACCOUNT_FIELDS]
+        if not columns:
+            return
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        values = [fields[column] for column in columns] + [name]
+        with self.batch():
+            self.connection.execute(f"UPDATE accounts SET {assignments} WHERE username = ?", values)
+        self._changed(name, renamed=not IDENTITY_FIELDS.isdisjoint(columns))
+
+    def delete_account(self, name):
+        with self.batch():
+            self.connection.execute(self.DELETE_ACCOUNT, (name,))
+            self.connection.execute(self.DELETE_TRANSACTIONS, (name,))
+        self._ranked(name, -1)
+        self._changed(name, structural=True)
+
+    def append_transaction(self, name, transaction):
+        with self.batch():
+            self.connection.execute(self.INSERT_TRANSACTION, (
+                name,
+                transaction['timestamp'],
+                transaction['type'],
+                transaction['amount'],
+                transaction['balance']
+            ))
+            self.connection.execute(self.UPDATE_BALANCE, (transaction['balance'], name))
+        self._changed(name)
+
+    @contextmanager
+    def batch(self):
+        connection = self.connection
+        if self._local.batch_depth:
+            # Nested batches are folded into the outer transaction
+            self._local.batch_depth += 1
+            try:
+                yield
+            finally:
+                self._local.batch_depth -= 1
+            return
+
+        # Take the write lock up front so concurrent batches queue instead of
+        # failing to upgrade a read transaction
+        self._local.batch_depth = 1
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            connection.execute("ROLLBACK")
+            # Ranks may count accounts the rollback removed
+            self._ranks = None
+            raise
+        else:
+            connection.execute("COMMIT")
+        finally:
+            self._local.batch_depth = 0
+
+    def close(self):
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
+
+    def _account_ranks(self):
+        """Return the rank index, scanning the usernames if it is not built"""
+        with self._ranks_lock:
+            if self._ranks is None:
+                names = (row[0] for row in self.connection.execute(self.SELECT_USERNAMES))
+                self._ranks = AccountRanks.build(names)
+            return self._ranks
+
+    def _ranked(self, name, delta):
+        """Count an added or deleted username in the rank index"""
+        with self._ranks_lock:
+            if self._ranks is not None and self._ranks.add(name, delta):
+                # Split an oversized chunk at a username fetched by seeking
+                anchor = self._ranks.anchors[self._ranks.chunk_of(name)]
+                split = self.connection.execute(self.SELECT_USERNAME_AT, (anchor, AccountRanks.STRIDE)).fetchone()
+                if split is not None:
+                    self._ranks.split(split[0])
+
+    def _row_to_user(self, row):
+        """Build a user data dictionary from an accounts row"""
+        user_data = dict(zip(self.ACCOUNT_FIELDS, row[1:]))
+        user_data['transaction_log'] = []
+        return user_data
+
+
+class AccountRanks:
+    """Positions of usernames in sorted order, kept as chunks of counted rows
+
+    Chunk ``i`` holds the ``counts[i]`` usernames from ``anchors[i]`` up to
+    the next anchor. An account's position is the rows before its chunk
+    plus its place within the chunk, which a store finds by seeking to the
+    anchor, so no query walks more than about two chunks of rows. Adding or
+    deleting an account only changes the count of its chunk.
+    """
+
+    STRIDE = 1000
+
+    def __init__(self, anchors, counts):
+        self.anchors = anchors
+        self.counts = counts
+        self._starts = None
+
+    @classmethod
+    def build(cls, names):
+        """Return the chunks of an iterable of usernames in sorted order"""
+        anchors = []
+        counts = []
+        for index, name in enumerate(names):
+            if index % cls.STRIDE == 0:
+                anchors.append(name)
+                counts.append(0)
+            counts[-1] += 1
+        return cls(anchors, counts)
+
+    def chunk_of(self, name):
+        return max(bisect_right(self.anchors, name) - 1, 0)
+
+    def starts(self):
+        """Return the number of rows before each chunk"""
+        if self._starts is None:
+            starts = []
+            total = 0
+            for count in self.counts:
+                starts.append(total)
+                total += count
+            self._starts = starts
+        return self._starts
+
+    def locate(self, offset):
+        """Return (anchor, rows to skip from it) for a position, or (None, 0)"""
+        if not self.anchors:
+            return None, 0
+        starts = self.starts()
+        chunk = max(bisect_right(starts, offset) - 1, 0)
+        return self.anchors[chunk], offset - starts[chunk]
+
+    def rank_before(self, name):
+        """Return (anchor, rows before it) for the chunk a username falls in"""
+        if not self.anchors:
+            return None, 0
+        chunk = self.chunk_of(name)
+        return self.anchors[chunk], self.starts()[chunk]
+
+    def add(self, name, delta):
+        """Count a username in or out; return whether its chunk needs a split"""
+        self._starts = None
+        if not self.anchors:
+            if delta > 0:
+                self.anchors.append(name)
+                self.counts.append(delta)
+            return False
+        chunk = self.chunk_of(name)
+        if name < self.anchors[0]:
+            self.anchors[0] = name
+        self.counts[chunk] += delta
+        if self.counts[chunk] <= 0 and len(self.counts) > 1:
+            del self.anchors[chunk]
+            del self.counts[chunk]
+            return False
+        return self.counts[chunk] > 2 * self.STRIDE
+
+    def split(self, name):
+        """Start a new chunk at a username, STRIDE rows into its chunk"""
+        self._starts = None
+        chunk = self.chunk_of(name)
+        self.anchors.insert(chunk + 1, name)
+        self.counts.insert(chunk + 1, self.counts[chunk] - self.STRIDE)
+        self.counts[chunk] = self.STRIDE
+
+
+def open_store(data_dir, backend='memory'):
+    """Open the account store for the configured backend"""
+    if backend == 'sqlite':
+        os.makedirs(data_dir, exist_ok=True)
+        return SQLiteAccountStore(os.path.join(data_dir, 'accounts.db'))
+    if backend == 'memory':
+        return MemoryAccountStore(data_dir)
+    raise ValueError(f"Unknown storage backend: {backend}")
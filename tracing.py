@@ -0,0 +1,261 @@
+"""Sampled operation traces written to a local Chrome trace file
+
+A trace is a tree of timed spans: a transfer, say, with its validation, its
+minimum balance check and the two transaction log updates as children.
+
+    with tracer.span('transfer', sender=sender):
+        with tracer.span('validate'):
+            ...
+
+Only a sample of traces is kept: an operation asks ``tracer.sample()``
+before opening its outermost span, and one that is not sampled runs
+without any. A kept trace is written when its outermost span ends.
+
+TracedLedger opens these spans around the steps of deposits, withdrawals
+and transfers. A plain Ledger has no spans at all, so the ledger costs
+nothing more when tracing is off, and one sampling decision per operation
+when it is on.
+
+TraceFile writes the spans as Chrome trace events, one per line, after an
+opening ``[``. The array is never closed, which the Chrome trace viewer
+(chrome://tracing) and Perfetto (ui.perfetto.dev) both accept, so a file
+can be appended to by several runs and loaded while the application is
+still writing it. Each line without its trailing comma is a JSON object.
+Files are rotated at a size, as logging's RotatingFileHandler does.
+"""
+import itertools
+import json
+import os
+import random
+import threading
+import time
+
+from credentials import DEFAULT_HASHER
+from ledger import Ledger
+
+# Category of the trace events, shown by the trace viewers
+CATEGORY = 'bank'
+
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+
+class TraceFile:
+    """Chrome trace events appended to a file that is rotated at a size
+
+    When writing a trace would take the file past ``max_bytes``, it is
+    renamed to ``path.1``, older files move up to ``path.<backups>`` and
+    the oldest is removed.
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, events):
+        """Append a list of trace events"""
+        data = ''.join([_encode(event) + ',\n' for event in events])
+        with self._lock:
+            if self._file is None:
+                self._open()
+            elif self.max_bytes and self._file.tell() + len(data) > self.max_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if not self._file.tell():
+            self._file.write('[\n')
+        # Name the process in the viewers
+        self._file.write(json.dumps({'name': 'process_name', 'ph': 'M', 'pid': os.getpid(),
+                                     'args': {'name': f"Bank Management System ({os.getpid()})"}}) + ',\n')
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+
+class Span:
+    """One timed step of a sampled trace"""
+
+    __slots__ = ('tracer', 'name', 'args', 'events', 'trace_id', 'span_id', 'parent', 'start')
+
+    def __init__(self, tracer, name, args, parent):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.parent = parent
+        self.span_id = next(tracer._ids)
+        if parent is None:
+            self.events = []
+            self.trace_id = self.span_id
+        else:
+            self.events = parent.events
+            self.trace_id = parent.trace_id
+
+    def __enter__(self):
+        self.tracer._local.current = self
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        end = time.perf_counter_ns()
+        tracer = self.tracer
+        tracer._local.current = self.parent
+        args = self.args
+        args['trace_id'] = self.trace_id
+        args['span_id'] = self.span_id
+        if self.parent is not None:
+            args['parent_id'] = self.parent.span_id
+        if exc_type is not None:
+            args['error'] = exc_type.__name__
+        self.events.append({
+            'name': self.name,
+            'cat': CATEGORY,
+            'ph': 'X',
+            'ts': (tracer._epoch + self.start) / 1000,
+            'dur': (end - self.start) / 1000,
+            'pid': tracer._pid,
+            'tid': threading.get_native_id(),
+            'args': args
+        })
+        if self.parent is None:
+            tracer._export(self.events)
+        return False
+
+
+class Tracer:
+    """Sampled spans written to a TraceFile
+
+    ``sample_rate`` is the fraction of traces kept.
+    """
+
+    def __init__(self, output, sample_rate=1.0, rng=None):
+        self.output = output
+        self.sample_rate = sample_rate
+        self._random = (rng or random.Random()).random
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+        self._pid = os.getpid()
+        # Offset from the span clock to wall time, so runs line up in a viewer
+        self._epoch = time.time_ns() - time.perf_counter_ns()
+        self.exported = 0
+
+    def sample(self):
+        """Return whether to trace an operation about to start
+
+        Inside a kept trace every operation is traced, so traces are kept
+        whole.
+        """
+        if getattr(self._local, 'current', None) is not None:
+            return True
+        return self._random() < self.sample_rate
+
+    def span(self, name, **args):
+        """Return a context manager timing one step of the current trace
+
+        Outside a trace it starts a new one; call sample() first.
+        """
+        return Span(self, name, args, getattr(self._local, 'current', None))
+
+    def close(self):
+        self.output.close()
+
+    def _export(self, events):
+        self.output.write(events)
+        self.exported += 1
+
+
+class TracedLedger:
+    """A ledger whose deposits, withdrawals and transfers are traced step by step
+
+    It wraps a plain ledger and hands every other attribute to it, so both
+    see the same accounts and locks and the plain ledger is left untouched.
+    Operations that are not sampled run on the plain ledger. A sampled one
+    runs Ledger's code with the TracedLedger as ``self``, so its steps come
+    back through the traced methods below: a transfer is traced through its
+    validation, the minimum balance check and the two transaction log
+    updates, each of which updates a balance. A transaction logged on its
+    own is a trace of one span.
+    """
+
+    def __init__(self, ledger, tracer):
+        self.untraced = ledger
+        self.tracer = tracer
+
+    def __getattr__(self, name):
+        return getattr(self.untraced, name)
+
+    def deposit(self, name, amount):
+        if not self.tracer.sample():
+            return self.untraced.deposit(name, amount)
+        with self.tracer.span('deposit', account=name):
+            return Ledger.deposit(self, name, amount)
+
+    def withdraw(self, name, amount):
+        if not self.tracer.sample():
+            return self.untraced.withdraw(name, amount)
+        with self.tracer.span('withdraw', account=name):
+            return Ledger.withdraw(self, name, amount)
+
+    def transfer(self, sender, recipient, amount):
+        if not self.tracer.sample():
+            return self.untraced.transfer(sender, recipient, amount)
+        with self.tracer.span('transfer', sender=sender, recipient=recipient):
+            return Ledger.transfer(self, sender, recipient, amount)
+
+    def validate_transfer(self, sender, recipient, amount):
+        with self.tracer.span('validate'):
+            return self.untraced.validate_transfer(sender, recipient, amount)
+
+    def check_min_balance(self, user_data, amount):
+        with self.tracer.span('min_balance_check'):
+            self.untraced.check_min_balance(user_data, amount)
+
+    def log_transaction(self, name, transaction_type, amount):
+        if not self.tracer.sample():
+            return self.untraced.log_transaction(name, transaction_type, amount)
+        with self.tracer.span('log_transaction', account=name, type=transaction_type):
+            return self.untraced.log_transaction(name, transaction_type, amount)
+
+
+def tracer_from_environment():
+    """Return a tracer configured by BANK_TRACE_FILE, or None
+
+    Without BANK_TRACE_FILE nothing is traced. BANK_TRACE_SAMPLE is the
+    fraction of operations traced, 0.01 by default, and the file is rotated
+    at BANK_TRACE_MAX_BYTES, 10 MB by default.
+    """
+    path = os.environ.get('BANK_TRACE_FILE')
+    if not path:
+        return None
+    max_bytes = int(os.environ.get('BANK_TRACE_MAX_BYTES', 10 * 1024 * 1024))
+    return Tracer(TraceFile(path, max_bytes), float(os.environ.get('BANK_TRACE_SAMPLE', '0.01')))
+
+
+def open_ledger(store, account_types, tracer=None, hasher=DEFAULT_HASHER, metrics=None):
+    """Return a ledger over a store, traced through tracer if one is given"""
+    ledger = Ledger(store, account_types, hasher, metrics)
+    if tracer is None:
+        return ledger
+    return TracedLedger(ledger, tracer)
@@ -0,0 +1,126 @@
+import time
+from array import array
+from bisect import bisect_right
+
+# Amounts and balances are stored as whole cents
+AMOUNT_SCALE = 100
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Transaction types are interned once and stored as small integer codes
+TRANSACTION_TYPES = []
+_TYPE_CODES = {}
+
+
+def type_code(transaction_type):
+    """Return the interned code of a transaction type"""
+    code = _TYPE_CODES.get(transaction_type)
+    if code is None:
+        code = len(TRANSACTION_TYPES)
+        TRANSACTION_TYPES.append(transaction_type)
+        _TYPE_CODES[transaction_type] = code
+    return code
+
+
+def to_cents(value):
+    """Convert a currency amount to integer cents"""
+    return int(round(value * AMOUNT_SCALE))
+
+
+def format_timestamp(timestamp):
+    """Format an epoch timestamp as a local date string"""
+    return time.strftime(DATE_FORMAT, time.localtime(timestamp))
+
+
+def parse_date(date):
+    """Convert a formatted date string back to an epoch timestamp"""
+    return int(time.mktime(time.strptime(date, DATE_FORMAT)))
+
+
+class TransactionLog:
+    """Per-account transaction history stored column by column
+
+    Each transaction costs 28 bytes spread over four typed arrays instead of
+    a dictionary with a formatted date string. Entries are only turned back
+    into readable values when they are displayed.
+    """
+
+    __slots__ = ('timestamps', 'types', 'amounts', 'balances')
+
+    def __init__(self):
+        self.timestamps = array('q')
+        self.types = array('I')
+        self.amounts = array('q')
+        self.balances = array('q')
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __iter__(self):
+        for index in range(len(self.timestamps)):
+            yield self[index]
+
+    def __getitem__(self, index):
+        """Return one entry as (timestamp, type, amount, balance)"""
+        return (
+            self.timestamps[index],
+            TRANSACTION_TYPES[self.types[index]],
+            self.amounts[index] / AMOUNT_SCALE,
+            self.balances[index] / AMOUNT_SCALE
+        )
+
+    def newest_first(self, offset, limit):
+        """Return up to limit entries, counting back from the newest"""
+        end = len(self.timestamps) - offset
+        return [self[index] for index in range(end - 1, max(end - limit, 0) - 1, -1)]
+
+    def count_after(self, timestamp):
+        """Return the number of entries made after a timestamp"""
+        return len(self.timestamps) - bisect_right(self.timestamps, timestamp)
+
+    def append(self, timestamp, transaction_type, amount, balance):
+        """Append a transaction with amounts given in currency units"""
+        self.timestamps.append(timestamp)
+        self.types.append(type_code(transaction_type))
+        self.amounts.append(to_cents(amount))
+        self.balances.append(to_cents(balance))
+
+    def append_record(self, transaction):
+        """Append a transaction dictionary as passed to the account store"""
+        timestamp = transaction.get('timestamp')
+        if timestamp is None:
+            timestamp = parse_date(transaction['date'])
+        self.append(timestamp, transaction['type'], transaction['amount'], transaction['balance'])
+
+    def to_json(self):
+        """Return the columns as JSON-serializable lists"""
+        # Type codes are process-local, so they are renumbered against a
+        # table of the type names used by this log
+        local_codes = {}
+        types = [local_codes.setdefault(code, len(local_codes)) for code in self.types]
+        return {
+            'type_names': [TRANSACTION_TYPES[code] for code in local_codes],
+            'timestamps': self.timestamps.tolist(),
+            'types': types,
+            'amounts': self.amounts.tolist(),
+            'balances': self.balances.tolist()
+        }
+
+    @classmethod
+    def from_json(cls, columns):
+        """Rebuild a log from the output of to_json"""
+        log = cls()
+        codes = [type_code(transaction_type) for transaction_type in columns['type_names']]
+        log.timestamps.extend(columns['timestamps'])
+        log.types.extend(codes[local_code] for local_code in columns['types'])
+        log.amounts.extend(columns['amounts'])
+        log.balances.extend(columns['balances'])
+        return log
+
+    @classmethod
+    def from_records(cls, transactions):
+        """Build a log from a list of transaction dictionaries"""
+        log = cls()
+        for transaction in transactions:
+            log.append_record(transaction)
+        return log
@@ -1,6 +1,8 @@
-from tkinter import messagebox, Toplevel, Label, Entry, Button, Frame, Text
-from tkinter import ttk
-from datetime import datetime
+from tkinter import messagebox, Toplevel, Label, Entry, Button, Frame
+
+from ledger import LedgerError
+from transaction_log import format_timestamp, parse_date
+from ui_components import Autocomplete, VirtualTreeview, clear_entries
 
 class TransactionManagement:
     def __init__(self, bank_system):
@@ -12,11 +14,12 @@ class TransactionManagement:
             messagebox.showerror("Error", "Please login first!")
             return
         
-        # Create deposit window
-        deposit_window = Toplevel(self.bank_system.root)
-        deposit_window.title("Deposit")
-        deposit_window.geometry("300x200")
-        
+        # Show the deposit window, built on first use
+        widgets = self.bank_system.dialogs.show('deposit', "Deposit", "300x200", self._build_deposit)
+        widgets['amount'].focus_set()
+    
+    def _build_deposit(self, deposit_window):
+        """Create the widgets of the deposit window"""
         # Create frame
         frame = Frame(deposit_window)
         frame.pack(padx=20, pady=20)
@@ -28,31 +31,24 @@ class TransactionManagement:
         
         # Deposit button
         Button(frame, text="Deposit", 
-            command=lambda: self._process_deposit(amount_entry.get(), deposit_window)).grid(row=1, column=0, columnspan=2, pady=10)
+            command=lambda: self._process_deposit(amount_entry.get())).grid(row=1, column=0, columnspan=2, pady=10)
+        return {'amount': amount_entry}
     
-    def _process_deposit(self, amount, window):
+    def _process_deposit(self, amount):
         """Process deposit transaction"""
         try:
-            amount = float(amount)
-            if amount <= 0:
-                raise ValueError
-        except ValueError:
-            messagebox.showerror("Error", "Please enter a valid positive amount!")
+            with self.bank_system.metrics.timer('deposit'):
+                transaction = self.bank_system.ledger.deposit(self.bank_system.current_user, amount)
+        except LedgerError as e:
+            messagebox.showerror("Error", str(e))
             return
         
-        # Update balance
-        user_data = self.bank_system.users[self.bank_system.current_user]
-        user_data['balance'] += amount
-        
-        # Log transaction
-        self.log_transaction("Deposit", amount)
-        
         # Update balance display
         self.bank_system.update_balance_display()
         
         # Show success message and close window
-        messagebox.showinfo("Success", f"${amount:.2f} deposited successfully!")
-        window.destroy()
+        messagebox.showinfo("Success", f"${transaction['amount']:.2f} deposited successfully!")
+        self.bank_system.dialogs.hide('deposit')
     
     def withdraw(self):
         """Handle withdrawal transaction"""
@@ -60,11 +56,12 @@ class TransactionManagement:
             messagebox.showerror("Error", "Please login first!")
             return
         
-        # Create withdrawal window
-        withdraw_window = Toplevel(self.bank_system.root)
-        withdraw_window.title("Withdraw")
-        withdraw_window.geometry("300x200")
-        
+        # Show the withdrawal window, built on first use
+        widgets = self.bank_system.dialogs.show('withdraw', "Withdraw", "300x200", self._build_withdraw)
+        widgets['amount'].focus_set()
+    
+    def _build_withdraw(self, withdraw_window):
+        """Create the widgets of the withdrawal window"""
         # Create frame
         frame = Frame(withdraw_window)
         frame.pack(padx=20, pady=20)
@@ -76,41 +73,24 @@ class TransactionManagement:
         
         # Withdraw button
         Button(frame, text="Withdraw", 
-            command=lambda: self._process_withdraw(amount_entry.get(), withdraw_window)).grid(row=1, column=0, columnspan=2, pady=10)
+            command=lambda: self._process_withdraw(amount_entry.get())).grid(row=1, column=0, columnspan=2, pady=10)
+        return {'amount': amount_entry}
     
-    def _process_withdraw(self, amount, window):
+    def _process_withdraw(self, amount):
         """Process withdrawal transaction"""
         try:
-            amount = float(amount)
-            if amount <= 0:
-                raise ValueError
-        except ValueError:
-            messagebox.showerror("Error", "Please enter a valid positive amount!")
-            return
-        
-        user_data = self.bank_system.users[self.bank_system.current_user]
-        
-        # Check minimum balance requirement
-        account_type = user_data.get('account_type', 'Savings')
-        min_balance = self.bank_system.account_types[account_type]['min_balance']
-        
-        if user_data['balance'] - amount < min_balance:
-            messagebox.showerror("Error", 
-                f"Insufficient balance! Minimum balance requirement: ${min_balance:.2f}")
+            with self.bank_system.metrics.timer('withdraw'):
+                transaction = self.bank_system.ledger.withdraw(self.bank_system.current_user, amount)
+        except LedgerError as e:
+            messagebox.showerror("Error", str(e))
             return
         
-        # Update balance
-        user_data['balance'] -= amount
-        
-        # Log transaction
-        self.log_transaction("Withdrawal", -amount)
-        
         # Update balance display
         self.bank_system.update_balance_display()
         
         # Show success message and close window
-        messagebox.showinfo("Success", f"${amount:.2f} withdrawn successfully!")
-        window.destroy()
+        messagebox.showinfo("Success", f"${-transaction['amount']:.2f} withdrawn successfully!")
+        self.bank_system.dialogs.hide('withdraw')
     
     def transfer(self):
         """Handle transfer transaction"""
@@ -118,19 +98,24 @@ class TransactionManagement:
             messagebox.showerror("Error", "Please login first!")
             return
         
-        # Create transfer window
-        transfer_window = Toplevel(self.bank_system.root)
-        transfer_window.title("Transfer")
-        transfer_window.geometry("300x250")
-        
+        # Show the transfer window, built on first use
+        widgets = self.bank_system.dialogs.show('transfer', "Transfer", "380x250", self._build_transfer,
+                                                self._reset_transfer)
+        widgets['recipient'].focus_set()
+    
+    def _build_transfer(self, transfer_window):
+        """Create the widgets of the transfer window"""
         # Create frame
         frame = Frame(transfer_window)
         frame.pack(padx=20, pady=20)
         
         # Recipient entry
-        Label(frame, text="Recipient:").grid(row=0, column=0, padx=5, pady=5)
+        Label(frame, text="Recipient or Account No.:").grid(row=0, column=0, padx=5, pady=5)
         recipient_entry = Entry(frame)
         recipient_entry.grid(row=0, column=1, padx=5, pady=5)
+        recipient_autocomplete = Autocomplete(recipient_entry, lambda text: [
+            username for username in self.bank_system.name_index.search(text, limit=9)
+            if username != self.bank_system.current_user])
         
         # Amount entry
         Label(frame, text="Amount:").grid(row=1, column=0, padx=5, pady=5)
@@ -141,79 +126,38 @@ class TransactionManagement:
         Button(frame, text="Transfer", 
             command=lambda: self._process_transfer(
                 recipient_entry.get(),
-                amount_entry.get(),
-                transfer_window
+                amount_entry.get()
             )).grid(row=2, column=0, columnspan=2, pady=10)
+        return {'recipient': recipient_entry, 'amount': amount_entry, 'autocomplete': recipient_autocomplete}
     
-    def _process_transfer(self, recipient, amount, window):
+    def _reset_transfer(self, widgets):
+        """Clear the transfer window and its suggestions for the next use"""
+        clear_entries(widgets)
+        widgets['autocomplete'].hide()
+    
+    def _process_transfer(self, recipient, amount):
         """Process transfer transaction"""
         try:
-            amount = float(amount)
-            if amount <= 0:
-                raise ValueError
-        except ValueError:
-            messagebox.showerror("Error", "Please enter a valid positive amount!")
-            return
-        
-        # Check if recipient exists
-        if recipient not in self.bank_system.users:
-            messagebox.showerror("Error", "Recipient not found!")
-            return
-        
-        # Check if trying to transfer to self
-        if recipient == self.bank_system.current_user:
-            messagebox.showerror("Error", "Cannot transfer to yourself!")
-            return
-        
-        sender_data = self.bank_system.users[self.bank_system.current_user]
-        recipient_data = self.bank_system.users[recipient]
-        
-        # Check minimum balance requirement
-        account_type = sender_data.get('account_type', 'Savings')
-        min_balance = self.bank_system.account_types[account_type]['min_balance']
-        
-        if sender_data['balance'] - amount < min_balance:
-            messagebox.showerror("Error", 
-                f"Insufficient balance! Minimum balance requirement: ${min_balance:.2f}")
+            with self.bank_system.metrics.timer('transfer'):
+                transaction = self.bank_system.ledger.transfer(self.bank_system.current_user, recipient, amount)
+        except LedgerError as e:
+            messagebox.showerror("Error", str(e))
             return
         
-        # Update balances
-        sender_data['balance'] -= amount
-        recipient_data['balance'] += amount
-        
-        # Log transactions
-        self.log_transaction("Transfer to " + recipient, -amount)
-        self._log_transaction_for_user(recipient, "Transfer from " + self.bank_system.current_user, amount)
-        
         # Update balance display
         self.bank_system.update_balance_display()
         
         # Show success message and close window
-        messagebox.showinfo("Success", f"${amount:.2f} transferred successfully to {recipient}!")
-        window.destroy()
+        messagebox.showinfo("Success", f"${-transaction['amount']:.2f} transferred successfully to {recipient}!")
+        self.bank_system.dialogs.hide('transfer')
     
     def log_transaction(self, transaction_type, amount):
         """Log a transaction for the current user"""
         self._log_transaction_for_user(self.bank_system.current_user, transaction_type, amount)
     
     def _log_transaction_for_user(self, username, transaction_type, amount):
-        """Log a transaction for a specific user"""
-        user_data = self.bank_system.users[username]
-        
-        # Initialize transaction log if it doesn't exist
-        if 'transactions' not in user_data:
-            user_data['transactions'] = []
-        
-        # Create transaction record
-        transaction = {
-            'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'type': transaction_type,
-            'amount': amount,
-            'balance': user_data['balance']
-        }
-        
-        # Add transaction to log
-        user_data['transactions'].append(transaction)
+        """Apply a transaction amount to a specific user and log it"""
+        return self.bank_system.ledger.log_transaction(username, transaction_type, amount)
     
     def view_transaction_log(self):
         """Show transaction log window"""
@@ -221,48 +165,61 @@ class TransactionManagement:
             messagebox.showerror("Error", "Please login first!")
             return
         
+        username = self.bank_system.current_user
+        
         # Create transaction log window
         log_window = Toplevel(self.bank_system.root)
         log_window.title("Transaction Log")
         log_window.geometry("600x400")
         
-        # Create frame
-        frame = Frame(log_window)
-        frame.pack(padx=20, pady=20, fill='both', expand=True)
-        
-        # Create text widget with custom styling
-        text_widget = Text(frame, width=70, height=20, font=('Arial', 10))
-        text_widget.pack(side='left', fill='both', expand=True)
-        
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(frame, orient='vertical', command=text_widget.yview)
-        scrollbar.pack(side='right', fill='y')
-        text_widget.configure(yscrollcommand=scrollbar.set)
-        
-        # Get user's transactions
-        user_data = self.bank_system.users[self.bank_system.current_user]
-        transactions = user_data.get('transactions', [])
-        
-        # Display transactions
-        if transactions:
-            # Add header
-            text_widget.insert('end', "Transaction History\n", 'header')
-            text_widget.insert('end', "=" * 50 + "\n\n")
-            
-            # Display each transaction
-            for transaction in transactions:
-                text_widget.insert('end',
-                    f"Date: {transaction['date']}\n"
-                    f"Type: {transaction['type']}\n"
-                    f"Amount: ${abs(transaction['amount']):.2f}\n"
-                    f"Balance: ${transaction['balance']:.2f}\n"
-                    f"{'-'*50}\n\n"
-                )
+        # Create header with the transaction count
+        header_frame = Frame(log_window)
+        header_frame.pack(padx=20, pady=(20, 5), fill='x')
+        count_label = Label(header_frame, text="Transaction History", font=('Arial', 12, 'bold'))
+        count_label.pack(side='left')
+        
+        # Jump to date controls
+        Button(header_frame, text="Newest", command=lambda: history.scroll_to(0)).pack(side='right', padx=5)
+        Button(header_frame, text="Go", command=lambda: self._jump_to_date(history, username, date_entry.get())).pack(side='right')
+        date_entry = Entry(header_frame, width=12)
+        date_entry.pack(side='right', padx=5)
+        Label(header_frame, text="Jump to date (YYYY-MM-DD):").pack(side='right')
+        
+        # Create virtual treeview that only formats the transactions in view
+        columns = ('Date', 'Type', 'Amount', 'Balance')
+        history = VirtualTreeview(log_window, columns,
+            count_rows=lambda: self.bank_system.ledger.count_transactions(username),
+            fetch_rows=lambda offset, limit: self._fetch_transaction_rows(username, offset, limit),
+            height=15, column_width=130)
+        history.pack(padx=20, pady=(0, 20), fill='both', expand=True)
+        history.refresh()
+        
+        # Show the number of transactions
+        if history.model.total:
+            count_label.config(text=f"Transaction History ({history.model.total} transactions, newest first)")
         else:
-            text_widget.insert('end', "No transactions found.\n")
-        
-        # Configure tags for styling
-        text_widget.tag_configure('header', font=('Arial', 12, 'bold'))
+            count_label.config(text="No transactions found.")
+    
+    def _fetch_transaction_rows(self, username, offset, limit):
+        """Return a page of formatted transaction rows, newest first"""
+        total = self.bank_system.ledger.count_transactions(username)
+        rows = []
+        for position, (timestamp, transaction_type, amount, balance) in enumerate(
+                self.bank_system.ledger.list_transactions(username, offset, limit)):
+            rows.append((total - 1 - offset - position, (
+                format_timestamp(timestamp),
+                transaction_type,
+                f"${abs(amount):.2f}",
+                f"${balance:.2f}"
+            )))
+        return rows
+    
+    def _jump_to_date(self, history, username, date):
+        """Scroll the history to the newest transaction on or before a date"""
+        try:
+            end_of_day = parse_date(date.strip() + " 23:59:59")
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a date as YYYY-MM-DD!")
+            return
         
-        # Make text widget read-only
-        text_widget.configure(state='disabled') 
\ No newline at end of file
+        history.scroll_to(self.bank_system.ledger.count_transactions(username, after=end_of_day))
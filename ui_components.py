@@ -1 +1,342 @@
- 
\ No newline at end of file
+from tkinter import END, Entry, Frame, Listbox, Toplevel, ttk
+
+
+class VirtualRows:
+    """Window of rows over a paged data source, independent of any widget
+
+    ``count_rows()`` returns the total number of rows and
+    ``fetch_rows(offset, limit)`` returns (key, values) pairs starting at a
+    position. Only the rows inside the window are ever fetched, and every
+    reload reports just the slots whose content changed.
+    """
+
+    def __init__(self, count_rows, fetch_rows, height):
+        self.count_rows = count_rows
+        self.fetch_rows = fetch_rows
+        self.height = height
+        self.offset = 0
+        self.total = 0
+        self.rows = []
+
+    def keys(self):
+        """Return the keys of the rows in the window"""
+        return [key for key, _ in self.rows]
+
+    def scroll_to(self, offset):
+        """Move the window to a row position and return the slot updates"""
+        self.offset = offset
+        return self.reload()
+
+    def reload(self):
+        """Fetch the window again and return (slot, row) for changed slots
+
+        ``row`` is None for slots that are now past the last row.
+        """
+        self.total = self.count_rows()
+        self.offset = max(0, min(self.offset, self.total - self.height))
+        rows = self.fetch_rows(self.offset, self.height)
+
+        updates = []
+        for slot in range(max(len(rows), len(self.rows))):
+            new_row = rows[slot] if slot < len(rows) else None
+            old_row = self.rows[slot] if slot < len(self.rows) else None
+            if new_row != old_row:
+                updates.append((slot, new_row))
+        self.rows = rows
+        return updates
+
+
+class VirtualTreeview(Frame):
+    """Treeview that only materializes the rows in view
+
+    The tree holds a fixed number of row items that are reused while
+    scrolling; the scrollbar maps onto the full row count of the data source.
+    Rows are identified by the keys returned from ``fetch_rows``.
+    """
+
+    def __init__(self, parent, columns, count_rows, fetch_rows, height=20, column_width=100):
+        super().__init__(parent)
+        self.model = VirtualRows(count_rows, fetch_rows, height)
+        self.data_version = None
+        self._selected_key = None
+
+        # Create the tree with one reusable item per visible row
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', height=height, selectmode='browse')
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=column_width)
+        self._slots = [self.tree.insert('', 'end', values=()) for _ in range(height)]
+        self._attached = [False] * height
+        for item in self._slots:
+            self.tree.detach(item)
+
+        # Scrollbar covers the whole data source, not just the items
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self._on_scrollbar)
+        self.tree.pack(side='left', fill='both', expand=True)
+        self.scrollbar.pack(side='right', fill='y')
+
+        # Scroll with the mouse wheel and paging keys
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll_by(-1 if e.delta > 0 else 1))
+        self.tree.bind('<Button-4>', lambda e: self.scroll_by(-1))
+        self.tree.bind('<Button-5>', lambda e: self.scroll_by(1))
+        self.tree.bind('<Prior>', lambda e: self.scroll_by(-height))
+        self.tree.bind('<Next>', lambda e: self.scroll_by(height))
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+
+    def refresh(self):
+        """Fetch the visible window again and update the rows that changed"""
+        self._apply(self.model.reload())
+
+    def scroll_to(self, offset):
+        """Show the rows starting at a position"""
+        self._apply(self.model.scroll_to(offset))
+
+    def scroll_by(self, rows):
+        """Scroll the window by a number of rows"""
+        self.scroll_to(self.model.offset + rows)
+        return 'break'
+
+    def show_key(self, index, key):
+        """Scroll to the row at a position and select it"""
+        if not self.model.offset <= index < self.model.offset + self.model.height:
+            self.scroll_to(index - self.model.height // 2)
+        self._selected_key = key
+        self._sync_selection()
+
+    def visible_keys(self):
+        """Return the keys of the rows currently shown"""
+        return set(self.model.keys())
+
+    def selected_key(self):
+        """Return the key of the selected row, or None"""
+        return self._selected_key
+
+    def _apply(self, updates):
+        """Write changed slots into the tree items"""
+        for slot, row in updates:
+            item = self._slots[slot]
+            if row is None:
+                if self._attached[slot]:
+                    self.tree.detach(item)
+                    self._attached[slot] = False
+                continue
+            self.tree.item(item, values=row[1])
+            if not self._attached[slot]:
+                self.tree.move(item, '', slot)
+                self._attached[slot] = True
+
+        # Update scrollbar position
+        total = self.model.total
+        if total:
+            self.scrollbar.set(self.model.offset / total, min(1.0, (self.model.offset + self.model.height) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self._sync_selection()
+
+    def _sync_selection(self):
+        """Select the item holding the selected key, if it is in view"""
+        keys = self.model.keys()
+        if self._selected_key in keys:
+            item = self._slots[keys.index(self._selected_key)]
+            if self.tree.selection() != (item,):
+                self.tree.selection_set(item)
+        elif self.tree.selection():
+            self.tree.selection_remove(self.tree.selection())
+
+    def _on_select(self, event):
+        """Remember the key of a row selected by the user"""
+        selection = self.tree.selection()
+        if not selection:
+            return
+        slot = self._slots.index(selection[0])
+        if slot < len(self.model.rows):
+            self._selected_key = self.model.rows[slot][0]
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        """Translate scrollbar commands into row positions"""
+        if action == 'moveto':
+            self.scroll_to(int(float(amount) * self.model.total))
+        elif unit == 'pages':
+            self.scroll_by(int(amount) * self.model.height)
+        else:
+            self.scroll_by(int(amount))
+
+
+class Autocomplete:
+    """Debounced suggestions in a drop-down list under an Entry
+
+    Each key press restarts a short timer, so ``search(text)`` runs once the
+    typing pauses rather than on every key. Its results are listed under the
+    entry and ``on_change(text)`` is called with the settled text. Down moves
+    into the list; Return or a click picks a suggestion, which fills the
+    entry and calls ``on_change`` and ``on_select`` with it. Escape closes
+    the list.
+    """
+
+    NAVIGATION_KEYS = {'Down', 'Up', 'Return', 'KP_Enter', 'Escape', 'Tab'}
+
+    def __init__(self, entry, search, on_change=None, on_select=None, delay=150, limit=8):
+        self.entry = entry
+        self.search = search
+        self.on_change = on_change
+        self.on_select = on_select
+        self.delay = delay
+        self.limit = limit
+        self._pending = None
+        self._popup = None
+        self._listbox = None
+
+        entry.bind('<KeyRelease>', self._on_key, add='+')
+        entry.bind('<Down>', self._focus_list, add='+')
+        entry.bind('<Escape>', lambda e: self.hide(), add='+')
+        entry.bind('<FocusOut>', self._on_focus_out, add='+')
+        entry.bind('<Destroy>', lambda e: self._cancel(), add='+')
+
+    def hide(self):
+        if self._popup is not None:
+            self._popup.withdraw()
+
+    def _on_key(self, event):
+        """Restart the timer on keys that change the text"""
+        if event.keysym in self.NAVIGATION_KEYS:
+            return
+        self._cancel()
+        self._pending = self.entry.after(self.delay, self._update)
+
+    def _cancel(self):
+        if self._pending is not None:
+            self.entry.after_cancel(self._pending)
+            self._pending = None
+
+    def _update(self):
+        """Look up the settled text and show its suggestions"""
+        self._pending = None
+        text = self.entry.get()
+        suggestions = self.search(text)[:self.limit] if text.strip() else []
+        self._show(suggestions)
+        if self.on_change:
+            self.on_change(text)
+
+    def _show(self, suggestions):
+        if not suggestions:
+            self.hide()
+            return
+
+        # Create the drop-down once and reuse it
+        if self._popup is None:
+            self._popup = Toplevel(self.entry)
+            self._popup.overrideredirect(True)
+            self._listbox = Listbox(self._popup, exportselection=False)
+            self._listbox.pack(fill='both', expand=True)
+            self._listbox.bind('<ButtonRelease-1>', self._pick)
+            self._listbox.bind('<Return>', self._pick)
+            self._listbox.bind('<Escape>', lambda e: self._return_to_entry())
+
+        self._listbox.delete(0, END)
+        for suggestion in suggestions:
+            self._listbox.insert(END, suggestion)
+        self._listbox.config(height=len(suggestions))
+        self._popup.geometry(f"{self.entry.winfo_width()}x{self._listbox.winfo_reqheight()}"
+                             f"+{self.entry.winfo_rootx()}+{self.entry.winfo_rooty() + self.entry.winfo_height()}")
+        self._popup.deiconify()
+        self._popup.lift()
+
+    def _focus_list(self, event):
+        """Move from the entry into the suggestions"""
+        if self._popup is None or not self._popup.winfo_viewable():
+            return
+        self._listbox.focus_set()
+        self._listbox.selection_clear(0, END)
+        self._listbox.selection_set(0)
+        self._listbox.activate(0)
+        return 'break'
+
+    def _pick(self, event):
+        """Fill the entry with the chosen suggestion"""
+        selection = self._listbox.curselection()
+        if not selection:
+            return
+        value = self._listbox.get(selection[0])
+        self.entry.delete(0, END)
+        self.entry.insert(0, value)
+        self._return_to_entry()
+        if self.on_change:
+            self.on_change(value)
+        if self.on_select:
+            self.on_select(value)
+        return 'break'
+
+    def _return_to_entry(self):
+        self.hide()
+        self.entry.focus_set()
+        self.entry.icursor(END)
+
+    def _on_focus_out(self, event):
+        # Let a click on the list land before it is hidden
+        self.entry.after(150, self._hide_unless_focused)
+
+    def _hide_unless_focused(self):
+        if self._popup is None or not self.entry.winfo_exists():
+            return
+        if str(self.entry.tk.call('focus')) not in (str(self.entry), str(self._listbox)):
+            self.hide()
+
+
+def clear_entries(widgets):
+    """Empty every Entry among a dialog's widgets"""
+    for widget in widgets.values():
+        if isinstance(widget, Entry):
+            widget.delete(0, END)
+
+
+class DialogPool:
+    """Dialog windows built once and shown again rather than rebuilt
+
+    ``show(key, title, geometry, build, reset)`` opens the dialog of a key.
+    The first time it creates a Toplevel and calls ``build(window)``, which
+    adds the widgets and returns them in a dict; later it calls
+    ``reset(widgets)`` on the hidden window and shows it again. Closing a
+    dialog, from its title bar or with ``hide``, withdraws it instead of
+    destroying it, and showing a dialog that is already open only raises
+    it, so there is never more than one window per key.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._dialogs = {}
+
+    def __len__(self):
+        return len(self._dialogs)
+
+    def show(self, key, title, geometry, build, reset=clear_entries):
+        """Open the dialog of a key and return its widgets"""
+        dialog = self._dialogs.get(key)
+        if dialog is not None and dialog[0].winfo_exists():
+            window, widgets = dialog
+            if window.state() == 'withdrawn':
+                reset(widgets)
+                window.deiconify()
+        else:
+            window = Toplevel(self.root)
+            window.title(title)
+            window.geometry(geometry)
+            window.protocol('WM_DELETE_WINDOW', lambda: self.hide(key))
+            widgets = build(window)
+            self._dialogs[key] = (window, widgets)
+        window.lift()
+        window.focus_set()
+        return widgets
+
+    def is_open(self, key):
+        dialog = self._dialogs.get(key)
+        return dialog is not None and dialog[0].winfo_exists() and dialog[0].state() != 'withdrawn'
+
+    def hide(self, key):
+        """Withdraw the dialog of a key, keeping it for the next show"""
+        dialog = self._dialogs.get(key)
+        if dialog is not None and dialog[0].winfo_exists():
+            dialog[0].withdraw()
+
+    def hide_all(self):
+        for key in self._dialogs:
+            self.hide(key)
@@ -0,0 +1,274 @@
+"""Seeded synthetic accounts and transaction streams for load tests
+
+PopulationGenerator produces accounts spread over the account types and
+security questions, with plausible names, ages, salaries and balances.
+Usernames, PINs and security answers are a function of the account index,
+so a load test can log in as account ``i`` without keeping a list.
+
+WorkloadGenerator produces transaction rows in the format bulk_import reads
+(type, account, amount, recipient). The deposit, withdrawal and transfer mix
+is configurable, and a small set of hot accounts can take a large share of
+the traffic, as payroll and merchant accounts do.
+
+The same seed always gives the same data. Accounts go straight into an
+account store, and transactions into the ledger or a CSV/JSONL file:
+
+    python workload.py --accounts 1000000 --transactions 5000000 --output transactions.csv
+    python bulk_import.py transactions.csv
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import time
+from itertools import islice
+
+from account_numbers import AccountNumberAllocator
+from bulk_import import FIELDS, import_rows
+from credentials import DEFAULT_HASHER, normalize_answer
+from ledger import Ledger, DEFAULT_ACCOUNT_TYPES, DEFAULT_SECURITY_QUESTIONS
+from storage import open_store
+
+FIRST_NAMES = [
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+    'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen',
+    'Aarav', 'Priya', 'Rahul', 'Ananya', 'Wei', 'Mei', 'Hiroshi', 'Yuki', 'Carlos', 'Lucia',
+    'Mateo', 'Sofia', 'Omar', 'Fatima', 'Ivan', 'Olga', 'Kwame', 'Amara', 'Liam', 'Chloe',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee',
+    'Sharma', 'Patel', 'Singh', 'Kumar', 'Wang', 'Li', 'Zhang', 'Tanaka', 'Suzuki', 'Silva',
+    'Santos', 'Ivanov', 'Petrov', 'Okafor', 'Mensah', 'Nguyen', 'Tran', 'Kim', 'Park', 'Cohen',
+]
+ANSWERS = ['blue', 'green', 'smith', 'rex', 'bella', 'dune', 'emma', 'oakwood',
+           'max', 'luna', 'hamlet', 'red', 'jones', 'kitty', 'lincoln', 'ulysses']
+
+DEFAULT_MIX = {'Deposit': 0.5, 'Withdrawal': 0.3, 'Transfer': 0.2}
+
+
+class PopulationGenerator:
+    """Seeded accounts spread over account types and security questions
+
+    PINs and answers cycle through ``distinct_pins`` values so that each is
+    hashed once rather than once per account; hashing every account at full
+    cost would take hours for a million accounts.
+    """
+
+    def __init__(self, seed=0, account_types=DEFAULT_ACCOUNT_TYPES, security_questions=DEFAULT_SECURITY_QUESTIONS,
+                 hasher=DEFAULT_HASHER, distinct_pins=16):
+        self.seed = seed
+        self.account_types = account_types
+        self.security_questions = list(security_questions)
+        self.hasher = hasher
+
+        rng = random.Random(seed)
+        self.first_names = rng.sample(FIRST_NAMES, len(FIRST_NAMES))
+        self.last_names = rng.sample(LAST_NAMES, len(LAST_NAMES))
+        self.pins = [f"{rng.randrange(10000):04d}" for _ in range(distinct_pins)]
+        self._hashes = {}
+
+    def holder_name(self, index):
+        first = self.first_names[index % len(self.first_names)]
+        last = self.last_names[(index // len(self.first_names)) % len(self.last_names)]
+        return f"{first} {last}"
+
+    def username(self, index):
+        return self._username(self.holder_name(index), index)
+
+    def pin(self, index):
+        return self.pins[index % len(self.pins)]
+
+    def answer(self, index):
+        return ANSWERS[index % len(ANSWERS)]
+
+    def accounts(self, count, start=0):
+        """Yield (username, user_data) for accounts start to start + count"""
+        rng = random.Random(f"{self.seed}:{start}")
+        type_names = list(self.account_types)
+        for index in range(start, start + count):
+            account_type = rng.choice(type_names)
+            # Salaries and balances are log-normal, like real incomes
+            salary = round(rng.lognormvariate(10.8, 0.5), 2)
+            balance = self.account_types[account_type]['min_balance'] + round(rng.lognormvariate(8, 1.5), 2)
+            name = self.holder_name(index)
+            yield self._username(name, index), {
+                'name': name,
+                'age': rng.randint(18, 85),
+                'salary': salary,
+                'pin': self._hash(self.pin(index)),
+                'account_number': AccountNumberAllocator.number_for(index),
+                'balance': balance,
+                'account_type': account_type,
+                'security_question': rng.choice(self.security_questions),
+                'security_answer': self._hash(normalize_answer(self.answer(index))),
+                'transaction_log': []
+            }
+
+    def populate(self, store, count, chunk_size=50000, progress=None):
+        """Add count accounts to an empty store and return the number added"""
+        # Generated accounts take the first account numbers of the sequence,
+        # which accounts already in the store may hold
+        if len(store):
+            raise ValueError(f"Store already holds {len(store)} accounts")
+        added = 0
+        accounts = self.accounts(count)
+        while added < count:
+            chunk = list(islice(accounts, chunk_size))
+            store.add_accounts(chunk)
+            added += len(chunk)
+            if progress:
+                progress(added)
+
+        # Accounts opened later get numbers after the generated ones
+        if store.get_meta(AccountNumberAllocator.META_KEY, 0) < count:
+            store.set_meta(AccountNumberAllocator.META_KEY, count)
+        return added
+
+    @staticmethod
+    def _username(name, index):
+        return name.replace(' ', '.').lower() + str(index)
+
+    def _hash(self, secret):
+        stored = self._hashes.get(secret)
+        if stored is None:
+            stored = self._hashes[secret] = self.hasher.hash(secret)
+        return stored
+
+
+class WorkloadGenerator:
+    """Seeded transaction rows over the accounts of a population
+
+    ``mix`` maps the row types Deposit, Withdrawal and Transfer to their
+    share of the rows. The first ``hot_fraction`` of the accounts take
+    ``hot_share`` of all rows; the rest are spread evenly.
+    """
+
+    def __init__(self, population, num_accounts, seed=0, mix=DEFAULT_MIX, hot_fraction=0.01, hot_share=0.5):
+        if num_accounts < 2:
+            raise ValueError("A workload needs at least two accounts")
+        self.population = population
+        self.num_accounts = num_accounts
+        self.seed = seed
+        total = sum(mix.values())
+        self.types = list(mix)
+        self.cumulative = []
+        share = 0.0
+        for transaction_type in self.types:
+            share += mix[transaction_type] / total
+            self.cumulative.append(share)
+        self.hot_count = max(1, int(num_accounts * hot_fraction))
+        self.hot_share = hot_share
+
+    def rows(self, count):
+        """Yield count transaction rows as dictionaries"""
+        rng = random.Random(f"{self.seed}:workload")
+        random_value = rng.random
+        types, cumulative = self.types, self.cumulative
+        username = self.population.username
+        for _ in range(count):
+            draw = random_value()
+            transaction_type = types[-1]
+            for position, share in enumerate(cumulative):
+                if draw < share:
+                    transaction_type = types[position]
+                    break
+
+            account = self._pick(rng)
+            # Amounts are log-normal; withdrawals are smaller than deposits
+            amount = round(min(rng.lognormvariate(4.5 if transaction_type == 'Withdrawal' else 5, 1.2), 50000), 2)
+            recipient = ''
+            if transaction_type == 'Transfer':
+                other = self._pick(rng)
+                if other == account:
+                    # Any other account, so a single hot account cannot loop
+                    other = (account + 1 + rng.randrange(self.num_accounts - 1)) % self.num_accounts
+                recipient = username(other)
+            yield {'type': transaction_type, 'account': username(account),
+                   'amount': max(amount, 0.01), 'recipient': recipient}
+
+    def write(self, path, count):
+        """Write count rows to a CSV or JSONL file and return the count"""
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            if path.endswith('.jsonl') or path.endswith('.json'):
+                for row in self.rows(count):
+                    f.write(json.dumps(row, separators=(',', ':')) + '\n')
+            else:
+                writer = csv.writer(f)
+                writer.writerow(FIELDS)
+                writer.writerows([row[field] for field in FIELDS] for row in self.rows(count))
+        return count
+
+    def apply(self, ledger, count, chunk_size=1000, progress=None):
+        """Apply count rows through the ledger and return an ImportResult"""
+        return import_rows(ledger, self.rows(count), chunk_size=chunk_size, progress=progress)
+
+    def _pick(self, rng):
+        if rng.random() < self.hot_share:
+            return rng.randrange(self.hot_count)
+        return rng.randrange(self.num_accounts)
+
+
+def parse_mix(text):
+    """Parse "Deposit=0.5,Withdrawal=0.3,Transfer=0.2" into a mix"""
+    mix = {}
+    for item in text.split(','):
+        name, _, share = item.partition('=')
+        name = name.strip().capitalize()
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown transaction type: {name}")
+        share = float(share)
+        if share < 0 or math.isnan(share):
+            raise argparse.ArgumentTypeError(f"Invalid share: {share}")
+        mix[name] = share
+    if not sum(mix.values()):
+        raise argparse.ArgumentTypeError("The mix needs a positive share")
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate seeded accounts and transactions for load tests")
+    parser.add_argument('--accounts', type=int, default=100000)
+    parser.add_argument('--transactions', type=int, default=0)
+    parser.add_argument('--output', help="write the transactions to this CSV or JSONL file instead of applying them")
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help="shares of the row types, e.g. Deposit=0.5,Withdrawal=0.3,Transfer=0.2")
+    parser.add_argument('--hot-fraction', type=float, default=0.01, help="fraction of accounts that are hot")
+    parser.add_argument('--hot-share', type=float, default=0.5, help="share of the rows going to hot accounts")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    store = open_store(os.environ.get('BANK_DATA_DIR', 'bank_data'), os.environ.get('BANK_STORAGE', 'memory'))
+    try:
+        population = PopulationGenerator(args.seed)
+        if len(store):
+            print(f"store already holds {len(store)} accounts; not adding more")
+        else:
+            start = time.perf_counter()
+            population.populate(store, args.accounts,
+                                progress=lambda added: print(f"\r{added} accounts", end='', flush=True))
+            elapsed = time.perf_counter() - start
+            print(f"\r{args.accounts} accounts in {elapsed:.1f}s ({args.accounts / elapsed * 60:,.0f}/min)")
+
+        if args.transactions:
+            workload = WorkloadGenerator(population, args.accounts, args.seed, args.mix,
+                                         args.hot_fraction, args.hot_share)
+            start = time.perf_counter()
+            if args.output:
+                workload.write(args.output, args.transactions)
+                elapsed = time.perf_counter() - start
+                print(f"{args.transactions} rows written to {args.output} in {elapsed:.1f}s "
+                      f"({args.transactions / elapsed * 60:,.0f}/min)")
+            else:
+                ledger = Ledger(store, DEFAULT_ACCOUNT_TYPES)
+                result = workload.apply(ledger, args.transactions,
+                                        progress=lambda r: print(f"\r{r}", end='', flush=True))
+                print(f"\r{result}")
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()